@@ -0,0 +1,284 @@
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+
+
+COMPARISONS = {
+    ">": "{v} > {x}",
+    ">=": "{v} >= {x}",
+    "<": "{v} < {x}",
+    "<=": "{v} <= {x}",
+    "==": "{v} == {x}",
+    "!=": "{v} != {x}",
+    "in": "{v} in {x}",
+    "not in": "{v} not in {x}",
+    "abs>": "abs({v}) > {x}",
+    "abs<": "abs({v}) < {x}"
+}
+
+# Ops on the history of a field, evaluated as comparisons of derived fields
+DERIVED = {
+    "drop": ">",       # Dropped by more than 'value' from its highest value seen
+    "unchanged": "<"   # Moved by less than 'value' (combine with 'for' to detect a stuck value)
+}
+
+QUEUE_SIZE = 100       # Pending notifications, further ones are dropped while the notifier is busy
+WEBHOOK_TIMEOUT = 5
+
+
+class Rule:
+    """
+    Alert rule state: the condition has to hold for 'debounce' seconds to fire, an active alert is resolved
+    once the clear condition (the condition shifted by 'hysteresis') holds, and the same rule doesn't fire
+    again within 'cooldown' seconds.
+    """
+
+    __slots__ = ("name", "field", "op", "value", "hysteresis", "debounce", "cooldown", "message",
+                 "pending_since", "active", "fired_at")
+
+    def __init__(self, name, field, op, value, hysteresis=0, debounce=0, cooldown=0, message=""):
+        self.name = name
+        self.field = field
+        self.op = op
+        self.value = value
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.cooldown = cooldown
+        self.message = message
+        self.pending_since = None
+        self.active = False
+        self.fired_at = None
+
+
+class RuleEngine:
+    """
+    Evaluates the alert rules on each sample (dictionary of field values).
+
+    All the rule conditions (and the clear conditions) are compiled once into a single function returning
+    a tuple of booleans, so a sample costs one call plus the state handling of the rules whose condition
+    changed, which are pending (debounce) or active.
+    """
+
+    def __init__(self, rules, notifier=None):
+        self.rules = []
+        self.derived = {}     # derived field -> (kind, field, value)
+        self.history = {}     # derived field -> state (peak / reference value)
+        self.notifier = notifier
+        self.last = None
+        self.watch = set()    # Indexes of the pending / active rules
+        self.fields = {}      # field -> local variable name in the compiled functions
+
+        conditions = []
+        clears = []
+        for config in rules:
+            rule, condition, clear = self._compile_rule(config)
+            self.rules.append(rule)
+            conditions.append(condition)
+            clears.append(clear)
+
+        self.evaluate_all = self._compile(conditions)
+        self.clear_all = self._compile(clears)
+
+    def _operand(self, field):
+        if field not in self.fields:
+            self.fields[field] = f"f{len(self.fields)}"
+        return self.fields[field]
+
+    def _condition(self, field, op, value):
+        if op in DERIVED:
+            derived = f"__{op}_{field}_{value}"
+            self.derived[derived] = (op, field, value)
+            field, op = derived, DERIVED[op]
+
+        if op not in COMPARISONS:
+            raise ValueError(f"Unknown alert operator \"{op}\"")
+
+        v = self._operand(field)
+        if isinstance(value, dict) and "field" in value:
+            x = self._operand(value["field"])
+            return f"({v} is not None and {x} is not None and {COMPARISONS[op].format(v=v, x=x)})"
+
+        return f"({v} is not None and {COMPARISONS[op].format(v=v, x=repr(value))})"
+
+    def _compile_rule(self, config):
+        """
+        Compile a rule configuration into its condition expression and the clear predicate
+
+        :param config: Rule configuration (see config.yaml "alerts")
+
+        :return: Tuple (Rule, condition expression, clear expression)
+        """
+        rule = Rule(
+            config["name"], config["field"], config["op"], config.get("value"),
+            config.get("hysteresis", 0), config.get("for", 0), config.get("cooldown", 0), config.get("message", "")
+        )
+        condition = self._condition(rule.field, rule.op, rule.value)
+
+        if "when" in config:
+            when = config["when"]
+            condition = f"({condition} and {self._condition(when['field'], when['op'], when.get('value'))})"
+
+        # Hysteresis: the alert is resolved only when the value is 'hysteresis' beyond the threshold
+        clear = f"not {condition}"
+        if rule.hysteresis and rule.op in (">", ">=", "<", "<=", "abs>", "abs<") and isinstance(rule.value, (int, float)):
+            shifted = rule.value - rule.hysteresis if rule.op in (">", ">=", "abs>") else rule.value + rule.hysteresis
+            clear = f"not {self._condition(rule.field, rule.op, shifted)}"
+
+        return rule, condition, clear
+
+    def _compile(self, expressions):
+        # Each field is looked up once per sample into a local variable
+        lookups = "".join(f"    {name} = g({field!r})\n" for field, name in self.fields.items())
+        source = f"def evaluate(g):\n{lookups}    return ({', '.join(expressions)}{',' if expressions else ''})\n"
+        namespace = {"abs": abs}
+        exec(compile(source, "<alerts>", "exec"), namespace)
+        return namespace["evaluate"]
+
+    def _update_derived(self, sample):
+        for derived, (kind, field, value) in self.derived.items():
+            current = sample.get(field)
+            if current is None:
+                continue
+
+            state = self.history.get(derived)
+
+            if kind == "drop":
+                state = current if state is None else max(state, current)
+                sample[derived] = state - current
+            elif kind == "unchanged":
+                # A move resets the reference and breaks the condition for this sample, restarting the debounce
+                if state is None or abs(current - state) >= value:
+                    state = current
+                    sample[derived] = None
+                else:
+                    sample[derived] = abs(current - state)
+
+            self.history[derived] = state
+
+    def evaluate(self, sample, now=None):
+        """
+        Evaluate all rules on the sample
+
+        :param sample: Dictionary of field values (missing fields / None never match)
+        :param now: Sample time in seconds, defaults to the monotonic clock
+
+        :return: List of notifications sent for this sample
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if self.derived:
+            sample = dict(sample)
+            self._update_derived(sample)
+
+        results = self.evaluate_all(sample.get)
+        last = self.last
+        self.last = results
+
+        if last is None:
+            changed = range(len(results))
+        elif results == last:
+            if not self.watch:
+                return []
+            changed = ()
+        else:
+            changed = [idx for idx, (current, previous) in enumerate(zip(results, last)) if current != previous]
+
+        indexes = self.watch.union(changed)
+        notifications = []
+        clears = None
+
+        for idx in indexes:
+            rule = self.rules[idx]
+
+            if rule.active:
+                if clears is None:
+                    clears = self.clear_all(sample.get)
+                if clears[idx]:
+                    rule.active = False
+                    rule.pending_since = None
+                    self.watch.discard(idx)
+                    notifications.append(self._notify(rule, "resolved", sample))
+                continue
+
+            if not results[idx]:
+                rule.pending_since = None
+                self.watch.discard(idx)
+                continue
+
+            if rule.pending_since is None:
+                rule.pending_since = now
+                self.watch.add(idx)
+
+            if now - rule.pending_since < rule.debounce:
+                continue
+
+            if rule.fired_at is not None and now - rule.fired_at < rule.cooldown:
+                continue
+
+            rule.active = True
+            rule.fired_at = now
+            notifications.append(self._notify(rule, "firing", sample))
+
+        return notifications
+
+    def _notify(self, rule, state, sample):
+        notification = {
+            "rule": rule.name,
+            "state": state,
+            "field": rule.field,
+            "value": sample.get(rule.field),
+            "threshold": rule.value,
+            "message": rule.message,
+            "timestamp": time.time()
+        }
+
+        if self.notifier:
+            self.notifier.send(notification)
+
+        return notification
+
+    def active(self):
+        return [rule.name for rule in self.rules if rule.active]
+
+
+class Notifier:
+    """
+    Non-blocking alert delivery: notifications are queued and delivered from a daemon thread
+    to the log and (optionally) POSTed as JSON to a webhook
+    """
+
+    def __init__(self, logger=None, webhook=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.webhook = webhook
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="alerts", daemon=True)
+        self.thread.start()
+
+    def send(self, notification):
+        try:
+            self.queue.put_nowait(notification)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            notification = self.queue.get()
+
+            level = logging.WARNING if notification["state"] == "firing" else logging.INFO
+            self.logger.log(level, f"Alert \"{notification['rule']}\" {notification['state']}: " +
+                            f"{notification['field']} = {notification['value']}. {notification['message']}".rstrip())
+
+            if not self.webhook:
+                continue
+
+            try:
+                request = urllib.request.Request(self.webhook, data=json.dumps(notification).encode(),
+                                                 headers={"Content-Type": "application/json"})
+                urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT).close()
+            except Exception as err:
+                self.logger.error(f"Delivering alert \"{notification['rule']}\" to the webhook failed: {err}")
@@ -0,0 +1,352 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import yaml
+
+import battery_wear
+import se_battery_control
+
+
+STEP = 60                    # Simulation resolution in seconds
+EFFICIENCY = 0.95            # One-way battery charge / discharge efficiency
+DEFAULT_CAPACITY = 10240     # Battery capacity in Wh (2x SolarEdge Home Battery 48V)
+DEFAULT_MAX_POWER = 5000     # Maximum battery charge / discharge power in W
+DEFAULT_MODE = 7             # "storage_default_mode" the inverter falls back to after "rc_cmd_timeout"
+
+
+class Trace:
+    """
+    PV production and house consumption trace with a fixed time step, stored in flat arrays
+    """
+
+    def __init__(self, start, pv, load, step=STEP):
+        self.start = start
+        self.step = step
+        self.pv = pv
+        self.load = load
+
+    def __len__(self):
+        return len(self.pv)
+
+    def ranges(self, period):
+        """
+        Index ranges of the trace samples which are inside the given config.yaml period
+
+        :param period: Period entry from the "periods" section of config.yaml
+
+        :return: List of (first index, last index + 1) tuples
+        """
+        first_year = datetime.fromtimestamp(self.start).year
+        last_year = datetime.fromtimestamp(self.start + len(self) * self.step).year
+        ranges = []
+
+        for year in range(first_year, last_year + 1):
+            period_start, period_end = se_battery_control.period_range(period, year)
+            first = max(0, math.ceil((period_start.timestamp() - self.start) / self.step))
+            last = min(len(self), int((period_end.timestamp() - self.start) / self.step) + 1)
+
+            if first < last:
+                ranges.append((first, last))
+
+        return ranges
+
+
+def load_trace(file_name):
+    """
+    Load a trace from a CSV file with the columns "timestamp" (UNIX seconds), "pv" (W) and "load" (W).
+    The samples are expected to be equally spaced.
+
+    :param file_name: CSV file name
+
+    :return: Trace
+    """
+    timestamps = []
+    pv = array("d")
+    load = array("d")
+
+    with open(file_name, "r", newline="") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            if len(timestamps) < 2:
+                timestamps.append(float(row["timestamp"]))
+            pv.append(float(row["pv"]))
+            load.append(float(row["load"]))
+
+    if not timestamps:
+        raise ValueError(f"Trace \"{file_name}\" has no samples")
+
+    step = timestamps[1] - timestamps[0] if len(timestamps) > 1 else STEP
+
+    return Trace(timestamps[0], pv, load, step)
+
+
+def synthetic_trace(year=None, pv_peak=8000, load_base=300, load_peak=1500, seed=1):
+    """
+    Generate a synthetic one year trace at minute resolution: seasonal PV bell curve with random clouds
+    and a house consumption with morning and evening peaks.
+
+    :param year: Year of the trace. Defaults to the current one
+    :param pv_peak: Peak PV production in W on a clear summer day
+    :param load_base: Base house consumption in W
+    :param load_peak: Evening consumption peak in W
+    :param seed: Random seed
+
+    :return: Trace
+    """
+    rnd = random.Random(seed)
+    start = datetime(year or datetime.today().year, 1, 1).timestamp()
+    minutes = 365 * 1440
+    pv = array("d", bytes(8 * minutes))
+    load = array("d", bytes(8 * minutes))
+
+    for day in range(365):
+        season = 0.5 - 0.5 * math.cos(2 * math.pi * (day + 10) / 365)
+        day_length = 8 + 8 * season
+        sunrise = 12 - day_length / 2
+        clouds = rnd.uniform(0.2, 1.0)
+        peak = pv_peak * (0.25 + 0.75 * season) * clouds
+
+        for minute in range(1440):
+            hour = minute / 60
+            idx = day * 1440 + minute
+
+            if sunrise < hour < sunrise + day_length:
+                pv[idx] = peak * math.sin(math.pi * (hour - sunrise) / day_length) * rnd.uniform(0.7, 1.0)
+
+            load[idx] = (load_base +
+                         load_peak * 0.6 * math.exp(-((hour - 7.5) ** 2)) +
+                         load_peak * math.exp(-((hour - 19) ** 2) / 2) +
+                         (2000 if rnd.random() < 0.01 else 0))
+
+    return Trace(start, pv, load)
+
+
+def simulate(trace, params, ranges=None, capacity=DEFAULT_CAPACITY, max_power=DEFAULT_MAX_POWER,
+             start_soe=50.0, update_interval=None, chemistry="NMC"):
+    """
+    Replay the control logic of 'inverter_update_routine' against a trace
+
+    :param trace: Trace to be replayed
+    :param params: Dictionary with "upper_charging_limit", "soe_delta_charge", "backup_reserve", "charge_limit"
+    :param ranges: Index ranges of the trace to be simulated. Defaults to the whole trace
+    :param capacity: Battery capacity in Wh
+    :param max_power: Maximum battery charge / discharge power in W
+    :param start_soe: SoE at the beginning of the simulation in %
+    :param update_interval: Controller update interval in seconds. Defaults to 'update_interval' from params or 120
+    :param chemistry: Battery chemistry for the wear estimation
+
+    :return: Dictionary with the simulation results
+    """
+    upper_charging_limit = params["upper_charging_limit"]
+    soe_delta_charge = params["soe_delta_charge"]
+    backup_reserve = params["backup_reserve"]
+    charge_limit = params["charge_limit"]
+    update_interval = update_interval or params.get("update_interval", 120)
+    control_steps = max(1, round(update_interval / trace.step))
+    hours = trace.step / 3600
+    charging_limit_15p = round(capacity * 0.15, -2)
+    control_actions = se_battery_control.control_actions
+
+    pv_trace = trace.pv
+    load_trace = trace.load
+    rainflow = battery_wear.RainflowCounter(chemistry)
+    add_soe = rainflow.add
+
+    energy = capacity * start_soe / 100
+    rc_cmd_mode = DEFAULT_MODE
+    rc_charge_limit = max_power
+    backup_reserved = 0
+    mode_expiry = 0
+    writes = 0
+    pv_total = load_total = grid_import = grid_export = 0.0
+
+    for first, last in (ranges or [(0, len(trace))]):
+        for idx in range(first, last):
+            if (idx - first) % control_steps == 0:
+                if idx >= mode_expiry:
+                    rc_cmd_mode = DEFAULT_MODE
+
+                soe = energy / capacity * 100
+                for register, value in control_actions(
+                        soe, rc_cmd_mode, rc_charge_limit, backup_reserved, charging_limit_15p,
+                        upper_charging_limit, soe_delta_charge, backup_reserve, charge_limit):
+                    writes += 1
+                    if register == "rc_cmd_timeout":
+                        mode_expiry = idx + value / trace.step
+                    elif register == "rc_cmd_mode":
+                        rc_cmd_mode = value
+                    elif register == "rc_charge_limit":
+                        rc_charge_limit = value
+                    else:
+                        backup_reserved = value
+
+                add_soe(soe)
+
+            pv = pv_trace[idx]
+            load = load_trace[idx]
+            surplus = (pv - load) * hours
+            pv_total += pv
+            load_total += load
+
+            if surplus > 0:
+                charge = 0.0
+                if rc_cmd_mode != 5:
+                    charge = min(surplus, min(rc_charge_limit, max_power) * hours,
+                                 (capacity - energy) / EFFICIENCY)
+                    energy += charge * EFFICIENCY
+                grid_export += surplus - charge
+            else:
+                discharge = min(-surplus, max_power * hours,
+                                max(0.0, energy - capacity * backup_reserved / 100) * EFFICIENCY)
+                energy -= discharge / EFFICIENCY
+                grid_import += -surplus - discharge
+
+    pv_total *= hours
+    load_total *= hours
+    wear = battery_wear.BatteryWear(chemistry, capacity)
+    wear.rainflow = rainflow
+    wear_report = wear.report()
+
+    return {
+        "params": params,
+        "pv": round(pv_total / 1000, 1),
+        "load": round(load_total / 1000, 1),
+        "grid_import": round(grid_import / 1000, 1),
+        "grid_export": round(grid_export / 1000, 1),
+        "self_consumption": round((pv_total - grid_export) / pv_total * 100, 1) if pv_total else 0.0,
+        "self_sufficiency": round((load_total - grid_import) / load_total * 100, 1) if load_total else 0.0,
+        "equivalent_full_cycles": wear_report["equivalent_full_cycles"],
+        "life_consumed": wear_report["life_consumed"],
+        "cycles": wear_report["cycles"],
+        "inverter_writes": writes
+    }
+
+
+def score(result, import_price, export_price, wear_price):
+    """
+    Cost of a simulation result - lower is better
+
+    :param result: Result returned by simulate()
+    :param import_price: Price per kWh imported from the grid
+    :param export_price: Feed-in tariff per kWh exported to the grid
+    :param wear_price: Cost of 1% of the battery life
+
+    :return: Cost
+    """
+    return (result["grid_import"] * import_price -
+            result["grid_export"] * export_price +
+            result["life_consumed"] * wear_price)
+
+
+_worker_trace = None
+
+
+def _init_worker(trace):
+    global _worker_trace
+    _worker_trace = trace
+
+
+def _simulate_job(job):
+    period_idx, params, ranges, kwargs = job
+    return period_idx, simulate(_worker_trace, params, ranges, **kwargs)
+
+
+def sweep(trace, periods, grid, workers=None, **kwargs):
+    """
+    Grid search of the candidate configurations for each config.yaml period using a process pool
+
+    :param trace: Trace to be replayed
+    :param periods: The "periods" section of config.yaml
+    :param grid: Dictionary with a list of candidate values for each of the simulate() params.
+    Params which are not in the grid are taken from the period config
+    :param workers: Number of worker processes. Defaults to the number of CPUs
+    :param kwargs: Further simulate() arguments
+
+    :return: List (per period) of simulation result lists
+    """
+    keys = list(grid)
+    candidates = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    jobs = []
+
+    for period_idx, period in enumerate(periods):
+        ranges = trace.ranges(period)
+        if ranges:
+            jobs.extend((period_idx, {**period["config"], **params}, ranges, kwargs) for params in candidates)
+
+    results = [[] for _ in periods]
+
+    # The trace is sent once to each worker process instead of with every job
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(trace,)) as executor:
+        for period_idx, result in executor.map(_simulate_job, jobs, chunksize=max(1, len(candidates) // 4)):
+            results[period_idx].append(result)
+
+    return results
+
+
+def _values(text, vtype=int):
+    return [vtype(value) for value in text.split(",")]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Backtest and parameter sweep of the battery control config")
+    arg_parser.add_argument("--trace", type=str, default=None,
+                            help="CSV trace with \"timestamp\", \"pv\" and \"load\" columns. Synthetic trace if omitted")
+    arg_parser.add_argument("--config", type=str, default="config.yaml", help="Configuration file")
+    arg_parser.add_argument("--capacity", type=float, default=DEFAULT_CAPACITY, help="Battery capacity in Wh")
+    arg_parser.add_argument("--max_power", type=float, default=DEFAULT_MAX_POWER, help="Maximum battery power in W")
+    arg_parser.add_argument("--chemistry", type=str, choices=list(battery_wear.DOD_CYCLE_LIFE), default="NMC",
+                            help="Battery chemistry")
+    arg_parser.add_argument("--upper_charging_limit", type=_values, default=None, help="Candidates, e.g. 70,75,80,85")
+    arg_parser.add_argument("--soe_delta_charge", type=_values, default=None, help="Candidates, e.g. 5,10")
+    arg_parser.add_argument("--backup_reserve", type=_values, default=None, help="Candidates, e.g. 10,15,20")
+    arg_parser.add_argument("--charge_limit", type=_values, default=None, help="Candidates, e.g. 2000,3500,5000")
+    arg_parser.add_argument("--import_price", type=float, default=0.30, help="Price per imported kWh")
+    arg_parser.add_argument("--export_price", type=float, default=0.08, help="Feed-in tariff per exported kWh")
+    arg_parser.add_argument("--wear_price", type=float, default=50.0, help="Cost of 1%% of the battery life of the DoD table (the battery price / 100)")
+    arg_parser.add_argument("--top", type=int, default=3, help="Number of best candidates reported per period")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = arg_parser.parse_args()
+
+    with open(args.config, "r") as config_file:
+        config = yaml.safe_load(config_file)
+
+    sim_trace = load_trace(args.trace) if args.trace else synthetic_trace()
+    sim_kwargs = {"capacity": args.capacity, "max_power": args.max_power, "chemistry": args.chemistry,
+                  "update_interval": config["defaul_config"]["update_interval"]}
+    sweep_grid = {key: getattr(args, key) for key in
+                  ("upper_charging_limit", "soe_delta_charge", "backup_reserve", "charge_limit")
+                  if getattr(args, key)}
+
+    report = []
+
+    # Baseline - the configuration as it is in config.yaml
+    baseline = [
+        simulate(sim_trace, period["config"], sim_trace.ranges(period), **sim_kwargs) if sim_trace.ranges(period) else None
+        for period in config["periods"]
+    ]
+
+    if sweep_grid:
+        sweep_results = sweep(sim_trace, config["periods"], sweep_grid, args.workers, **sim_kwargs)
+    else:
+        sweep_results = [[] for _ in config["periods"]]
+
+    for period, period_baseline, period_results in zip(config["periods"], baseline, sweep_results):
+        if period_baseline is None:
+            continue
+
+        period_results.sort(key=lambda r: score(r, args.import_price, args.export_price, args.wear_price))
+        report.append({
+            "period_start": period["period_start"],
+            "period_end": period["period_end"],
+            "baseline": period_baseline,
+            "best": period_results[:args.top]
+        })
+
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,369 @@
+import argparse
+import csv
+import json
+import math
+import os
+
+
+# Discharge cycles until the capacity drops to 70% per DoD level (see README "Battery Life vs DoD")
+DOD_CYCLE_LIFE = {
+    "NMC": [
+        (10, 6000),
+        (20, 2000),
+        (40, 1000),
+        (60, 600),
+        (80, 400),
+        (100, 300)
+    ],
+    "LiFePO4": [
+        (10, 15000),
+        (20, 9000),
+        (40, 3000),
+        (60, 1500),
+        (80, 900),
+        (100, 600)
+    ]
+}
+
+DOD_BINS = [0, 10, 20, 40, 60, 80, 100]
+
+HYSTERESIS = 0.5     # SoE reversals smaller than this (in %) are treated as measurement noise
+MAX_RESIDUAL = 512   # Upper bound of the rainflow residual stack
+
+
+def cycle_life(dod, chemistry="NMC"):
+    """
+    Number of cycles at the given DoD until the battery reaches its end of life (70% capacity).
+    Interpolates the DoD table log-log, extrapolating the first/last segment outside of the table.
+
+    :param dod: Depth of discharge in %
+    :param chemistry: Battery chemistry - key of DOD_CYCLE_LIFE
+
+    :return: Number of cycles
+    """
+    curve = DOD_CYCLE_LIFE[chemistry]
+    dod = min(max(dod, 0.1), 100)
+
+    for idx in range(1, len(curve)):
+        if dod <= curve[idx][0] or idx == len(curve) - 1:
+            (d0, n0), (d1, n1) = curve[idx - 1], curve[idx]
+            slope = math.log(n1 / n0) / math.log(d1 / d0)
+            return n0 * (dod / d0) ** slope
+
+
+def dod_bin(dod):
+    """
+    Label of the DoD bin the given depth of discharge falls into
+
+    :param dod: Depth of discharge in %
+
+    :return: Bin label, e.g. "20-40"
+    """
+    for idx in range(1, len(DOD_BINS)):
+        if dod <= DOD_BINS[idx]:
+            return f"{DOD_BINS[idx - 1]}-{DOD_BINS[idx]}"
+
+    return f"{DOD_BINS[-2]}-{DOD_BINS[-1]}"
+
+
+class RainflowCounter:
+    """
+    Streaming rainflow cycle counter (four-point method).
+
+    Samples are reduced to turning points on the fly, closed cycles are counted as soon as they
+    appear and only the residual (not yet closed half cycles) is kept, so the memory is bounded
+    and each sample costs O(1) amortised.
+    """
+
+    __slots__ = ("chemistry", "hysteresis", "max_residual", "residual", "extreme", "direction", "cycles", "damage", "full_cycles")
+
+    def __init__(self, chemistry="NMC", hysteresis=HYSTERESIS, max_residual=MAX_RESIDUAL):
+        self.chemistry = chemistry
+        self.hysteresis = hysteresis
+        self.max_residual = max_residual
+        self.residual = []
+        self.extreme = None
+        self.direction = 0
+        self.cycles = {}
+        self.damage = 0.0
+        self.full_cycles = 0.0
+
+    def add(self, value):
+        residual = self.residual
+
+        if not residual:
+            residual.append(value)
+            self.extreme = value
+            return
+
+        direction = self.direction
+        extreme = self.extreme
+
+        if direction > 0:
+            if value >= extreme:
+                self.extreme = value
+                return
+            if extreme - value < self.hysteresis:
+                return
+        elif direction < 0:
+            if value <= extreme:
+                self.extreme = value
+                return
+            if value - extreme < self.hysteresis:
+                return
+        else:
+            if abs(value - residual[0]) < self.hysteresis:
+                return
+            self.direction = 1 if value > residual[0] else -1
+            self.extreme = value
+            return
+
+        # The previous extreme is confirmed as a turning point
+        residual.append(extreme)
+        self.direction = -direction
+        self.extreme = value
+        self._close_cycles()
+
+    def _close_cycles(self):
+        residual = self.residual
+
+        while len(residual) >= 4:
+            s1, s2, s3, s4 = residual[-4:]
+            inner = abs(s2 - s3)
+
+            if inner > abs(s1 - s2) or inner > abs(s3 - s4):
+                break
+
+            self._count(inner, 1)
+            del residual[-3:-1]
+
+        if len(residual) > self.max_residual:
+            self._count(abs(residual[0] - residual[1]), 0.5)
+            del residual[0]
+
+    def _count(self, dod, count):
+        label = dod_bin(dod)
+        self.cycles[label] = self.cycles.get(label, 0) + count
+        self.damage += count / cycle_life(dod, self.chemistry)
+        self.full_cycles += count * dod / 100
+
+    def half_cycles(self):
+        """
+        Ranges of the half cycles which are still open in the residual (incl. the current extreme)
+
+        :return: List of DoD values in %
+        """
+        points = self.residual + ([self.extreme] if self.direction else [])
+
+        return [abs(points[idx] - points[idx - 1]) for idx in range(1, len(points))]
+
+    def to_dict(self):
+        return {
+            "chemistry": self.chemistry,
+            "hysteresis": self.hysteresis,
+            "residual": self.residual,
+            "extreme": self.extreme,
+            "direction": self.direction,
+            "cycles": self.cycles,
+            "damage": self.damage,
+            "full_cycles": self.full_cycles
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        counter = cls(state["chemistry"], state["hysteresis"])
+        counter.residual = state["residual"]
+        counter.extreme = state["extreme"]
+        counter.direction = state["direction"]
+        counter.cycles = state["cycles"]
+        counter.damage = state["damage"]
+        counter.full_cycles = state["full_cycles"]
+        return counter
+
+
+class BatteryWear:
+    """
+    Battery wear estimator based on the rainflow counted SoE cycles and the DoD cycle life curves,
+    correlated with the SoH and the lifetime energy counters reported by the battery.
+    """
+
+    def __init__(self, chemistry="NMC", capacity=None):
+        self.rainflow = RainflowCounter(chemistry)
+        self.capacity = capacity
+        self.samples = 0
+        self.first = {}
+        self.last = {}
+
+    def add(self, soe, soh=None, export_energy=None, import_energy=None, timestamp=None):
+        """
+        Feed a single battery sample
+
+        :param soe: State of energy in %
+        :param soh: State of health in %
+        :param export_energy: "lifetime_export_energy_counter" in Wh
+        :param import_energy: "lifetime_import_energy_counter" in Wh
+        :param timestamp: Sample time (UNIX seconds)
+
+        :return: None
+        """
+        self.rainflow.add(soe)
+        self.samples += 1
+
+        for key, value in (("soh", soh), ("export_energy", export_energy),
+                           ("import_energy", import_energy), ("timestamp", timestamp)):
+            if value is not None:
+                self.first.setdefault(key, value)
+                self.last[key] = value
+
+    def report(self):
+        """
+        Summary of the battery wear
+
+        :return: Dictionary with the cycle counts per DoD bin and the wear estimates
+        """
+        rainflow = self.rainflow
+        cycles = dict(rainflow.cycles)
+        damage = rainflow.damage
+        full_cycles = rainflow.full_cycles
+
+        for dod in rainflow.half_cycles():
+            label = dod_bin(dod)
+            cycles[label] = cycles.get(label, 0) + 0.5
+            damage += 0.5 / cycle_life(dod, rainflow.chemistry)
+            full_cycles += 0.5 * dod / 100
+
+        report = {
+            "chemistry": rainflow.chemistry,
+            "samples": self.samples,
+            "cycles": {label: cycles[label] for label in sorted(cycles, key=lambda k: int(k.split("-")[0]))},
+            "equivalent_full_cycles": round(full_cycles, 2),
+            "life_consumed": round(damage * 100, 4),
+            "remaining_life": round(max(0.0, 1 - damage) * 100, 2)
+        }
+
+        first, last = self.first, self.last
+
+        if "export_energy" in last and "import_energy" in last and self.capacity:
+            throughput = (last["export_energy"] - first["export_energy"]) + (last["import_energy"] - first["import_energy"])
+            report["counter_equivalent_full_cycles"] = round(throughput / 2 / self.capacity, 2)
+
+        if "soh" in last:
+            report["soh"] = last["soh"]
+            report["soh_drop"] = round(first["soh"] - last["soh"], 2)
+
+            if damage > 0:
+                # SoH lost per 1% of the estimated cycle life
+                report["soh_drop_per_life_consumed"] = round((first["soh"] - last["soh"]) / (damage * 100), 4)
+
+        if "timestamp" in last and damage > 0:
+            elapsed = last["timestamp"] - first["timestamp"]
+            if elapsed > 0:
+                report["remaining_years"] = round(max(0.0, 1 - damage) / damage * elapsed / 31557600, 1)
+
+        return report
+
+    def to_dict(self):
+        return {
+            "rainflow": self.rainflow.to_dict(),
+            "capacity": self.capacity,
+            "samples": self.samples,
+            "first": self.first,
+            "last": self.last
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        wear = cls(capacity=state["capacity"])
+        wear.rainflow = RainflowCounter.from_dict(state["rainflow"])
+        wear.samples = state["samples"]
+        wear.first = state["first"]
+        wear.last = state["last"]
+        return wear
+
+
+def load_state(file_name, chemistry="NMC", capacity=None):
+    """
+    Load the persisted wear estimator or create a new one
+
+    :param file_name: JSON state file
+    :param chemistry: Battery chemistry for a newly created estimator
+    :param capacity: Battery capacity in Wh
+
+    :return: BatteryWear
+    """
+    try:
+        with open(file_name, "r") as file:
+            wear = BatteryWear.from_dict(json.load(file))
+    except (FileNotFoundError, ValueError, KeyError):
+        wear = BatteryWear(chemistry)
+
+    if capacity:
+        wear.capacity = capacity
+
+    return wear
+
+
+def save_state(wear, file_name):
+    """
+    Persist the wear estimator (written to a temporary file, synced and renamed, so a crash never leaves
+    a truncated state behind)
+
+    :param wear: BatteryWear to be saved
+    :param file_name: JSON state file
+
+    :return: None
+    """
+    tmp_file = file_name + ".tmp"
+
+    with open(tmp_file, "w") as file:
+        json.dump(wear.to_dict(), file)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(tmp_file, file_name)
+
+
+def process_history(file_name, wear):
+    """
+    Stream a CSV history file (header row with at least a "soe" column) through the wear estimator.
+    Optional columns: "soh", "lifetime_export_energy_counter", "lifetime_import_energy_counter", "timestamp"
+
+    :param file_name: CSV file name
+    :param wear: BatteryWear to be fed
+
+    :return: None
+    """
+    with open(file_name, "r", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        soe_idx = header.index("soe")
+        optional = [header.index(name) if name in header else None for name in
+                    ("soh", "lifetime_export_energy_counter", "lifetime_import_energy_counter", "timestamp")]
+
+        if not any(idx is not None for idx in optional):
+            # Fast path: only the SoE is available
+            add = wear.rainflow.add
+            count = 0
+            for row in reader:
+                add(float(row[soe_idx]))
+                count += 1
+            wear.samples += count
+            return
+
+        for row in reader:
+            extra = [float(row[idx]) if idx is not None and row[idx] else None for idx in optional]
+            wear.add(float(row[soe_idx]), *extra)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Rainflow cycle counting and battery wear estimation")
+    arg_parser.add_argument("history", type=str, nargs="+", help="CSV history file(s) with a \"soe\" column")
+    arg_parser.add_argument("--chemistry", type=str, choices=list(DOD_CYCLE_LIFE), default="NMC", help="Battery chemistry")
+    arg_parser.add_argument("--capacity", type=float, default=None, help="Battery capacity in Wh")
+    args = arg_parser.parse_args()
+
+    battery_wear = BatteryWear(args.chemistry, args.capacity)
+    for history in args.history:
+        process_history(history, battery_wear)
+
+    print(json.dumps(battery_wear.report(), indent=2))
@@ -0,0 +1,211 @@
+import argparse
+import math
+import random
+import string
+import struct
+import time
+
+from pymodbus.constants import Endian
+from pymodbus.payload import BinaryPayloadDecoder
+
+import solaredge_modbus
+from solaredge_modbus import registerDataType, registerType
+
+
+SEED = 1
+NOT_IMPLEMENTED_SHARE = 0.1
+BENCHMARK_TIME = 1.0       # Seconds per throughput measurement
+
+# Minimum values decoded per second of a whole register table relative to the calibration loop run in the same
+# process (plain BinaryPayloadDecoder reads of 16 bit values), about half of the ratios measured when set.
+# Relative to the host's speed they hold on a Raspberry Pi as well as on a desktop.
+# A decoder change must pass tests/test_codec.py and should raise these, never lower them.
+MIN_RATIOS = {
+    "Inverter": 0.09,
+    "Meter": 0.075,
+    "StorageInverter": 0.065,
+    "Battery": 0.055
+}
+CALIBRATION_REGISTERS = 100
+
+LENGTHS = {
+    registerDataType.UINT16: 1, registerDataType.INT16: 1, registerDataType.UINT32: 2, registerDataType.ACC32: 2,
+    registerDataType.INT32: 2, registerDataType.UINT64: 4, registerDataType.FLOAT32: 2, registerDataType.SEFLOAT: 2
+}
+
+
+def float32(value):
+    return struct.unpack(">f", struct.pack(">f", value))[0]
+
+
+def random_value(rnd, dtype, length=8):
+    """
+    Random value of the data type, never its "not implemented" value
+
+    :param rnd: random.Random
+    :param dtype: registerDataType
+    :param length: Register length of strings
+
+    :return: Value
+    """
+    if dtype == registerDataType.UINT16:
+        return rnd.choice([0, 1, 0xfffe, rnd.randrange(0xffff)])
+    if dtype == registerDataType.INT16:
+        return rnd.choice([0, -0x7fff, 0x7fff, rnd.randrange(-0x7fff, 0x8000)])
+    if dtype in (registerDataType.UINT32, registerDataType.ACC32):
+        return rnd.choice([1, 0xfffffffe, rnd.randrange(1, 0xffffffff)])
+    if dtype == registerDataType.INT32:
+        return rnd.choice([0, -0x7fffffff, 0x7fffffff, rnd.randrange(-0x7fffffff, 0x80000000)])
+    if dtype == registerDataType.UINT64:
+        return rnd.choice([0, 0xfffffffffffffffe, rnd.randrange(0xffffffffffffffff)])
+    if dtype in (registerDataType.FLOAT32, registerDataType.SEFLOAT):
+        return float32(rnd.choice([0.0, -0.0, rnd.uniform(-1, 1) * 10 ** rnd.randint(-30, 30)]))
+    if dtype == registerDataType.STRING:
+        text = "".join(rnd.choice(string.ascii_letters + string.digits + " .-:") for _ in range(rnd.randint(0, length * 2)))
+        return text.rstrip()
+
+    raise NotImplementedError(dtype)
+
+
+def encode(device, value, dtype, length):
+    """
+    Register words of the value: strings are padded with NULs to the register length, ACC32 is encoded as UINT32
+
+    :return: List of register words
+    """
+    words = device._encode_value(value, registerDataType.UINT32 if dtype == registerDataType.ACC32 else dtype)
+
+    if dtype == registerDataType.STRING:
+        words += [0] * (length - len(words))
+
+    return words
+
+
+class Devices:
+    """
+    One device per register table, all sharing an unconnected client. The Modbus reads are served from
+    a register image, so the whole read path from the read plans to the decoded values is exercised offline
+    (by the benchmark here and by tests/test_codec.py).
+    """
+
+    def __init__(self):
+        inverter = solaredge_modbus.Inverter(host="127.0.0.1", port=1502)
+        # The random "not implemented" values must not be learned as unsupported registers
+        inverter.capabilities = solaredge_modbus.CapabilityMap(strikes=math.inf)
+        self.tables = {
+            "Inverter": inverter,
+            "Meter": solaredge_modbus.Meter(offset=0, parent=inverter),
+            "StorageInverter": solaredge_modbus.StorageInverter(parent=inverter),
+            "Battery": solaredge_modbus.Battery(offset=0, parent=inverter)
+        }
+        self.word_orders = {Endian.BIG: inverter, Endian.LITTLE: self.tables["StorageInverter"]}
+        self.image = {}
+
+        for device in self.tables.values():
+            device._read_holding_registers_raw = self._read
+
+    def _read(self, address, length):
+        return [self.image.get(address + idx, 0) for idx in range(length)]
+
+
+def fill_image(devices, device, rnd):
+    """
+    Write random values of all registers of the device into the image
+
+    :return: Tuple (raw values, scale factors) by register key; "not implemented" registers have the value None
+    """
+    raw = {}
+    scales = {}
+
+    for k, v in device.registers.items():
+        if k in device.scale_factors:
+            scale = rnd.randint(-3, 2)
+            if rnd.random() < NOT_IMPLEMENTED_SHARE:
+                words, scale = [0x8000], None
+            else:
+                words = encode(device, scale, registerDataType.INT16, 1)
+            scales[k] = scale
+            raw[k] = scale or 0
+        else:
+            sentinel = device._sentinel(v)
+            if sentinel and rnd.random() < NOT_IMPLEMENTED_SHARE:
+                words, value = list(sentinel), None
+            else:
+                value = random_value(rnd, v.dtype, v.length)
+                words = encode(device, value, v.dtype, v.length)
+            raw[k] = value
+
+        for idx, word in enumerate(words):
+            devices.image[v.address + idx] = word
+
+    return raw, scales
+
+
+def calibrate(rnd, duration):
+    """
+    Speed of the host: 16 bit values per second decoded by a plain BinaryPayloadDecoder loop
+
+    :return: Rate
+    """
+    registers = [rnd.randrange(0x10000) for _ in range(CALIBRATION_REGISTERS)]
+    decoded = 0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < duration:
+        data = BinaryPayloadDecoder.fromRegisters(registers, byteorder=Endian.BIG, wordorder=Endian.BIG)
+        for _ in range(CALIBRATION_REGISTERS):
+            data.decode_16bit_int()
+        decoded += CALIBRATION_REGISTERS
+
+    return decoded / (time.perf_counter() - start)
+
+
+def benchmark(devices, rnd, duration):
+    """
+    Values decoded per second of a whole register table (scaled, all batches)
+
+    :return: Dictionary table name -> rate
+    """
+    rates = {}
+
+    for name, device in devices.tables.items():
+        devices.image = {}
+        fill_image(devices, device, rnd)
+        plans = [device._read_plan(batch, registerType.HOLDING, True) for batch in device._batches(registerType.HOLDING)]
+        frames = [(plan, devices._read(plan[0], plan[1])) for plan in plans]
+        values = sum(len(plan[2]) for plan in plans)
+
+        decoded = 0
+        results = {}
+        start = time.perf_counter()
+
+        while time.perf_counter() - start < duration:
+            for plan, registers in frames:
+                device._decode_span(plan, registers, results)
+            decoded += values
+
+        rates[name] = decoded / (time.perf_counter() - start)
+
+    return rates
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Throughput check of the register codec of all the register tables, the conformance checks are in tests/test_codec.py")
+    arg_parser.add_argument("--seed", type=int, default=SEED, help="Seed of the random values")
+    arg_parser.add_argument("--benchmark_time", type=float, default=BENCHMARK_TIME, help="Seconds per throughput measurement")
+    args = arg_parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    devices = Devices()
+    failed = False
+
+    calibration = calibrate(rnd, args.benchmark_time)
+    print(f"{'calibration':26} {calibration:10.0f} values/s")
+    for name, rate in benchmark(devices, rnd, args.benchmark_time).items():
+        ok = rate >= MIN_RATIOS[name] * calibration
+        print(f"{'benchmark ' + name:26} {rate:10.0f} values/s = {rate / calibration:.3f} x calibration "
+              f"(minimum {MIN_RATIOS[name]}){'' if ok else ' - TOO SLOW'}")
+        failed = failed or not ok
+
+    exit(1 if failed else 0)
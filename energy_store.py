@@ -0,0 +1,227 @@
+import sqlite3
+import time
+
+
+HOUR = 3600
+RESOLUTIONS = ["hour", "day", "month"]
+BATCH_SIZE = 30            # Samples buffered before they are written in one transaction
+FLUSH_INTERVAL = 900       # Maximum age of the buffered samples in seconds
+RAW_RETENTION = 30 * 86400  # Raw counter samples are kept for 30 days, the rollups forever
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    channel TEXT PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    timestamp REAL NOT NULL,
+    channel TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_timestamp ON samples (timestamp);
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    energy REAL NOT NULL,
+    PRIMARY KEY (resolution, period, channel)
+) WITHOUT ROWID;
+"""
+
+
+def hour_start(timestamp):
+    """
+    Start of the local hour containing the timestamp (also for time zones with non-whole hour offsets)
+
+    :param timestamp: UNIX timestamp
+
+    :return: UNIX timestamp of the hour start
+    """
+    offset = time.localtime(timestamp).tm_gmtoff
+    return int(timestamp - (timestamp + offset) % HOUR)
+
+
+def period_key(resolution, timestamp):
+    """
+    Rollup key of the period containing the timestamp: the local hour start (UNIX timestamp) for "hour",
+    YYYYMMDD for "day" and YYYYMM for "month" (local time)
+
+    :param resolution: "hour", "day" or "month"
+    :param timestamp: UNIX timestamp
+
+    :return: Integer key
+    """
+    if resolution == "hour":
+        return hour_start(timestamp)
+
+    local = time.localtime(timestamp)
+    if resolution == "day":
+        return local.tm_year * 10000 + local.tm_mon * 100 + local.tm_mday
+
+    return local.tm_year * 100 + local.tm_mon
+
+
+def split_hours(start, end, energy):
+    """
+    Split the energy of the interval linearly over the local hours it spans
+
+    :param start: Interval start (UNIX timestamp)
+    :param end: Interval end (UNIX timestamp)
+    :param energy: Energy of the interval
+
+    :return: List of (hour start, energy)
+    """
+    if end <= start:
+        return [(hour_start(end), energy)]
+
+    parts = []
+    hour = hour_start(start)
+
+    while hour < end:
+        overlap = min(end, hour + HOUR) - max(start, hour)
+        parts.append((hour, energy * overlap / (end - start)))
+        hour += HOUR
+
+    return parts
+
+
+class EnergyStore:
+    """
+    SQLite store turning cumulative energy counters into hourly, daily and monthly energy.
+
+    Each ingested counter value is turned into the delta to the previous value of the channel, split over
+    the hours since that value (gaps are spread linearly) and added to the hour, day and month rollups.
+    The rollups are kept incrementally, so reports read only the rows of the requested periods.
+    Samples are buffered and written in one transaction per batch together with the last counter values,
+    so the deltas of a crashed process are recovered from the persisted counters on the next start.
+    """
+
+    def __init__(self, file_name, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, retention=RAW_RETENTION):
+        self.file_name = file_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = retention
+
+        self.db = sqlite3.connect(file_name, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+        self.counters = {channel: (timestamp, value) for channel, timestamp, value
+                         in self.db.execute("SELECT channel, timestamp, value FROM counters")}
+        self.samples = []
+        self.rollups = {}
+        self.changed = set()
+        self.first_pending = None
+
+    def add(self, counters, timestamp=None):
+        """
+        Ingest a poll's counter values
+
+        :param counters: Dictionary channel -> cumulative counter value (None values are skipped)
+        :param timestamp: Poll time (UNIX seconds), defaults to now
+
+        :return: None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        for channel, value in counters.items():
+            if value is None:
+                continue
+
+            previous = self.counters.get(channel)
+            self.counters[channel] = (timestamp, value)
+            self.changed.add(channel)
+            self.samples.append((timestamp, channel, value))
+
+            if previous is None:
+                continue
+
+            previous_timestamp, previous_value = previous
+
+            if value < previous_value:
+                if value == 0:
+                    # Transient zero reading - keep the previous reference
+                    self.counters[channel] = previous
+                # Otherwise the counter was reset or the device replaced: the new value is the new reference.
+                # The energy of this interval is dropped rather than risking a spike of a whole lifetime counter.
+                continue
+
+            delta = value - previous_value
+            if not delta:
+                continue
+
+            for hour, energy in split_hours(previous_timestamp, timestamp, delta):
+                for resolution in RESOLUTIONS:
+                    key = (resolution, hour if resolution == "hour" else period_key(resolution, hour), channel)
+                    self.rollups[key] = self.rollups.get(key, 0) + energy
+
+        if self.first_pending is None:
+            self.first_pending = time.monotonic()
+
+        if len(self.samples) >= self.batch_size or time.monotonic() - self.first_pending >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered samples, rollup increments and counter values in one transaction
+
+        :return: None
+        """
+        if not self.samples:
+            return
+
+        with self.db:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT INTO samples (timestamp, channel, value) VALUES (?, ?, ?)", self.samples)
+            self.db.executemany(
+                "INSERT INTO rollups (resolution, period, channel, energy) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (resolution, period, channel) DO UPDATE SET energy = energy + excluded.energy",
+                [(resolution, period, channel, energy) for (resolution, period, channel), energy in self.rollups.items()]
+            )
+            self.db.executemany(
+                "INSERT INTO counters (channel, timestamp, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (channel) DO UPDATE SET timestamp = excluded.timestamp, value = excluded.value",
+                [(channel, *self.counters[channel]) for channel in self.changed]
+            )
+            self.db.execute("DELETE FROM samples WHERE timestamp < ?", (time.time() - self.retention,))
+
+        self.samples = []
+        self.rollups = {}
+        self.changed = set()
+        self.first_pending = None
+
+    def report(self, resolution, start, end=None, channels=None):
+        """
+        Energy per period and channel
+
+        :param resolution: "hour", "day" or "month"
+        :param start: Start of the report (UNIX timestamp), the period containing it is included
+        :param end: End of the report (UNIX timestamp), defaults to now
+        :param channels: List of channels, defaults to all
+
+        :return: Dictionary period key -> {channel: energy}, the oldest period first
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution \"{resolution}\". Valid: {', '.join(RESOLUTIONS)}")
+
+        self.flush()
+
+        query = "SELECT period, channel, energy FROM rollups WHERE resolution = ? AND period BETWEEN ? AND ?"
+        params = [resolution, period_key(resolution, start), period_key(resolution, end or time.time())]
+
+        if channels:
+            query += f" AND channel IN ({', '.join('?' * len(channels))})"
+            params += channels
+
+        report = {}
+        for period, channel, energy in self.db.execute(query + " ORDER BY period", params):
+            report.setdefault(period, {})[channel] = round(energy, 1)
+
+        return report
+
+    def close(self):
+        self.flush()
+        self.db.close()
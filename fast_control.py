@@ -0,0 +1,176 @@
+INTERVAL = 0.5        # Control tick in seconds
+SLEW_RATE = 1000      # Maximum change of the charge limit in W per second
+DEADBAND = 100        # Minimum change of the charge limit in W to be written
+MARGIN = 50           # Part of the surplus in W left for the grid, so the battery doesn't charge from the grid
+MAX_LATENCY = 1.0     # Tick duration in seconds above which a tick is counted as late
+EXPORT_INTERVAL = 1.0        # Tick of the export limiting in seconds
+EXPORT_BOOST = 300           # Maximum W the export limit is raised above the cap to make up for the undershoot of the inverter
+EXPORT_GAIN = 0.5            # Part of the distance between the export and the cap the export limit is raised by per tick
+EXPORT_WRITE_INTERVAL = 5    # Minimum seconds between two raises of the export limit (lowering it is never delayed)
+
+
+class SurplusFollower:
+    """
+    Charge limit controller following the PV surplus: the target is the current grid export plus the current
+    battery charge power, less a margin, capped by the ceiling set by the SoE based controller.
+    The commanded limit moves towards the target at most 'slew_rate' W/s and is written only when it differs
+    from the last written one by at least 'deadband' W (or reaches 0 / the ceiling).
+    A step never covers more than one tick 'interval', so a missed tick doesn't bypass the slew rate.
+    """
+
+    def __init__(self, slew_rate=SLEW_RATE, deadband=DEADBAND, margin=MARGIN, interval=INTERVAL):
+        self.slew_rate = slew_rate
+        self.deadband = deadband
+        self.margin = margin
+        self.interval = interval
+        self.ceiling = 0
+        self.active = False
+        self.command = None
+        self.written = None
+        self.last_tick = None
+        self.latency = 0.0
+        self.late_ticks = 0
+
+    def reset(self, written, ceiling, active):
+        """
+        Synchronise with the state set by the SoE based controller
+
+        :param written: Current "rc_charge_limit" register value in W
+        :param ceiling: Maximum charge limit in W
+        :param active: Whether the battery is allowed to charge at all
+
+        :return: None
+        """
+        if active and not self.active:
+            # No ticks were run while inactive, the slew starts over
+            self.last_tick = None
+
+        self.written = written
+        self.ceiling = ceiling
+        self.active = active
+
+        if self.command is None or not active:
+            self.command = written
+
+    def update(self, meter_power, battery_power, now):
+        """
+        One control step
+
+        :param meter_power: Grid meter power in W, positive = export
+        :param battery_power: Battery power in W, positive = charging
+        :param now: Monotonic time of the measurement in seconds
+
+        :return: New charge limit in W to be written or None
+        """
+        dt = min(now - self.last_tick, self.interval) if self.last_tick is not None else 0
+        self.last_tick = now
+
+        if not self.active or self.command is None:
+            return None
+
+        target = min(max(meter_power + battery_power - self.margin, 0), self.ceiling)
+        step = self.slew_rate * dt
+
+        if target > self.command:
+            self.command = min(target, self.command + step)
+        else:
+            self.command = max(target, self.command - step)
+
+        limit = int(round(self.command))
+
+        if self.written is not None:
+            if limit == self.written:
+                return None
+            if abs(limit - self.written) < self.deadband and limit not in (0, self.ceiling):
+                return None
+
+        return limit
+
+    def written_ok(self, limit):
+        self.written = limit
+
+    def record_latency(self, seconds, max_latency=MAX_LATENCY):
+        self.latency = seconds
+        if seconds > max_latency:
+            self.late_ticks += 1
+
+
+class ExportLimiter:
+    """
+    Export limit controller keeping the grid feed-in at the cap of the site by driving the site limit of the inverter's
+    export limitation from the measured grid export. An export above the cap lowers the limit by the excess right away.
+    While the inverter holds the export below the cap and the battery can't take any more power, the limit is raised
+    step by step up to 'boost' W above the cap, so no more PV is curtailed than needed. While the battery still has
+    headroom, or the inverter isn't limiting at all, the limit goes back to the cap itself.
+    Raising the limit is written at most every 'write_interval' seconds and only by changes of 'deadband' W or more.
+    """
+
+    def __init__(self, cap, boost=EXPORT_BOOST, deadband=DEADBAND, write_interval=EXPORT_WRITE_INTERVAL, gain=EXPORT_GAIN):
+        self.cap = cap
+        self.boost = boost
+        self.deadband = deadband
+        self.write_interval = write_interval
+        self.gain = gain
+        self.ceiling = 0
+        self.command = cap
+        self.written = None
+        self.last_write = None
+        self.latency = 0.0
+        self.late_ticks = 0
+
+    def reset(self, ceiling, written=None):
+        """
+        Synchronise with the state set by the SoE based controller
+
+        :param ceiling: Battery charge power in W allowed by the SoE based controller (0 - the battery doesn't charge)
+        :param written: Current "export_control_site_limit" register value in W, None keeps the last written one
+
+        :return: None
+        """
+        self.ceiling = ceiling
+
+        if written is not None:
+            self.written = written
+
+    def update(self, meter_power, battery_power, now):
+        """
+        One control step
+
+        :param meter_power: Grid meter power in W, positive = export
+        :param battery_power: Battery power in W, positive = charging
+        :param now: Monotonic time of the measurement in seconds
+
+        :return: New export limit in W to be written or None
+        """
+        headroom = max(0, self.ceiling - max(battery_power, 0))
+        # The inverter is limiting when the export is close to the limit it applies
+        limiting = (self.command if self.written is None else self.written) - meter_power <= self.boost
+        upper = self.cap + self.boost if limiting and headroom < self.deadband else self.cap
+
+        if meter_power > self.cap:
+            self.command -= meter_power - self.cap
+        else:
+            self.command += self.gain * (self.cap - meter_power)
+
+        self.command = max(0, min(self.command, upper))
+        limit = int(round(self.command))
+
+        if self.written is None:
+            return limit
+        if limit < self.written:
+            if meter_power > self.cap or self.written - limit >= self.deadband:
+                return limit
+            return None
+        if limit - self.written >= self.deadband and (self.last_write is None or now - self.last_write >= self.write_interval):
+            return limit
+
+        return None
+
+    def written_ok(self, limit, now):
+        self.written = limit
+        self.last_write = now
+
+    def record_latency(self, seconds, max_latency=MAX_LATENCY):
+        self.latency = seconds
+        if seconds > max_latency:
+            self.late_ticks += 1
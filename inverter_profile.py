@@ -0,0 +1,228 @@
+import math
+import time
+
+import yaml
+
+
+SECTIONS = ["storage", "inverter"]  # Devices of a profile, in the order they are applied
+COMMIT_REGISTERS = {"inverter": "commit_power_control_settings"}  # Written after the registers of the section
+TOLERANCE = 1e-6            # Relative tolerance of the float registers (FLOAT32 rounding)
+RETRIES = 3                 # Write attempts of a section before giving up (see README "Limitations")
+RETRY_DELAY = 10            # Delay between the write attempts in seconds
+
+
+class ProfileError(ValueError):
+    pass
+
+
+def load(file_name, devices):
+    """
+    Load a profile: the desired values of writable registers per device section, e.g.
+        storage:
+          storage_control_mode: 4
+          storage_default_mode: 7
+        inverter:
+          export_control_site_limit: 5000
+
+    :param file_name: Profile file (YAML)
+    :param devices: Dictionary section -> solaredge_modbus device
+
+    :return: Dictionary section -> {register: value} with the values converted to the register types
+    """
+    with open(file_name, "r") as file:
+        content = yaml.safe_load(file) or {}
+
+    if not isinstance(content, dict):
+        raise ProfileError(f"\"{file_name}\" is no mapping of the sections {', '.join(SECTIONS)}")
+
+    profile = {}
+
+    for section, values in content.items():
+        if section not in devices:
+            raise ProfileError(f"Unknown section \"{section}\", expected one of {', '.join(SECTIONS)}")
+        if not isinstance(values, dict):
+            raise ProfileError(f"Section \"{section}\" is no mapping of registers to values")
+
+        device = devices[section]
+        profile[section] = {}
+
+        for register, value in values.items():
+            if register not in device.writable_registers:
+                raise ProfileError(f"\"{section}.{register}\" is no writable register. Writable are: "
+                                   f"{', '.join(device.writable_registers)}")
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ProfileError(f"\"{section}.{register}\" must be a number, not {value!r}")
+
+            vtype = device.registers[register].vtype
+            if vtype is int and value != int(value):
+                raise ProfileError(f"\"{section}.{register}\" must be an integer, not {value!r}")
+
+            profile[section][register] = vtype(value)
+
+    return profile
+
+
+def same(current, desired):
+    if isinstance(desired, float) or isinstance(current, float):
+        return math.isclose(current, desired, rel_tol=TOLERANCE, abs_tol=TOLERANCE)
+
+    return current == desired
+
+
+def read_current(profile, devices):
+    """
+    Read the current values of the registers of the profile - one read per span of registers
+
+    :param profile: Profile as returned by load()
+    :param devices: Dictionary section -> device
+
+    :return: Dictionary section -> {register: value}
+    """
+    current = {}
+
+    for section, values in profile.items():
+        read = devices[section].read_registers(list(values))
+        missing = [register for register in values if register not in read]
+        if missing:
+            raise ProfileError(f"Couldn't read {', '.join(f'{section}.{register}' for register in missing)}")
+
+        current[section] = {register: read[register] for register in values}
+
+    return current
+
+
+def diff(profile, current):
+    """
+    :param profile: Desired values as returned by load()
+    :param current: Current values as returned by read_current()
+
+    :return: Tuple (dictionary section -> {register: (current, desired)} of the changes only, number of unchanged registers)
+    """
+    changes = {}
+    unchanged = 0
+
+    for section in SECTIONS:
+        for register, desired in profile.get(section, {}).items():
+            if same(current[section][register], desired):
+                unchanged += 1
+            else:
+                changes.setdefault(section, {})[register] = (current[section][register], desired)
+
+    return changes, unchanged
+
+
+def write_requests(changes, devices):
+    """
+    Write requests needed for the changes
+
+    :return: List of (section, first address, list of registers), the commits included
+    """
+    planned = []
+
+    for section, values in changes.items():
+        device = devices[section]
+        for address, registers, words in device._write_groups({register: desired for register, (current, desired) in values.items()}):
+            planned.append((section, address, registers))
+        if section in COMMIT_REGISTERS:
+            planned.append((section, device.registers[COMMIT_REGISTERS[section]].address, [COMMIT_REGISTERS[section]]))
+
+    return planned
+
+
+def format_plan(changes, unchanged, devices):
+    lines = [f"{section}.{register}: {current} -> {desired}"
+             for section, values in changes.items() for register, (current, desired) in values.items()]
+
+    for section, address, registers in write_requests(changes, devices):
+        lines.append(f"write {section} 0x{address:04x}: {', '.join(registers)}")
+
+    count = sum(len(values) for values in changes.values())
+    lines.append(f"{count} to change, {unchanged} unchanged.")
+
+    return "\n".join(lines)
+
+
+def _write(device, section, values, is_error):
+    results = device.write_registers(values)
+    if section in COMMIT_REGISTERS:
+        results[COMMIT_REGISTERS[section]] = device.write(COMMIT_REGISTERS[section], 1)
+
+    return [register for register, result in results.items() if is_error(result)]
+
+
+def _write_verified(device, section, values, is_error, retries, retry_delay):
+    """
+    Write the values of a section and verify them with one read. The registers which failed or didn't read back
+    are written again after 'retry_delay' seconds - some storage registers only take a new value on the second
+    attempt (see README "Limitations").
+
+    :return: Tuple (registers whose write failed on the last attempt, registers which didn't read back, read values)
+    """
+    pending = values
+    failed = mismatched = []
+    read = {}
+
+    for attempt in range(max(1, retries)):
+        if attempt:
+            time.sleep(retry_delay)
+
+        failed = _write(device, section, pending, is_error)
+        read = device.read_registers(list(values))
+        mismatched = [register for register, value in values.items()
+                      if read.get(register) is None or not same(read[register], value)]
+
+        if not failed and not mismatched:
+            break
+
+        pending = {register: value for register, value in values.items() if register in failed or register in mismatched}
+
+    return failed, mismatched, read
+
+
+def apply(changes, devices, is_error, retries=RETRIES, retry_delay=RETRY_DELAY):
+    """
+    Write the changes - grouped into as few requests as possible, one section after the other - and verify
+    them with one read per section. Registers which fail or don't read back are written again up to 'retries'
+    attempts. When they still fail, the registers written so far are written back to their previous values
+    (with the same retries), so no partial profile is left behind.
+
+    :param changes: Changes as returned by diff()
+    :param devices: Dictionary section -> device
+    :param is_error: Function telling whether a write response failed
+    :param retries: Write attempts per section
+    :param retry_delay: Delay between the attempts in seconds
+
+    :return: Tuple (success, list of error messages)
+    """
+    applied = []
+    errors = []
+
+    for section in SECTIONS:
+        if section not in changes:
+            continue
+
+        device = devices[section]
+        desired = {register: value for register, (current, value) in changes[section].items()}
+        applied.append(section)
+
+        failed, mismatched, read = _write_verified(device, section, desired, is_error, retries, retry_delay)
+        if failed:
+            errors.append(f"Writing {', '.join(f'{section}.{register}' for register in failed)} failed")
+        if mismatched:
+            errors.append("Read back " + ", ".join(f"{section}.{register} = {read.get(register)} instead of {desired[register]}"
+                                                   for register in mismatched))
+        if errors:
+            break
+
+    if not errors:
+        return True, errors
+
+    for section in reversed(applied):
+        previous = {register: current for register, (current, value) in changes[section].items()}
+        failed, mismatched, read = _write_verified(devices[section], section, previous, is_error, retries, retry_delay)
+        if failed or mismatched:
+            errors.append(f"Rolling back {', '.join(f'{section}.{register}' for register in sorted(set(failed) | set(mismatched)))} failed")
+        else:
+            errors.append(f"Rolled back {', '.join(f'{section}.{register}' for register in previous)}")
+
+    return False, errors
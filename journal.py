@@ -0,0 +1,239 @@
+import json
+import os
+import time
+
+
+SYNC_INTERVAL = 5          # Maximum seconds records which don't need to be durable right away stay unsynced
+COMPACT_RECORDS = 1000     # Records appended after which the journal is compacted into a single snapshot record
+
+
+class Journal:
+    """
+    Write-ahead journal of the controller: the register writes it intends ("intent"), their outcome ("done",
+    "failed"), the register values read from the inverter ("state") and the manual overrides ("override").
+
+    Records are JSON lines appended to the file. The intents of a cycle are synced together before the first
+    write, all other records at the end of the cycle or after at most 'sync_interval' seconds. Replaying the file
+    restores the state on startup; a torn record of a crash mid-append ends the replay and is cut off.
+    After 'compact_records' records the file is atomically replaced by one snapshot record of the state.
+    """
+
+    def __init__(self, file_name, sync_interval=SYNC_INTERVAL, compact_records=COMPACT_RECORDS):
+        self.file_name = file_name
+        self.sync_interval = sync_interval
+        self.compact_records = compact_records
+
+        self.state = {}       # register -> {"value": value, "timestamp": time, "written": written by the controller}
+        self.pending = {}     # intent id -> {"register": register, "value": value, "timestamp": time}
+        self.overrides = {}   # register -> [value, until]
+        self.next_id = 1
+        self.records = 0
+        self.dropped = 0      # Bytes of the torn / corrupt records cut off by the last replay
+
+        self._load()
+        self.file = open(file_name, "a")
+        self.dirty = False
+        self.synced = time.monotonic()
+
+    def _apply(self, record):
+        kind = record["type"]
+
+        if kind == "intent":
+            self.pending[record["id"]] = {"register": record["register"], "value": record["value"], "timestamp": record["t"]}
+            self.next_id = max(self.next_id, record["id"] + 1)
+        elif kind in ("done", "failed"):
+            intent = self.pending.pop(record["id"], None)
+            if intent and kind == "done":
+                self.state[intent["register"]] = {"value": intent["value"], "timestamp": record["t"], "written": True}
+        elif kind == "state":
+            for register, value in record["values"].items():
+                self.state[register] = {"value": value, "timestamp": record["t"], "written": record.get("written", False)}
+        elif kind == "override":
+            if record["value"] is None:
+                self.overrides.pop(record["register"], None)
+            else:
+                self.overrides[record["register"]] = [record["value"], record["until"]]
+        elif kind == "snapshot":
+            self.state = record["state"]
+            self.pending = {int(intent_id): intent for intent_id, intent in record["pending"].items()}
+            self.overrides = record["overrides"]
+            self.next_id = record["next_id"]
+
+    def _load(self):
+        try:
+            with open(self.file_name, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return
+
+        good = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("Torn record")
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                break
+
+            good += len(line)
+            self.records += 1
+
+        if good < len(data):
+            # Everything after the first broken record is cut off, so the replay is the same on every start
+            self.dropped = len(data) - good
+            with open(self.file_name, "r+b") as file:
+                file.truncate(good)
+                os.fsync(file.fileno())
+
+    def _append(self, record):
+        record["t"] = record.get("t", time.time())
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._apply(record)
+        self.records += 1
+        self.dirty = True
+
+    def sync(self, force=True):
+        """
+        Make the appended records durable
+
+        :param force: Sync now, otherwise only once 'sync_interval' passed since the last sync
+
+        :return: None
+        """
+        if not self.dirty or (not force and time.monotonic() - self.synced < self.sync_interval):
+            return
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.dirty = False
+        self.synced = time.monotonic()
+
+        if self.records >= self.compact_records:
+            self.compact()
+
+    def compact(self):
+        """
+        Replace the journal by a single snapshot record (written to a temporary file, synced and renamed)
+
+        :return: None
+        """
+        snapshot = {
+            "type": "snapshot", "t": time.time(), "state": self.state, "pending": self.pending,
+            "overrides": self.overrides, "next_id": self.next_id
+        }
+        temp_name = self.file_name + ".tmp"
+
+        with open(temp_name, "w") as file:
+            file.write(json.dumps(snapshot, separators=(",", ":")) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.file.close()
+        os.replace(temp_name, self.file_name)
+
+        # The rename itself is durable only once the directory is synced
+        if hasattr(os, "O_DIRECTORY"):
+            directory = os.open(os.path.dirname(os.path.abspath(self.file_name)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+        self.file = open(self.file_name, "a")
+        self.records = 1
+        self.dirty = False
+
+    def intend(self, actions):
+        """
+        Journal the writes of a cycle before the first of them is sent (one sync for all)
+
+        :param actions: List of (register, value)
+
+        :return: List of the intent ids, in the order of the actions
+        """
+        ids = []
+
+        for register, value in actions:
+            ids.append(self.next_id)
+            self._append({"type": "intent", "id": self.next_id, "register": register, "value": value})
+
+        self.sync()
+
+        return ids
+
+    def done(self, intent_id, ok=True):
+        self._append({"type": "done" if ok else "failed", "id": intent_id})
+
+    def observe(self, values, written=False):
+        """
+        Journal register values - read from the inverter or, with 'written', written without an intent
+        (e.g. the fast control). Only the values which differ from the journaled state are appended.
+
+        :param values: Dictionary register -> value
+        :param written: The values were written by the controller
+
+        :return: None
+        """
+        changed = {register: value for register, value in values.items()
+                   if value is not None and self.state.get(register, {}).get("value") != value}
+
+        if changed:
+            self._append({"type": "state", "values": changed, "written": written})
+
+    def override(self, register, value, until=None):
+        self._append({"type": "override", "register": register, "value": value, "until": until})
+
+    def verify(self, values, max_age=None):
+        """
+        Reconcile the journal with freshly read register values: an intent without an outcome (crash mid-write)
+        whose value was read back is done, otherwise it is returned to be written again - only the last intent
+        per register, in the order of the intents. Intents older than 'max_age' seconds are failed instead of
+        written again: after a long outage the fresh control decisions replace them. Journaled values which
+        changed otherwise are reported as drift.
+
+        :param values: Dictionary register -> value read from the inverter
+        :param max_age: Maximum age in seconds of an intent to be written again (None - no limit)
+
+        :return: Tuple (list of (register, value) to be written again, dictionary register -> (journaled, read) value)
+        """
+        now = time.time()
+        last = {}
+        for intent_id, intent in sorted(self.pending.items()):
+            if intent["register"] in values:
+                last[intent["register"]] = intent_id
+
+        repairs = []
+        for intent_id, intent in sorted(self.pending.items()):
+            register = intent["register"]
+            if register not in values:
+                continue
+
+            if last[register] != intent_id or values[register] != intent["value"]:
+                # Superseded by a later intent, or not applied
+                self.done(intent_id, False)
+                if last[register] == intent_id and (max_age is None or now - intent["timestamp"] <= max_age):
+                    repairs.append((register, intent["value"]))
+            else:
+                self.done(intent_id)
+
+        drift = {register: (self.state[register]["value"], value) for register, value in values.items()
+                 if register in self.state and value is not None and self.state[register]["value"] != value}
+
+        self.observe(values)
+
+        return repairs, drift
+
+    def last_write(self, registers):
+        """
+        Time of the last confirmed write of any of the registers
+
+        :return: UNIX timestamp or None
+        """
+        times = [self.state[register]["timestamp"] for register in registers
+                 if self.state.get(register, {}).get("written")]
+
+        return max(times) if times else None
+
+    def close(self):
+        self.sync()
+        self.file.close()
@@ -0,0 +1,396 @@
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+import yaml
+
+import battery_wear
+import energy_store
+
+
+SLOT = 900                  # Planning slot in seconds
+HORIZON = 48                # Planning horizon in hours (limited by the end of the PV forecast)
+SOE_STEP = 0.5              # SoE discretisation of the dynamic programme in %
+EFFICIENCY = 0.95           # One-way battery charge / discharge efficiency
+IMPORT_PRICE = 0.30         # Price per imported kWh when there is no tariff file
+EXPORT_PRICE = 0.08         # Feed-in tariff per exported kWh when there is no tariff file
+BATTERY_COST = 5000.0       # Price of the battery in the currency of the tariffs
+WEAR_PRICE = BATTERY_COST / 100  # Cost of 1% of the battery life of the DoD table
+DEFAULT_LOAD = 400          # House consumption in W when the energy store has no history yet
+LOAD_HISTORY = 7            # Days of the energy store history the load profile is averaged over
+PLAN_FILE = "plan.json"
+PLAN_INTERVAL = 3600        # Re-planning interval in seconds
+
+
+def parse_timestamp(text):
+    """
+    :param text: UNIX timestamp or ISO 8601 date/time (local time if without a time zone)
+
+    :return: UNIX timestamp
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def load_series(file_name, columns):
+    """
+    Load a time series from a CSV file with a "timestamp" column
+
+    :param file_name: CSV file name
+    :param columns: Names of the value columns
+
+    :return: List of (timestamp, [values]) sorted by the timestamp
+    """
+    series = []
+
+    with open(file_name, "r", newline="") as file:
+        for row in csv.DictReader(file):
+            series.append((parse_timestamp(row["timestamp"]), [float(row[column]) for column in columns]))
+
+    series.sort()
+
+    return series
+
+
+def interpolate(series, column, timestamps):
+    """
+    Linear interpolation of a series at the given (sorted) timestamps. Outside the series the value is 0.
+
+    :param series: List of (timestamp, [values]) as returned by load_series()
+    :param column: Index of the value column
+    :param timestamps: Sorted timestamps
+
+    :return: List of values
+    """
+    values = []
+    idx = 0
+
+    for timestamp in timestamps:
+        while idx < len(series) - 1 and series[idx + 1][0] <= timestamp:
+            idx += 1
+
+        if not series or timestamp < series[0][0] or timestamp > series[-1][0]:
+            values.append(0.0)
+        elif idx == len(series) - 1:
+            values.append(series[idx][1][column])
+        else:
+            (t0, v0), (t1, v1) = series[idx], series[idx + 1]
+            values.append(v0[column] + (v1[column] - v0[column]) * (timestamp - t0) / (t1 - t0))
+
+    return values
+
+
+def step_values(series, column, timestamps, default):
+    """
+    Value valid at each of the given (sorted) timestamps: the one of the last row at or before it
+
+    :param series: List of (timestamp, [values]) as returned by load_series()
+    :param column: Index of the value column
+    :param timestamps: Sorted timestamps
+    :param default: Value when there is no series
+
+    :return: List of values
+    """
+    if not series:
+        return [default] * len(timestamps)
+
+    values = []
+    idx = 0
+
+    for timestamp in timestamps:
+        while idx < len(series) - 1 and series[idx + 1][0] <= timestamp:
+            idx += 1
+        values.append(series[idx][1][column])
+
+    return values
+
+
+def load_profile(store, days=LOAD_HISTORY, now=None):
+    """
+    Average house consumption per hour of the day from the hourly energy of the last days:
+    inverter AC energy + grid import - grid export
+
+    :param store: energy_store.EnergyStore
+    :param days: Number of days averaged
+    :param now: Current time (UNIX seconds)
+
+    :return: List of 24 values in W or None when there is less than a day of history
+    """
+    now = now or time.time()
+    hours = {}
+
+    for period, channels in store.report("hour", now - days * 86400, now - energy_store.HOUR).items():
+        if "inverter.energy_total" not in channels:
+            continue
+
+        load = channels["inverter.energy_total"]
+        for channel, energy in channels.items():
+            if channel.endswith(".import_energy_active"):
+                load += energy
+            elif channel.endswith(".export_energy_active"):
+                load -= energy
+
+        hours.setdefault(time.localtime(period).tm_hour, []).append(max(load, 0))
+
+    if len(hours) < 24:
+        return None
+
+    return [sum(hours[hour]) / len(hours[hour]) for hour in range(24)]
+
+
+def solve(pv, load, import_price, export_price, soe, capacity, max_power, min_soe, max_soe=100,
+          chemistry="NMC", wear_price=WEAR_PRICE, soe_step=SOE_STEP, efficiency=EFFICIENCY, slot=SLOT):
+    """
+    Dynamic programme over the discretised SoE: for each slot (backwards) and each SoE state the cheapest
+    transition to a next state is chosen. The battery charges from the PV surplus only and discharges into the
+    house load only (as it does in the "rc_cmd_mode"s the controller uses), so the transitions of a slot are
+    limited to a few states. The grid cost of each transition is computed once per slot, the wear penalty
+    once for all slots.
+
+    The wear of a discharge from SoE a to b is the difference of the DoD stress 1 / cycle_life(100 - SoE)
+    (README "Battery Life vs DoD" table) - deep discharges cost more per kWh than shallow ones.
+    The energy left in the battery at the end is valued at the mean import price less the wear of using it.
+
+    :param pv: PV production in W per slot
+    :param load: House consumption in W per slot
+    :param import_price: Price per imported kWh per slot
+    :param export_price: Feed-in tariff per exported kWh per slot
+    :param soe: Current SoE in %
+    :param capacity: Battery capacity in Wh
+    :param max_power: Maximum battery charge / discharge power in W
+    :param min_soe: Lowest SoE the plan may discharge to in % (backup reserve)
+    :param max_soe: Highest SoE in %
+    :param chemistry: Battery chemistry - key of battery_wear.DOD_CYCLE_LIFE
+    :param wear_price: Cost of 1% of the battery life
+    :param soe_step: SoE discretisation in %
+    :param efficiency: One-way charge / discharge efficiency
+    :param slot: Slot length in seconds
+
+    :return: Tuple (total cost, list of per slot dictionaries with the SoE at the slot end, the battery and grid
+    energy in Wh (+ charge / import) and whether the plan charges / discharges less than it could)
+    """
+    hours = slot / 3600
+    states = [min_soe + idx * soe_step for idx in range(int((max_soe - min_soe) / soe_step) + 1)]
+    count = len(states)
+    quantum = capacity * soe_step / 100
+    stress = [wear_price * 100 / battery_wear.cycle_life(100 - state, chemistry) for state in states]
+
+    terminal_price = sum(import_price) / len(import_price) * efficiency / 1000 if import_price else 0
+    value = [-(state - min_soe) / 100 * capacity * terminal_price + stress[0] - stress[i] for i, state in enumerate(states)]
+    policy = []
+    limits = []
+
+    for t in reversed(range(len(pv))):
+        net = (load[t] - pv[t]) * hours
+        up = int(min(max(-net, 0) * efficiency, max_power * hours) // quantum)
+        down = int(min(max(net, 0) / efficiency, max_power * hours) // quantum)
+
+        # Grid cost per transition (in states) of this slot
+        costs = {}
+        for delta in range(-down, up + 1):
+            grid = net + (delta * quantum / efficiency if delta > 0 else delta * quantum * efficiency)
+            costs[delta] = grid * (import_price[t] if grid > 0 else export_price[t]) / 1000
+
+        next_value = value
+        value = [0.0] * count
+        choice = [0] * count
+
+        # Highest next state first, so (nearly) equal alternatives charge as early / discharge as late as possible
+        for i in range(count):
+            best = None
+            for j in range(min(count - 1, i + up), max(0, i - down) - 1, -1):
+                cost = costs[j - i] + next_value[j]
+                if j < i:
+                    cost += stress[j] - stress[i]
+                if best is None or cost < best - 1e-9:
+                    best = cost
+                    choice[i] = j
+            value[i] = best
+
+        policy.append(choice)
+        limits.append((up, down))
+
+    policy.reverse()
+    limits.reverse()
+
+    state = min(max(int(round((soe - min_soe) / soe_step)), 0), count - 1)
+    total = value[state]
+    path = []
+
+    for t, choice in enumerate(policy):
+        next_state = choice[state]
+        delta = next_state - state
+        battery = delta * quantum
+        up, down = limits[t]
+        path.append({
+            "soe": states[next_state],
+            "battery": battery,
+            "grid": (load[t] - pv[t]) * hours + (battery / efficiency if battery > 0 else battery * efficiency),
+            "charge_held": up > 0 and delta < min(up, count - 1 - state),
+            "discharge_held": down > 0 and -delta < min(down, state)
+        })
+        state = next_state
+
+    return total, path
+
+
+def plan(config, soe, capacity, max_power, min_soe, chemistry="NMC", store=None, now=None):
+    """
+    Plan the next hours in SLOT slots and derive the controller parameters per slot:
+    - "upper_charging_limit": the highest SoE the current charging run of the plan reaches
+    - "charge_limit": the planned charge power when the plan stores less of the PV surplus than it could,
+      otherwise the maximum power
+    - "backup_reserve": the planned SoE when the plan holds the energy back for later slots, otherwise the
+      backup reserve
+    From the slot on which the plan leaves the battery idle until its end, the parameters are None: the plan has
+    nothing to hold the energy back for, so the period values apply.
+
+    :param config: "planner" section of config.yaml
+    :param soe: Current SoE in %
+    :param capacity: Battery capacity in Wh
+    :param max_power: Maximum battery charge power in W
+    :param min_soe: Backup reserve in %
+    :param chemistry: Battery chemistry
+    :param store: energy_store.EnergyStore for the load profile
+    :param now: Current time (UNIX seconds)
+
+    :return: Plan dictionary (JSON serialisable)
+    """
+    now = now or time.time()
+    slot = config.get("slot", SLOT)
+    start = int(now - now % slot)
+
+    forecast = load_series(config["pv_forecast"], ["pv"])
+    slots = int(config.get("horizon", HORIZON) * 3600 // slot)
+    if forecast:
+        slots = max(1, min(slots, int((forecast[-1][0] - start) // slot)))
+    timestamps = [start + idx * slot for idx in range(slots)]
+
+    pv = interpolate(forecast, 0, [timestamp + slot / 2 for timestamp in timestamps])
+
+    tariffs = load_series(config["tariffs"], ["import_price", "export_price"]) if config.get("tariffs") else []
+    import_price = step_values(tariffs, 0, timestamps, config.get("import_price", IMPORT_PRICE))
+    export_price = step_values(tariffs, 1, timestamps, config.get("export_price", EXPORT_PRICE))
+
+    profile = load_profile(store, now=now) if store else None
+    load = [profile[time.localtime(timestamp).tm_hour] if profile else config.get("load", DEFAULT_LOAD)
+            for timestamp in timestamps]
+
+    started = time.perf_counter()
+    cost, path = solve(
+        pv, load, import_price, export_price, soe, capacity, max_power, min_soe,
+        chemistry=chemistry, wear_price=config.get("battery_cost", BATTERY_COST) / 100,
+        soe_step=config.get("soe_step", SOE_STEP), efficiency=config.get("efficiency", EFFICIENCY), slot=slot
+    )
+    duration = time.perf_counter() - started
+
+    hours = slot / 3600
+    result = []
+    peak = None
+    idle = True
+
+    for idx in reversed(range(len(path))):
+        step = path[idx]
+        charge = max(step["battery"], 0) / hours
+        idle = idle and not step["battery"]
+
+        # Peak of the charging run: reset where the plan discharges next
+        if peak is None or (idx + 1 < len(path) and path[idx + 1]["battery"] < 0):
+            peak = step["soe"]
+        else:
+            peak = max(peak, step["soe"])
+
+        if idle:
+            parameters = {"upper_charging_limit": None, "charge_limit": None, "backup_reserve": None}
+        else:
+            parameters = {
+                "upper_charging_limit": peak,
+                "charge_limit": int(math.ceil(charge / 100) * 100) if step["charge_held"] else int(max_power),
+                "backup_reserve": int(step["soe"]) if step["discharge_held"] else min_soe
+            }
+
+        result.append({
+            "start": timestamps[idx],
+            "soe": step["soe"],
+            "battery_power": round(step["battery"] / hours),
+            "grid_power": round(step["grid"] / hours),
+            "pv": round(pv[idx]),
+            "load": round(load[idx]),
+            "import_price": import_price[idx],
+            "export_price": export_price[idx],
+            **parameters
+        })
+
+    result.reverse()
+
+    return {
+        "created": round(now),
+        "slot": slot,
+        "cost": round(cost, 2),
+        "solve_seconds": round(duration, 3),
+        "slots": result
+    }
+
+
+def current_slot(plan_values, now=None):
+    """
+    :param plan_values: Plan as returned by plan()
+    :param now: Current time (UNIX seconds)
+
+    :return: The slot of the plan containing now or None
+    """
+    now = now or time.time()
+
+    for slot in plan_values["slots"]:
+        if slot["start"] <= now < slot["start"] + plan_values["slot"]:
+            return slot
+
+    return None
+
+
+def load_plan(file_name):
+    if not os.path.isfile(file_name):
+        return None
+
+    with open(file_name, "r") as file:
+        return json.load(file)
+
+
+def save_plan(plan_values, file_name):
+    tmp_file = file_name + ".tmp"
+
+    with open(tmp_file, "w") as file:
+        json.dump(plan_values, file)
+
+    os.replace(tmp_file, file_name)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Day-ahead battery plan from the PV forecast and the tariffs")
+    arg_parser.add_argument("--config", type=str, default="config.yaml", help="Configuration file")
+    arg_parser.add_argument("--soe", type=float, required=True, help="Current SoE in %%")
+    arg_parser.add_argument("--capacity", type=float, default=10240, help="Battery capacity in Wh")
+    arg_parser.add_argument("--max_power", type=float, default=None, help="Maximum battery power in W (default \"charge_limit\")")
+    arg_parser.add_argument("--backup_reserve", type=float, default=None, help="Backup reserve in %% (default \"backup_reserve\")")
+    args = arg_parser.parse_args()
+
+    with open(args.config, "r") as config_file:
+        config = yaml.safe_load(config_file)
+
+    default_config = config["defaul_config"]
+    planner_config = config["planner"]
+    energy_db = default_config.get("energy_db")
+    plan_store = energy_store.EnergyStore(energy_db) if energy_db and os.path.isfile(energy_db) else None
+
+    print(json.dumps(plan(
+        planner_config, args.soe, args.capacity,
+        args.max_power or default_config["charge_limit"],
+        args.backup_reserve if args.backup_reserve is not None else default_config["backup_reserve"],
+        default_config.get("battery_chemistry", "NMC"), plan_store
+    ), indent=2))
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import select
+import signal
+import sys
+import time
+import tty
+
+import solaredge_modbus
+
+
+CAPTURE_RANGES = [(0x9c40, 0x9f00), (0xe000, 0xe300)]  # SunSpec chain (inverter, meters), storage control and batteries
+EXCEPTION_ILLEGAL_FUNCTION = 1
+EXCEPTION_ILLEGAL_ADDRESS = 2
+
+
+def crc16(frame):
+    """
+    Modbus RTU CRC
+
+    :param frame: Frame bytes without the CRC
+
+    :return: CRC as the two bytes appended to the frame (low byte first)
+    """
+    crc = 0xffff
+
+    for byte in frame:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+
+    return bytes((crc & 0xff, crc >> 8))
+
+
+def load_image(file_name):
+    """
+    Register image: JSON {unit: {start address: [register words]}}
+
+    :param file_name: Image file
+
+    :return: Dictionary unit -> {address: word}
+    """
+    with open(file_name, "r") as image_file:
+        blocks = json.load(image_file)
+
+    return {int(unit): {int(start) + idx: word for start, words in unit_blocks.items() for idx, word in enumerate(words)}
+            for unit, unit_blocks in blocks.items()}
+
+
+def save_image(file_name, image):
+    blocks = {}
+
+    for unit, registers in image.items():
+        unit_blocks = blocks.setdefault(str(unit), {})
+        start = None
+
+        for address in sorted(registers):
+            if start is None or address != start + len(unit_blocks[str(start)]):
+                start = address
+                unit_blocks[str(start)] = []
+            unit_blocks[str(start)].append(registers[address])
+
+    with open(file_name, "w") as image_file:
+        json.dump(blocks, image_file)
+
+
+def capture(host, port, unit, ranges=CAPTURE_RANGES):
+    """
+    Read the register image of an inverter reachable over Modbus TCP. Reads the device rejects are split
+    in halves until the readable registers are found.
+
+    :param host: Modbus TCP address
+    :param port: Modbus TCP port
+    :param unit: Modbus device address
+    :param ranges: List of (first address, end address)
+
+    :return: Dictionary address -> word
+    """
+    inverter = solaredge_modbus.Inverter(host=host, port=port, unit=unit, retries=1)
+    registers = {}
+
+    def read(address, length):
+        values = inverter._read_holding_registers_raw(address, length)
+
+        if values:
+            registers.update(zip(range(address, address + length), values))
+        elif length > 1:
+            read(address, length // 2)
+            read(address + length // 2, length - length // 2)
+
+    for start, end in ranges:
+        for address in range(start, end, solaredge_modbus.MAX_READ_REGISTERS):
+            read(address, min(solaredge_modbus.MAX_READ_REGISTERS, end - address))
+
+    inverter.disconnect()
+
+    return registers
+
+
+class Standin:
+    """
+    Modbus RTU slave on a pseudo terminal serving register images (read holding registers, write single
+    and multiple registers). Responses are delayed by the line time of the request and response at the
+    emulated baud rate plus the device turnaround, so transaction counts and timings compare to a real bus.
+    Units without an image don't answer, like absent devices on a shared bus.
+    """
+
+    def __init__(self, image, baud=115200, parity="N", stopbits=1, turnaround=solaredge_modbus.RTU_TURNAROUND):
+        self.image = image
+        self.char_time = solaredge_modbus.rtu_timing(baud, parity, stopbits)[0]
+        self.turnaround = turnaround
+        self.transactions = 0
+        self.registers = 0
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+
+    def _frame_length(self, buffer):
+        if len(buffer) < 2:
+            return None
+        if buffer[1] in (3, 6):
+            return 8
+        if buffer[1] == 16:
+            return 9 + buffer[6] if len(buffer) >= 7 else None
+
+        return len(buffer)
+
+    def _respond(self, request):
+        unit, function = request[0], request[1]
+        registers = self.image[unit]
+
+        if function not in (3, 6, 16):
+            return bytes((unit, function | 0x80, EXCEPTION_ILLEGAL_FUNCTION))
+
+        address = int.from_bytes(request[2:4], "big")
+
+        if function == 6:
+            registers[address] = int.from_bytes(request[4:6], "big")
+            return request[:6]
+
+        count = int.from_bytes(request[4:6], "big")
+        addresses = range(address, address + count)
+
+        if function == 16:
+            for idx, target in enumerate(addresses):
+                registers[target] = int.from_bytes(request[7 + 2 * idx:9 + 2 * idx], "big")
+            return request[:6]
+
+        if not all(target in registers for target in addresses):
+            return bytes((unit, function | 0x80, EXCEPTION_ILLEGAL_ADDRESS))
+
+        self.registers += count
+        return bytes((unit, function, 2 * count)) + b"".join(registers[target].to_bytes(2, "big") for target in addresses)
+
+    def serve(self):
+        buffer = b""
+
+        while True:
+            # A partial frame followed by silence is a broken frame
+            ready, _, _ = select.select([self.master], [], [], None if not buffer else 0.1)
+            if not ready:
+                buffer = b""
+                continue
+
+            buffer += os.read(self.master, 512)
+
+            while (length := self._frame_length(buffer)) is not None and len(buffer) >= length:
+                request, buffer = buffer[:length], buffer[length:]
+
+                if request[-2:] != crc16(request[:-2]):
+                    buffer = b""
+                    break
+
+                if request[0] not in self.image:
+                    continue
+
+                self.transactions += 1
+                response = self._respond(request)
+                response += crc16(response)
+
+                time.sleep(self.turnaround + (len(request) + len(response)) * self.char_time)
+                os.write(self.master, response)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Modbus RTU stand-in of an inverter on a pseudo terminal, serving a captured register image")
+    arg_parser.add_argument("image", type=str, help="Register image file (JSON)")
+    arg_parser.add_argument("--capture", type=str, default=None,
+                            help="Capture the image from the inverter at HOST[:PORT] over Modbus TCP and exit")
+    arg_parser.add_argument("--unit", type=int, default=1, help="Modbus device address")
+    arg_parser.add_argument("--baud", type=int, default=115200, help="Emulated baud rate")
+    arg_parser.add_argument("--parity", type=str, choices=["N", "E", "O"], default="N", help="Emulated parity")
+    arg_parser.add_argument("--stopbits", type=int, choices=[1, 2], default=1, help="Emulated stop bits")
+    args = arg_parser.parse_args()
+
+    if args.capture:
+        host, _, port = args.capture.partition(":")
+        registers = capture(host, int(port or 1502), args.unit)
+        save_image(args.image, {args.unit: registers})
+        print(f"Captured {len(registers)} registers into {args.image}")
+        exit()
+
+    standin = Standin(load_image(args.image), args.baud, args.parity, args.stopbits)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    print(standin.path, flush=True)
+
+    try:
+        standin.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"{standin.transactions} transactions, {standin.registers} registers read", file=sys.stderr)
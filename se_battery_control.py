@@ -1,10 +1,27 @@
 import argparse
+import atexit
+import cProfile
 import logging
+import math
+import os
+import signal
+import tempfile
 from logging.handlers import RotatingFileHandler
 import json
 from datetime import datetime
 import time
 import solaredge_modbus
+import battery_wear
+import telemetry
+import status_api
+import fast_control
+import tracing
+import alerts
+import energy_store
+import planner
+import journal
+import shared_snapshot
+import inverter_profile
 import yaml
 from pymodbus import exceptions as pymbEx
 
@@ -20,6 +37,85 @@ UPPER_CHARGING_LIMIT = 80  # Upper charging limit in %
 SOE_DELTA_CHARGE = 5       # When the SOE drops by this amount of %, start charging again
 BACKUP_RESERVE = 10        # Charge in % reserved only for backup + SE Home Batteries 48V has 10% reserved energy which cannot be changed/used
 CHARGE_LIMIT = 5000        # Battery maximum charge power in W
+BATTERY_CHEMISTRY = "NMC"  # Battery chemistry for the wear estimation: NMC or LiFePO4
+WEAR_STATE_FILE = "battery_wear.json"
+CONNECTION_STATE_FILE = "connection_state.json"  # Circuit breaker state shared between the CronJob runs
+CAPABILITY_STATE_FILE = "capabilities.json"  # Registers the devices don't support, per serial number and firmware
+CYCLE_BUDGET = 60          # Maximum duration of one update cycle in seconds
+RETRY_DELAY = 10           # Delay between the write retries in seconds
+STALE_LOCK_AGE = 3600      # Age in seconds after which a lock file without a readable owner PID is considered stale
+SAMPLE_INTERVAL = 1        # Telemetry sampling interval in seconds in the service mode. 0 disables the sampling
+TELEMETRY_MEMORY = telemetry.MEMORY_BUDGET  # Memory budget of the telemetry history in bytes
+TELEMETRY = None           # In-memory telemetry history (service mode only)
+API_HOST = "127.0.0.1"     # Listen address of the status API
+API_PORT = 0               # Listen port of the status API in the service mode. 0 disables the API
+STATUS = None              # Controller status served by the API (service mode only)
+ACTIVE_PERIOD = None       # Period of config.yaml applied by the last update
+OVERRIDES = {}             # Manual overrides from the API: register -> (value, expiry timestamp)
+FAST_CONTROL = False       # Surplus following charge limit control in the service mode
+FAST_CONTROL_INTERVAL = fast_control.INTERVAL  # Tick of the fast control in seconds
+SLEW_RATE = fast_control.SLEW_RATE  # Maximum change of the charge limit in W/s
+WRITE_DEADBAND = fast_control.DEADBAND  # Minimum change of the charge limit in W to be written
+FAST_CONTROLLER = None     # fast_control.SurplusFollower (service mode only)
+FAST_CONTROL_MODES = [1, 2, 3, 7]  # "rc_cmd_mode" values in which the battery charges and the fast control is active
+EXPORT_CONTROL = False     # Dynamic export limiting in the service mode
+EXPORT_LIMIT = 5000        # Grid feed-in cap of the site in W
+EXPORT_CONTROL_INTERVAL = fast_control.EXPORT_INTERVAL  # Tick of the export limiting in seconds
+EXPORT_BOOST = fast_control.EXPORT_BOOST  # Maximum W the export limit is raised above the cap to make up for the inverter's undershoot
+EXPORT_WRITE_INTERVAL = fast_control.EXPORT_WRITE_INTERVAL  # Minimum seconds between two raises of the export limit
+EXPORT_LIMITER = None      # fast_control.ExportLimiter (service mode only)
+EXPORT_ORIGINAL = None     # Export control registers as found before the setup, restored at exit
+EXPORT_CONTROL_DIRECT = 1  # "export_control_mode": direct export limitation (by the grid meter)
+EXPORT_CONTROL_TOTAL = 0   # "export_control_limit_mode": total (site) limit
+TRACER = tracing.Tracer()  # Phase tracing - enabled with --profile, latency percentiles in the service mode
+TRACE_FILE = "se_battery_control.trace.json"
+ALERTS = None              # alerts.RuleEngine with the rules of the "alerts" section of config.yaml (service mode only)
+ALERT_VALUES = {}          # Latest storage, battery and telemetry values the alert rules are evaluated on
+ENERGY_DB = "energy.sqlite"  # SQLite database of the hourly/daily/monthly energy. Empty disables it
+ENERGY_STORE = None        # energy_store.EnergyStore, opened by the first update
+PLANNER = None             # "planner" section of config.yaml. None - the periods only
+PLAN = None                # Current day-ahead plan (see planner.py)
+JOURNAL_FILE = "controller_journal.jsonl"  # Write-ahead journal of the controller's writes and state. Empty disables it
+JOURNAL = None             # journal.Journal, opened at startup
+SHARED_MEMORY = shared_snapshot.NAME  # Shared memory segment the latest values are published to (service mode). Empty disables it
+SNAPSHOT = None            # shared_snapshot.SnapshotWriter (service mode only)
+POLLER = None              # solaredge_modbus.PollScheduler of the telemetry registers
+
+# Override keys of the API and the registers they are applied to
+OVERRIDE_REGISTERS = {
+    "rc_cmd_mode": "rc_cmd_mode",
+    "rc_charge_limit": "rc_charge_limit",
+    "backup_reserve": "storage_backup_reserved_setting"
+}
+
+# Registers read by the update routine. Each list is read as one span (per battery)
+STORAGE_CONTROL_REGISTERS = ["storage_backup_reserved_setting", "rc_cmd_timeout", "rc_cmd_mode", "rc_charge_limit"]
+BATTERY_STATIC_REGISTERS = ["c_manufacturer"]
+BATTERY_CONTROL_REGISTERS = [
+    "rated_energy", "maximum_temperature", "instantaneous_power", "lifetime_export_energy_counter",
+    "lifetime_import_energy_counter", "soh", "soe", "status"
+]
+BATTERY_STATUS_FAULT = solaredge_modbus.BATTERY_STATUS_MAP.index("Fault")
+ENERGY_METER_REGISTERS = ["export_energy_active", "import_energy_active"]
+ENERGY_BATTERY_REGISTERS = ["lifetime_export_energy_counter", "lifetime_import_energy_counter"]
+ENERGY_REPORT_WINDOWS = {"hour": 2 * 86400, "day": 366 * 86400, "month": 366 * 86400}
+battery_static = {}
+telemetry_devices = {}
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+RC_CMD_MODES = {
+    0: "Off",
+    1: "Charge from excess PV power only",
+    2: "Charge from PV first",
+    3: "Charge from PV and AC",
+    4: "Maximize export",
+    5: "Discharge to match load",
+    7: "Maximize self consumption"
+}
 
 
 def read_config(default=False):
@@ -39,6 +135,26 @@ def read_config(default=False):
     global SOE_DELTA_CHARGE
     global BACKUP_RESERVE
     global CHARGE_LIMIT
+    global BATTERY_CHEMISTRY
+    global CYCLE_BUDGET
+    global SAMPLE_INTERVAL
+    global TELEMETRY_MEMORY
+    global API_HOST
+    global API_PORT
+    global ACTIVE_PERIOD
+    global FAST_CONTROL
+    global FAST_CONTROL_INTERVAL
+    global SLEW_RATE
+    global WRITE_DEADBAND
+    global EXPORT_CONTROL
+    global EXPORT_LIMIT
+    global EXPORT_CONTROL_INTERVAL
+    global EXPORT_BOOST
+    global EXPORT_WRITE_INTERVAL
+    global ENERGY_DB
+    global PLANNER
+    global JOURNAL_FILE
+    global SHARED_MEMORY
 
     with open('config.yaml', 'r') as file:
         CONFIG = yaml.safe_load(file)
@@ -49,29 +165,70 @@ def read_config(default=False):
         SOE_DELTA_CHARGE = CONFIG["defaul_config"]["soe_delta_charge"]
         BACKUP_RESERVE = CONFIG["defaul_config"]["backup_reserve"]
         CHARGE_LIMIT = CONFIG["defaul_config"]["charge_limit"]
+        BATTERY_CHEMISTRY = CONFIG["defaul_config"].get("battery_chemistry", BATTERY_CHEMISTRY)
+        CYCLE_BUDGET = CONFIG["defaul_config"].get("cycle_budget", CYCLE_BUDGET)
+        SAMPLE_INTERVAL = CONFIG["defaul_config"].get("sample_interval", SAMPLE_INTERVAL)
+        TELEMETRY_MEMORY = CONFIG["defaul_config"].get("telemetry_memory", TELEMETRY_MEMORY)
+        API_HOST = CONFIG["defaul_config"].get("api_host", API_HOST)
+        API_PORT = CONFIG["defaul_config"].get("api_port", API_PORT)
+        FAST_CONTROL = CONFIG["defaul_config"].get("fast_control", FAST_CONTROL)
+        FAST_CONTROL_INTERVAL = CONFIG["defaul_config"].get("fast_control_interval", FAST_CONTROL_INTERVAL)
+        SLEW_RATE = CONFIG["defaul_config"].get("slew_rate", SLEW_RATE)
+        WRITE_DEADBAND = CONFIG["defaul_config"].get("write_deadband", WRITE_DEADBAND)
+        EXPORT_CONTROL = CONFIG["defaul_config"].get("export_control", EXPORT_CONTROL)
+        EXPORT_LIMIT = CONFIG["defaul_config"].get("export_limit", EXPORT_LIMIT)
+        EXPORT_CONTROL_INTERVAL = CONFIG["defaul_config"].get("export_control_interval", EXPORT_CONTROL_INTERVAL)
+        EXPORT_BOOST = CONFIG["defaul_config"].get("export_boost", EXPORT_BOOST)
+        EXPORT_WRITE_INTERVAL = CONFIG["defaul_config"].get("export_write_interval", EXPORT_WRITE_INTERVAL)
+        ENERGY_DB = CONFIG["defaul_config"].get("energy_db", ENERGY_DB)
+        JOURNAL_FILE = CONFIG["defaul_config"].get("journal_file", JOURNAL_FILE)
+        SHARED_MEMORY = CONFIG["defaul_config"].get("shared_memory", SHARED_MEMORY)
+        PLANNER = CONFIG.get("planner")
+        ACTIVE_PERIOD = "default"
         log_config()
         return
 
     periods = CONFIG["periods"]
+    matched = False
 
     for period in periods:
         today_datetime = datetime.today()
-        period_start = period["period_start"].split("-")
-        period_end = period["period_end"].split("-")
-        period_start_datetime = datetime.strptime(
-            f"{period_start[1]} {period_start[0]}, {today_datetime.year}", "%b %d, %Y"
-        )
-        period_end_datetime = datetime.strptime(
-            f"{period_end[1]} {period_end[0]}, {today_datetime.year} 23:59:59", "%b %d, %Y %H:%M:%S"
-        )
+        period_start_datetime, period_end_datetime = period_range(period, today_datetime.year)
 
         if period_start_datetime <= today_datetime <= period_end_datetime:
             UPPER_CHARGING_LIMIT = period["config"]["upper_charging_limit"]
             SOE_DELTA_CHARGE = period["config"]["soe_delta_charge"]
             BACKUP_RESERVE = period["config"]["backup_reserve"]
             CHARGE_LIMIT = period["config"]["charge_limit"]
+            ACTIVE_PERIOD = f"{period['period_start']} - {period['period_end']}"
+            matched = True
             log_config()
 
+    # The default config applies when the current day fits in none of the periods
+    if not matched:
+        read_config(True)
+
+
+def period_range(period, year):
+    """
+    Start and end (inclusive) of a configuration period in the given year
+
+    :param period: Period entry from the "periods" section of config.yaml
+    :param year: The year for which the period dates are evaluated
+
+    :return: Tuple (start datetime, end datetime)
+    """
+    period_start = period["period_start"].split("-")
+    period_end = period["period_end"].split("-")
+    period_start_datetime = datetime.strptime(
+        f"{period_start[1]} {period_start[0]}, {year}", "%b %d, %Y"
+    )
+    period_end_datetime = datetime.strptime(
+        f"{period_end[1]} {period_end[0]}, {year} 23:59:59", "%b %d, %Y %H:%M:%S"
+    )
+
+    return period_start_datetime, period_end_datetime
+
 
 def log_config():
     """
@@ -84,15 +241,20 @@ def log_config():
     LOGGER.debug(f"SOE_DELTA_CHARGE = {SOE_DELTA_CHARGE}")
     LOGGER.debug(f"BACKUP_RESEVE = {BACKUP_RESERVE}")
     LOGGER.debug(f"CHARGE_LIMIT = {CHARGE_LIMIT}")
+    LOGGER.debug(f"BATTERY_CHEMISTRY = {BATTERY_CHEMISTRY}")
+    LOGGER.debug(f"CYCLE_BUDGET = {CYCLE_BUDGET}")
 
 
-def read_values():
+def read_values(scaled=True):
     """
     Read all values/settings from the inverter
 
+    :param scaled: Return the values in engineering units with the scale factors applied.
+    When False the raw register values are returned together with the separate "*_scale" registers
+
     :return: None
     """
-    values = inverter.read_all()
+    values = inverter.read_all(scaled=scaled)
     meters = inverter.meters()
     batteries = inverter.batteries()
     values["meters"] = {}
@@ -100,7 +262,7 @@ def read_values():
     values["storage"] = storage.read_all()
 
     for meter, params in meters.items():
-        meter_values = params.read_all()
+        meter_values = params.read_all(scaled=scaled)
         values["meters"][meter] = meter_values
 
     for battery, params in batteries.items():
@@ -110,54 +272,800 @@ def read_values():
     return values
 
 
-def set_storage_control_mode(val=4, retries=3):
+def read_control_values():
     """
-    Set "storage_contol_mode" (0xE004) - storage control mode
-      0: "Disabled"
-      1: "Maximize Self Consumption"
-      2: "Time of Use"
-      3: "Backup Only"
-      4: "Remote Control"
+    Read only the registers needed by the update routine: one span read for the storage registers
+    and one span read per discovered battery. The static battery registers are read only once.
+
+    :return: Dictionary with the "storage" and "batteries" values
+    """
+    values = {
+        "storage": storage.read_registers(STORAGE_CONTROL_REGISTERS),
+        "batteries": {}
+    }
+
+    for battery, params in inverter.batteries().items():
+        if battery not in battery_static:
+            battery_static[battery] = params.read_registers(BATTERY_STATIC_REGISTERS)
+        values["batteries"][battery] = {**battery_static[battery], **params.read_registers(BATTERY_CONTROL_REGISTERS)}
+
+    return values
+
+
+def aggregate_batteries(batteries):
+    """
+    Aggregate all batteries into a single one: the SoE and SoH are weighted by the battery capacities,
+    capacities, powers and energy counters are summed up. The maximum temperature is the highest one
+    and the status is "Fault" (5) when any battery is in fault, otherwise the status of the first battery.
+    Batteries without a SoE (e.g. their read failed) are left out, so they don't count as empty.
+
+    :param batteries: Battery values per battery as returned by read_control_values()
+
+    :return: Dictionary with the aggregated battery values or None if there is no usable battery
+    """
+    capacity = energy = health = health_capacity = power = export_energy = import_energy = 0
+    temperature = status = None
+
+    for values in batteries.values():
+        battery_capacity = values.get("rated_energy")
+        if not battery_capacity:
+            continue
+
+        if values.get("status") == BATTERY_STATUS_FAULT:
+            status = BATTERY_STATUS_FAULT
+
+        soe = values.get("soe")
+        if not isinstance(soe, (int, float)) or soe != soe:
+            continue
+
+        if values.get("maximum_temperature") is not None:
+            temperature = max(values["maximum_temperature"], temperature if temperature is not None else -273)
+        if status is None:
+            status = values.get("status")
+
+        # The SolarEdge batteries report the usable energy only (90%)
+        if values.get("c_manufacturer") == "SolarEdge":
+            battery_capacity = battery_capacity / 0.9
+
+        capacity += battery_capacity
+        energy += battery_capacity * soe / 100
+        if isinstance(values.get("soh"), (int, float)):
+            health += battery_capacity * values["soh"] / 100
+            health_capacity += battery_capacity
+        power += values.get("instantaneous_power") or 0
+        export_energy += values.get("lifetime_export_energy_counter") or 0
+        import_energy += values.get("lifetime_import_energy_counter") or 0
+
+    if not capacity:
+        return None
+
+    return {
+        "rated_energy": round(capacity),
+        "soe": energy / capacity * 100,
+        "soh": health / health_capacity * 100 if health_capacity else None,
+        "instantaneous_power": power,
+        "lifetime_export_energy_counter": export_energy,
+        "lifetime_import_energy_counter": import_energy,
+        "maximum_temperature": temperature,
+        "status": status
+    }
+
+
+def update_battery_wear(battery_values, battery_capacity):
+    """
+    Feed the current battery sample into the persisted rainflow cycle counter / wear estimator
+
+    :param battery_values: Battery register values as returned by aggregate_batteries()
+    :param battery_capacity: Battery capacity in Wh
+
+    :return: None
+    """
+
+    try:
+        wear = battery_wear.load_state(WEAR_STATE_FILE, BATTERY_CHEMISTRY, battery_capacity)
+        wear.add(
+            battery_values.get("soe"),
+            battery_values.get("soh"),
+            battery_values.get("lifetime_export_energy_counter"),
+            battery_values.get("lifetime_import_energy_counter"),
+            round(time.time())
+        )
+        battery_wear.save_state(wear, WEAR_STATE_FILE)
+    except Exception as err:
+        LOGGER.error("Updating the battery wear estimation.")
+        LOGGER.exception(err, stack_info=True, exc_info=True)
+
+
+def update_energy_store(values):
+    """
+    Ingest the cumulative energy counters of the inverter, the meters (read as one burst) and the batteries
+    (already read by the update) into the energy store
+
+    :param values: Values as returned by read_control_values()
+
+    :return: None
+    """
+    requests = {"inverter": (inverter, ["energy_total"])}
+    for meter, params in inverter.meters().items():
+        requests[meter] = (params, ENERGY_METER_REGISTERS)
+
+    burst = solaredge_modbus.read_burst(requests)
+    counters = {f"{device}.{register}": value
+                for device, device_values in burst.values.items() for register, value in device_values.items()}
+    for battery, battery_values in values["batteries"].items():
+        for register in ENERGY_BATTERY_REGISTERS:
+            counters[f"{battery}.{register}"] = battery_values.get(register)
+
+    try:
+        open_energy_store().add(counters, burst.timestamp)
+    except Exception as err:
+        LOGGER.error("Updating the energy store.")
+        LOGGER.exception(err, stack_info=True, exc_info=True)
+
+
+def open_energy_store():
+    """
+    Open the energy store on the first use. It is flushed and closed at exit.
+
+    :return: energy_store.EnergyStore
+    """
+    global ENERGY_STORE
+
+    if ENERGY_STORE is None:
+        ENERGY_STORE = energy_store.EnergyStore(ENERGY_DB)
+        atexit.register(ENERGY_STORE.close)
+
+    return ENERGY_STORE
+
+
+def apply_plan(battery):
+    """
+    Re-plan when the day-ahead plan is older than the planning interval and take over the upper charging limit,
+    charge limit and backup reserve of its current slot. Without a plan slot, or while the plan leaves the battery
+    idle until its end, the period values stay in place.
+
+    :param battery: Aggregated battery values as returned by aggregate_batteries()
+
+    :return: None
+    """
+    global PLAN
+    global UPPER_CHARGING_LIMIT
+    global CHARGE_LIMIT
+    global BACKUP_RESERVE
+    global ACTIVE_PERIOD
+
+    plan_file = PLANNER.get("plan_file", planner.PLAN_FILE)
+    if PLAN is None:
+        PLAN = planner.load_plan(plan_file)
+
+    if PLAN is None or time.time() - PLAN["created"] >= PLANNER.get("interval", planner.PLAN_INTERVAL):
+        try:
+            PLAN = planner.plan(
+                PLANNER, battery["soe"], battery["rated_energy"], CHARGE_LIMIT, BACKUP_RESERVE, BATTERY_CHEMISTRY,
+                open_energy_store() if ENERGY_DB else None
+            )
+            planner.save_plan(PLAN, plan_file)
+            LOGGER.info(f"New plan for {len(PLAN['slots'])} slots solved in {PLAN['solve_seconds']}s.")
+        except (OSError, KeyError, ValueError) as err:
+            LOGGER.error(f"Planning failed: {err}")
+
+    slot = planner.current_slot(PLAN) if PLAN else None
+    if slot is None:
+        return
+
+    if slot["upper_charging_limit"] is None:
+        LOGGER.debug(f"Plan slot {datetime.fromtimestamp(slot['start'])}: the plan leaves the battery idle. Keeping the period values.")
+        return
+
+    UPPER_CHARGING_LIMIT = slot["upper_charging_limit"]
+    CHARGE_LIMIT = slot["charge_limit"]
+    BACKUP_RESERVE = slot["backup_reserve"]
+    ACTIVE_PERIOD = "plan"
+    LOGGER.debug(f"Plan slot {datetime.fromtimestamp(slot['start'])}: target SoE {slot['soe']}%. " +
+                 f"Upper charging limit {UPPER_CHARGING_LIMIT}%, charge limit {CHARGE_LIMIT} W, backup reserve {BACKUP_RESERVE}%.")
+
+
+def energy_flows(power_ac, meter_power, battery_power):
+    """
+    Split the power flows between PV, battery, house and grid.
+    Sign conventions: 'power_ac' positive = inverter output, 'meter_power' positive = export to the grid,
+    'battery_power' positive = charging. The PV power is derived from the AC output and the (DC coupled) battery.
+
+    :param power_ac: Inverter AC power in W
+    :param meter_power: Grid meter power in W
+    :param battery_power: Battery power in W
+
+    :return: Dictionary with the flows in W
+    """
+    pv = max(0, power_ac + battery_power)
+    load = max(0, power_ac - meter_power)
+    charge = max(0, battery_power)
+    discharge = max(0, -battery_power)
+
+    pv_to_battery = min(pv, charge)
+    pv_to_house = min(pv - pv_to_battery, load)
+    battery_to_house = min(discharge, load - pv_to_house)
+
+    return {
+        "pv": pv,
+        "house_load": load,
+        "pv_to_house": pv_to_house,
+        "pv_to_battery": pv_to_battery,
+        "pv_to_grid": max(0, pv - pv_to_battery - pv_to_house),
+        "grid_to_house": max(0, load - pv_to_house - battery_to_house),
+        "grid_to_battery": charge - pv_to_battery,
+        "battery_to_house": battery_to_house,
+        "battery_to_grid": max(0, discharge - battery_to_house)
+    }
+
+
+def discover_devices():
+    """
+    Discover the meters and batteries once for the high frequency reads
+
+    :return: None
+    """
+    if telemetry_devices:
+        return
+
+    telemetry_devices["meters"] = list(inverter.meters().values())
+    telemetry_devices["batteries"] = inverter.batteries()
+
+    for battery, params in telemetry_devices["batteries"].items():
+        if battery not in battery_static:
+            battery_static[battery] = params.read_registers(BATTERY_STATIC_REGISTERS)
+
+
+def read_coherent_values():
+    """
+    Read the inverter AC power, the grid meter power and the battery powers as one low-skew burst
+    and derive the energy flows from them. The meters and batteries are discovered only once.
+    The registers are polled at the rate of their poll class: the powers every time, the rated energy only
+    when due (see solaredge_modbus.POLL_INTERVALS). The SoE is read every time as well, as it is a telemetry
+    channel and alert input of the same resolution as the powers. A power which couldn't be read in this
+    burst is None and the flows are left out rather than mixing it up with an older value.
+
+    :return: Dictionary with the values, the aggregated battery, the flows and the skew in ms
+    """
+    global POLLER
+
+    discover_devices()
+
+    if POLLER is None:
+        requests = {"inverter": (inverter, ["power_ac"])}
+        if telemetry_devices["meters"]:
+            requests["meter"] = (telemetry_devices["meters"][0], ["power"])
+        for battery, params in telemetry_devices["batteries"].items():
+            requests[battery] = (params, ["rated_energy", "instantaneous_power", "soe"])
+
+        POLLER = solaredge_modbus.PollScheduler(requests, intervals={"soe": 0})
+
+    burst = POLLER.poll()
+
+    battery = aggregate_batteries(
+        {name: {**battery_static.get(name, {}), **burst.values[name]} for name in telemetry_devices["batteries"]}
+    ) or {}
+    power_ac = burst.values["inverter"].get("power_ac")
+    meter_power = burst.values.get("meter", {}).get("power")
+    battery_power = battery.get("instantaneous_power")
+    if any(burst.values[name].get("instantaneous_power") is None for name in telemetry_devices["batteries"]):
+        battery_power = None
+
+    values = {
+        "timestamp": burst.timestamp,
+        "skew_ms": round(burst.skew * 1000, 1) if burst.skew is not None else None,
+        "power_ac": power_ac,
+        "meter_power": meter_power,
+        "battery_power": battery_power,
+        "soe": battery.get("soe"),
+        "flows": None
+    }
+
+    if None not in (power_ac, meter_power, battery_power):
+        values["flows"] = energy_flows(power_ac, meter_power, battery_power)
+
+    return values
+
+
+def snapshot_fields():
+    """
+    Fields of the shared memory snapshot: the telemetry sample and its energy flows ("flows.<flow>"), and the
+    numeric storage ("storage.<register>") and aggregated battery ("battery.<register>") registers read
+    by the update, taken from the register tables
+
+    :return: List of field names
+    """
+    fields = ["timestamp", "skew_ms", *telemetry.CHANNELS, *(f"flows.{flow}" for flow in energy_flows(0, 0, 0))]
+
+    for prefix, device, registers in (("storage", solaredge_modbus.StorageInverter, STORAGE_CONTROL_REGISTERS),
+                                      ("battery", solaredge_modbus.Battery, BATTERY_CONTROL_REGISTERS)):
+        fields += [f"{prefix}.{register}" for register in registers if device.register_map[register].vtype in (int, float)]
+
+    return fields + ["update_timestamp"]
+
+
+def sample_telemetry():
+    """
+    Read the high frequency telemetry channels as one coherent burst and add them to TELEMETRY
+
+    :return: True when the sample was taken
+    """
+    try:
+        values = read_coherent_values()
+        TELEMETRY.add(values, values["timestamp"])
+
+        if SNAPSHOT:
+            flows = values["flows"] or dict.fromkeys(energy_flows(0, 0, 0))
+            SNAPSHOT.publish({
+                **{field: values[field] for field in ("timestamp", "skew_ms", *telemetry.CHANNELS)},
+                **{f"flows.{flow}": value for flow, value in flows.items()}
+            })
+        if STATUS:
+            STATUS.publish(telemetry=values)
+        if ALERTS:
+            evaluate_alerts({channel: values[channel] for channel in telemetry.CHANNELS})
+        return True
+    except solaredge_modbus.InverterUnreachable:
+        return False
+
+
+def hand_over_charge_limit(actions, soe, rc_cmd_mode, rc_charge_limit, charging_limit_15p):
+    """
+    With the fast control the "rc_charge_limit" is written by the surplus follower: the SoE based controller
+    only sets its ceiling (CHARGE_LIMIT or 0.15C for the last 3%) and whether it is active at all.
+    It is inactive when the battery doesn't charge in the (new) "rc_cmd_mode" or the limit is overridden manually.
+
+    :param actions: List of (register, value) from control_actions()
+    :param soe: Battery state of energy in %
+    :param rc_cmd_mode: Current "rc_cmd_mode" register value
+    :param rc_charge_limit: Current "rc_charge_limit" register value in W
+    :param charging_limit_15p: Charge power of 0.15C in W
+
+    :return: List of (register, value)
+    """
+    mode = next((value for register, value in actions if register == "rc_cmd_mode"), rc_cmd_mode)
+    ceiling = charging_limit_15p if soe >= (UPPER_CHARGING_LIMIT - 3) else CHARGE_LIMIT
+    active = mode in FAST_CONTROL_MODES and "rc_charge_limit" not in OVERRIDES
+
+    FAST_CONTROLLER.reset(rc_charge_limit, ceiling, active)
+
+    if not active:
+        return actions
+
+    return [(register, value) for register, value in actions if register != "rc_charge_limit"]
+
+
+def read_grid_power():
+    """
+    Read only the grid meter power (with its scale factor) and the battery powers as one burst
+
+    :return: Tuple (meter power in W, total battery power in W, monotonic time of the last response),
+    None when there is no meter or a value couldn't be read
+    """
+    discover_devices()
+    if not telemetry_devices["meters"]:
+        return None
+
+    requests = {"meter": (telemetry_devices["meters"][0], ["power"])}
+    for battery, params in telemetry_devices["batteries"].items():
+        requests[battery] = (params, ["instantaneous_power"])
+
+    burst = solaredge_modbus.read_burst(requests)
+    meter_power = burst.values["meter"].get("power")
+    battery_powers = [burst.values[battery].get("instantaneous_power") for battery in telemetry_devices["batteries"]]
+
+    if meter_power is None or None in battery_powers:
+        return None
+
+    return meter_power, sum(battery_powers), burst.last_response
+
+
+def charge_ceiling(actions, rc_cmd_mode, rc_charge_limit):
+    """
+    Battery charge power allowed by the SoE based controller after its actions: the ceiling of the fast control
+    or the "rc_charge_limit", 0 when the battery doesn't charge in the (new) "rc_cmd_mode"
+
+    :param actions: List of (register, value) of the update
+    :param rc_cmd_mode: Current "rc_cmd_mode" register value
+    :param rc_charge_limit: Current "rc_charge_limit" register value in W
+
+    :return: Charge power in W
+    """
+    mode = next((value for register, value in actions if register == "rc_cmd_mode"), rc_cmd_mode)
+    if mode not in FAST_CONTROL_MODES:
+        return 0
+
+    if FAST_CONTROLLER and FAST_CONTROLLER.active:
+        return FAST_CONTROLLER.ceiling
+
+    return next((value for register, value in actions if register == "rc_charge_limit"), rc_charge_limit)
+
+
+def fast_control_tick():
+    """
+    One tick of the surplus following charge control: reads only the grid meter power and the battery powers
+    as one burst and writes "rc_charge_limit" when the controller asks for it
+
+    :return: None
+    """
+    if not FAST_CONTROLLER.active:
+        return
+
+    started = time.monotonic()
+
+    try:
+        measured = read_grid_power()
+        if measured is None:
+            return
+
+        meter_power, battery_power, measured_at = measured
+        limit = FAST_CONTROLLER.update(meter_power, battery_power, measured_at)
+        if limit is not None:
+            result = storage.write("rc_charge_limit", limit)
+            if is_write_error(result):
+                LOGGER.warning(f"Setting \"rc_charge_limit\" to {limit} W failed: {result}")
+            else:
+                FAST_CONTROLLER.written_ok(limit)
+                if JOURNAL:
+                    JOURNAL.observe({"rc_charge_limit": limit}, written=True)
+                    JOURNAL.sync(force=False)
+                LOGGER.debug(f"Surplus {meter_power + battery_power} W. Charge limit set to {limit} W.")
+    except solaredge_modbus.InverterUnreachable:
+        pass
+    finally:
+        FAST_CONTROLLER.record_latency(time.monotonic() - started)
+
+
+def set_export_limit(val):
+    """
+    Set "export_control_site_limit" (0xF702) and commit it with "commit_power_control_settings" (0xF100).
+    Both writes are sent back-to-back (holding the bus on Modbus RTU), without reading them back.
+
+    :param val: Export limit in W
+
+    :return: True when both writes succeeded
+    """
+    with inverter.connection.bus:
+        for register, value in (("export_control_site_limit", val), ("commit_power_control_settings", 1)):
+            result = inverter.write(register, value)
+            if is_write_error(result):
+                LOGGER.warning(f"Setting \"{register}\" to {value} failed: {result}")
+                return False
+
+    return True
+
+
+def enable_export_control():
+    """
+    Switch the export limitation of the inverter to a direct (grid meter based) total site limit at the cap,
+    unless it is set up so already: the export control registers are written by one request, followed by the
+    advanced power control enable and the commit. The registers as found are kept to be restored at exit.
+
+    :return: Current "export_control_site_limit" in W or None when it couldn't be set up
+    """
+    global EXPORT_ORIGINAL
+
+    current = inverter.read_registers(["export_control_mode", "export_control_limit_mode", "export_control_site_limit",
+                                       "advanced_power_control_enable"])
+
+    if None in (current.get("export_control_mode"), current.get("export_control_site_limit")):
+        LOGGER.error("Reading the export control registers failed. Export limiting disabled.")
+        return None
+
+    EXPORT_ORIGINAL = dict(current)
+
+    if (current["export_control_mode"] != EXPORT_CONTROL_DIRECT
+            or current.get("export_control_limit_mode") != EXPORT_CONTROL_TOTAL
+            or current.get("advanced_power_control_enable") != 1):
+        LOGGER.info(f"Setting up the direct export limitation at {EXPORT_LIMIT} W " +
+                    f"(export control mode was {current['export_control_mode']}).")
+        results = inverter.write_registers({
+            "export_control_mode": EXPORT_CONTROL_DIRECT,
+            "export_control_limit_mode": EXPORT_CONTROL_TOTAL,
+            "export_control_site_limit": EXPORT_LIMIT,
+            "advanced_power_control_enable": 1
+        })
+        results["commit_power_control_settings"] = inverter.write("commit_power_control_settings", 1)
+
+        failed = [register for register, result in results.items() if is_write_error(result)]
+        if failed:
+            LOGGER.error(f"Setting up the export limitation failed ({', '.join(failed)}). Export limiting disabled.")
+            return None
+
+        current["export_control_site_limit"] = EXPORT_LIMIT
+
+    return current["export_control_site_limit"]
+
+
+def restore_export_control():
+    """
+    Restore the export control registers found before the setup at exit (one request, then the commit) - neither
+    the setup nor a limit raised above the cap outlives the controller
+
+    :return: None
+    """
+    if not EXPORT_ORIGINAL:
+        return
+
+    changed = (EXPORT_ORIGINAL["export_control_mode"] != EXPORT_CONTROL_DIRECT
+               or EXPORT_ORIGINAL.get("export_control_limit_mode", EXPORT_CONTROL_TOTAL) != EXPORT_CONTROL_TOTAL
+               or EXPORT_ORIGINAL.get("advanced_power_control_enable", 1) != 1
+               or (EXPORT_LIMITER and EXPORT_LIMITER.written != EXPORT_ORIGINAL["export_control_site_limit"]))
+    if not changed:
+        return
+
+    original = ", ".join(f"{register} = {value}" for register, value in EXPORT_ORIGINAL.items())
+
+    try:
+        results = inverter.write_registers(EXPORT_ORIGINAL)
+        results["commit_power_control_settings"] = inverter.write("commit_power_control_settings", 1)
+
+        failed = [register for register, result in results.items() if is_write_error(result)]
+        if failed:
+            LOGGER.error(f"Restoring the export control ({original}) failed: {', '.join(failed)}.")
+        else:
+            LOGGER.info(f"Export control restored ({original}).")
+    except solaredge_modbus.InverterUnreachable:
+        LOGGER.error(f"Restoring the export control ({original}) failed. The inverter is unreachable.")
+
+
+def export_control_tick():
+    """
+    One tick of the export limiting: reads only the grid meter power and the battery powers as one burst and
+    writes (and commits) "export_control_site_limit" when the controller asks for it.
+    The first tick reaching the inverter sets up its export limitation.
+
+    :return: None
+    """
+    global EXPORT_LIMITER
+
+    if not EXPORT_LIMITER:
+        return
+
+    started = time.monotonic()
+
+    try:
+        if EXPORT_LIMITER.written is None:
+            written = enable_export_control()
+            if written is None:
+                EXPORT_LIMITER = None
+                return
+            EXPORT_LIMITER.reset(EXPORT_LIMITER.ceiling, written)
+
+        measured = read_grid_power()
+        if measured is None:
+            return
+
+        meter_power, battery_power, measured_at = measured
+        limit = EXPORT_LIMITER.update(meter_power, battery_power, measured_at)
+        if limit is not None and set_export_limit(limit):
+            EXPORT_LIMITER.written_ok(limit, measured_at)
+            if JOURNAL:
+                JOURNAL.observe({"export_control_site_limit": limit}, written=True)
+                JOURNAL.sync(force=False)
+            LOGGER.debug(f"Export {meter_power} W. Export limit set to {limit} W.")
+    except solaredge_modbus.InverterUnreachable:
+        pass
+    finally:
+        if EXPORT_LIMITER:
+            EXPORT_LIMITER.record_latency(time.monotonic() - started)
+
+
+def apply_overrides(actions, current):
+    """
+    Merge the manual overrides posted to the API into the control actions: the queued overrides are
+    taken over (None clears an override), expired ones are dropped and an overridden register is written
+    with the override value instead of the controller's one. An "rc_cmd_mode" override is written together
+    with an "rc_cmd_timeout" ending at the expiry of the override, so the mode lapses with it.
+
+    :param actions: List of (register, value) from control_actions()
+    :param current: Current register values
+
+    :return: List of (register, value)
+    """
+    posted = set()
+
+    for overrides, expiry in STATUS.pending_overrides():
+        for key, value in overrides.items():
+            register = OVERRIDE_REGISTERS[key]
+            posted.add(register)
+            if value is None:
+                OVERRIDES.pop(register, None)
+                LOGGER.info(f"Manual override of \"{register}\" cleared.")
+            else:
+                OVERRIDES[register] = (value, expiry)
+                LOGGER.info(f"Manual override of \"{register}\" to {value} until {datetime.fromtimestamp(expiry)}.")
+            if JOURNAL:
+                JOURNAL.override(register, value, expiry)
+
+    now = time.time()
+    for register in [register for register, (value, expiry) in OVERRIDES.items() if expiry <= now]:
+        LOGGER.info(f"Manual override of \"{register}\" expired.")
+        del OVERRIDES[register]
+        if JOURNAL:
+            JOURNAL.override(register, None)
+
+    # The controller's timeout belongs to its own mode command
+    overridden = set(OVERRIDES) | ({"rc_cmd_timeout"} if "rc_cmd_mode" in OVERRIDES else set())
+    actions = [(register, value) for register, value in actions if register not in overridden]
+
+    for register, (value, expiry) in OVERRIDES.items():
+        if register == "rc_cmd_mode" and (current.get(register) != value or register in posted):
+            actions.append(("rc_cmd_timeout", max(1, math.ceil(expiry - now))))
+            actions.append((register, value))
+        elif current.get(register) != value:
+            actions.append((register, value))
+
+    return actions
 
+
+def evaluate_alerts(values):
+    """
+    Merge the values into ALERT_VALUES and evaluate the alert rules on them (service mode only).
+    The notifications are delivered by the notifier thread, the active alerts are published to the status API.
+
+    :param values: Dictionary of the new field values
+
+    :return: None
+    """
+    ALERT_VALUES.update(values)
+
+    with TRACER.span("alerts"):
+        if ALERTS.evaluate(ALERT_VALUES) and STATUS:
+            STATUS.publish(alerts=ALERTS.active())
+
+
+def restore_journal():
+    """
+    Open the controller journal and restore the state of the last run: the manual overrides and the "rc_cmd_mode"
+    expected by the alerts. The journaled state is verified by the first update (see verify_journal()).
+
+    :return: None
+    """
+    global JOURNAL
+
+    JOURNAL = journal.Journal(JOURNAL_FILE)
+    atexit.register(JOURNAL.close)
+
+    if JOURNAL.dropped:
+        LOGGER.warning(f"Cut off {JOURNAL.dropped} bytes of a torn record at the end of \"{JOURNAL_FILE}\".")
+    if JOURNAL.pending:
+        LOGGER.warning(f"{len(JOURNAL.pending)} register write(s) of the last run without an outcome. Verifying them.")
+
+    now = time.time()
+    for register, (value, until) in JOURNAL.overrides.items():
+        if until > now:
+            OVERRIDES[register] = (value, until)
+
+    if "rc_cmd_mode" in JOURNAL.state:
+        ALERT_VALUES["expected_rc_cmd_mode"] = JOURNAL.state["rc_cmd_mode"]["value"]
+
+
+def verify_journal(storage_values):
+    """
+    Verify the journaled state with the storage registers read by the update and repair the writes interrupted
+    by a crash: the ones which weren't applied are written again, in their original order - unless they are older
+    than the update interval. Those are left to the control decisions of this update.
+
+    :param storage_values: Storage register values read by the update, the repaired values are updated
+
+    :return: None
+    """
+    repairs, drift = JOURNAL.verify(storage_values, max_age=UPDATE_INTERVAL)
+
+    for register, (journaled, value) in drift.items():
+        LOGGER.info(f"\"{register}\" is {value} instead of the journaled {journaled}.")
+
+    for (register, value), intent_id in zip(repairs, JOURNAL.intend(repairs)):
+        LOGGER.warning(f"Writing \"{register}\" = {value} was interrupted. Writing it again.")
+        ok = WRITERS[register](value)
+        JOURNAL.done(intent_id, ok)
+        if ok:
+            storage_values[register] = value
+
+
+def rc_cmd_expiry():
+    """
+    Time the current remote control command times out: the last write of "rc_cmd_timeout" or "rc_cmd_mode"
+    plus the timeout, both from the journal
+
+    :return: UNIX timestamp or None if unknown
+    """
+    if not JOURNAL:
+        return None
+
+    written = JOURNAL.last_write(["rc_cmd_timeout", "rc_cmd_mode"])
+    timeout = JOURNAL.state.get("rc_cmd_timeout", {}).get("value")
+
+    return round(written + timeout) if written and timeout else None
+
+
+def publish_status(**sections):
+    """
+    Publish the controller state to the status API (service mode only)
+
+    :return: None
+    """
+    if not STATUS:
+        return
+
+    if TRACER.stats_enabled:
+        sections["phases"] = TRACER.percentiles()
+
+    STATUS.publish(
+        period={
+            "period": ACTIVE_PERIOD,
+            "upper_charging_limit": UPPER_CHARGING_LIMIT,
+            "soe_delta_charge": SOE_DELTA_CHARGE,
+            "backup_reserve": BACKUP_RESERVE,
+            "charge_limit": CHARGE_LIMIT
+        },
+        overrides={register: {"value": value, "until": expiry} for register, (value, expiry) in OVERRIDES.items()},
+        connection={
+            "failures": inverter.connection.failures,
+            "circuit_open": inverter.connection.is_open()
+        },
+        **sections
+    )
+
+
+def write_with_retries(register, val, description, retries=3, budget=None):
+    """
+    Write a storage register, read it back and retry when the write fails
+
+    :param register: Name of the storage register
     :param val: The new value to be set
+    :param description: Register and value for the log messages, e.g. "storage_control_mode" (0xE004) to 4
 
     :param retries: Number of retires in case writing fails
     Retrying is a workaround till the issue in the 'solaredge_modbus' library if fixed.
     On a second attempt often the writing to the register succeeds.
     GitHub issue: https://github.com/nmakel/solaredge_modbus/issues/36
 
-    :return: None
+    :param budget: CycleBudget of the current control cycle. No retry is started which doesn't fit in it
+
+    :return: Whether the value was written and read back
     """
 
     try:
         retry_count = retries
         while retry_count > 0:
-            if not inverter.connected():
-                inverter.connect()
+            inverter.connection.ensure()
             retry_count = retry_count - 1
-            reg_query = storage.write("storage_control_mode", val)
-            reg_result = storage.read("storage_control_mode")
+            reg_query = storage.write(register, val)
+            reg_result = storage.read(register)
 
             if is_response_exception(reg_query):
-                LOGGER.error(f"Setting \"storage_control_mode\" (0xE004) to {val}. Error: " + str(reg_query.message))
+                LOGGER.error(f"Setting {description}. Error: " + str(reg_query.message))
                 LOGGER.info(f"Retrying write to register...{retries - retry_count + 1} of {retries}")
                 if retry_count == 0:
                     raise Exception(str(reg_query.message))
                 else:
-                    # Wait a bit before the next retry
-                    LOGGER.info("Waiting for 10 sec. before the next retry...")
-                    time.sleep(10)
+                    # Wait a bit before the next retry, unless it doesn't fit in the cycle time budget anymore
+                    if budget and budget.remaining() < RETRY_DELAY:
+                        raise Exception("Cycle time budget exhausted. Giving up retrying.")
+                    LOGGER.info(f"Waiting for {RETRY_DELAY} sec. before the next retry...")
+                    with TRACER.span("retry_sleep"):
+                        time.sleep(RETRY_DELAY)
             else:
-                verify_register_write("storage_control_mode", val, reg_query, reg_result)
-                break
+                return verify_register_write(register, val, reg_query, reg_result)
+    except solaredge_modbus.InverterUnreachable:
+        raise
     except Exception as err:
-        LOGGER.error(f"Setting \"storage_control_mode\" (0xE004) to {val}.")
+        LOGGER.error(f"Setting {description}.")
         LOGGER.exception(err, stack_info=True, exc_info=True)
 
+    return False
+
 
-def set_storage_backup_reserved(val=10, retries=3):
+def set_storage_control_mode(val=4, retries=3, budget=None):
     """
-    Set "storage_backup_reserved" (0xE008) - storage backup reserved capacity (%)
+    Set "storage_contol_mode" (0xE004) - storage control mode
+      0: "Disabled"
+      1: "Maximize Self Consumption"
+      2: "Time of Use"
+      3: "Backup Only"
+      4: "Remote Control"
 
     :param val: The new value to be set
 
@@ -166,37 +1074,34 @@ def set_storage_backup_reserved(val=10, retries=3):
     On a second attempt often the writing to the register succeeds.
     GitHub issue: https://github.com/nmakel/solaredge_modbus/issues/36
 
-    :return: None
+    :param budget: CycleBudget of the current control cycle. No retry is started which doesn't fit in it
+
+    :return: Whether the value was written and read back
     """
 
-    try:
-        retry_count = retries
-        while retry_count > 0:
-            if not inverter.connected():
-                inverter.connect()
-            retry_count = retry_count - 1
-            reg_query = storage.write("storage_backup_reserved_setting", val)
-            reg_result = storage.read("storage_backup_reserved_setting")
+    return write_with_retries("storage_control_mode", val, f"\"storage_control_mode\" (0xE004) to {val}", retries, budget)
 
-            if is_response_exception(reg_query):
-                LOGGER.error(
-                    f"Setting \"storage_backup_reserved_setting\" (0xE008) to {val}%. Error: " + str(reg_query.message))
-                LOGGER.info(f"Retrying write to register...{retries - retry_count + 1} of {retries}")
-                if retry_count == 0:
-                    raise Exception(str(reg_query.message))
-                else:
-                    # Wait a bit before the next retry
-                    LOGGER.info("Waiting for 10 sec. before the next retry...")
-                    time.sleep(10)
-            else:
-                verify_register_write("storage_backup_reserved_setting", val, reg_query, reg_result)
-                break
-    except Exception as err:
-        LOGGER.error(f"Setting \"storage_backup_reserved_setting\" (0xE008) to {val}%.")
-        LOGGER.exception(err, stack_info=True, exc_info=True)
 
+def set_storage_backup_reserved(val=10, retries=3, budget=None):
+    """
+    Set "storage_backup_reserved" (0xE008) - storage backup reserved capacity (%)
+
+    :param val: The new value to be set
+
+    :param retries: Number of retires in case writing fails
+    Retrying is a workaround till the issue in the 'solaredge_modbus' library if fixed.
+    On a second attempt often the writing to the register succeeds.
+    GitHub issue: https://github.com/nmakel/solaredge_modbus/issues/36
+
+    :param budget: CycleBudget of the current control cycle. No retry is started which doesn't fit in it
 
-def set_storage_default_mode(val=7, retries=3):
+    :return: Whether the value was written and read back
+    """
+
+    return write_with_retries("storage_backup_reserved_setting", val, f"\"storage_backup_reserved_setting\" (0xE008) to {val}%", retries, budget)
+
+
+def set_storage_default_mode(val=7, retries=3, budget=None):
     """
     Set "storage_default_mode" (0xE00A) - storage charge / discharge default mode
       0: "Off"
@@ -214,33 +1119,12 @@ def set_storage_default_mode(val=7, retries=3):
     On a second attempt often the writing to the register succeeds.
     GitHub issue: https://github.com/nmakel/solaredge_modbus/issues/36
 
-    :return: None
+    :param budget: CycleBudget of the current control cycle. No retry is started which doesn't fit in it
+
+    :return: Whether the value was written and read back
     """
 
-    try:
-        retry_count = retries
-        while retry_count > 0:
-            if not inverter.connected():
-                inverter.connect()
-            retry_count = retry_count - 1
-            reg_query = storage.write("storage_default_mode", val)
-            reg_result = storage.read("storage_default_mode")
-
-            if is_response_exception(reg_query):
-                LOGGER.error(f"Setting \"storage_default_mode\" (0xE00A) to {val}. Error: " + str(reg_query.message))
-                LOGGER.info(f"Retrying write to register...{retries - retry_count + 1} of {retries}")
-                if retry_count == 0:
-                    raise Exception(str(reg_query.message))
-                else:
-                    # Wait a bit before the next retry
-                    LOGGER.info("Waiting for 10 sec. before the next retry...")
-                    time.sleep(10)
-            else:
-                verify_register_write("storage_default_mode", val, reg_query, reg_result)
-                break
-    except Exception as err:
-        LOGGER.error(f"Setting \"storage_default_mode\" (0xE00A) to {val}.")
-        LOGGER.exception(err, stack_info=True, exc_info=True)
+    return write_with_retries("storage_default_mode", val, f"\"storage_default_mode\" (0xE00A) to {val}", retries, budget)
 
 
 def set_rc_charge_limit(val=5000):
@@ -258,13 +1142,17 @@ def set_rc_charge_limit(val=5000):
 
         if is_response_exception(reg_query):
             LOGGER.error(f"Setting \"rc_charge_limit\" (0xE00E) to {val}Wh. Error: " + str(reg_query.message))
-            return
+            return False
 
-        verify_register_write("rc_charge_limit", val, reg_query, reg_result)
+        return verify_register_write("rc_charge_limit", val, reg_query, reg_result)
+    except solaredge_modbus.InverterUnreachable:
+        raise
     except Exception as err:
         LOGGER.error(f"Setting \"rc_charge_limit\" (0xE00E) to {val}Wh.")
         LOGGER.exception(err, stack_info=True, exc_info=True)
 
+    return False
+
 
 def set_rc_discharge_limit(val=5000):
     """
@@ -281,13 +1169,17 @@ def set_rc_discharge_limit(val=5000):
 
         if is_response_exception(reg_query):
             LOGGER.error(f"Setting \"rc_discharge_limit\" (0xE010) to {val}Wh. Error: " + str(reg_query.message))
-            return
+            return False
 
-        verify_register_write("rc_discharge_limit", val, reg_query, reg_result)
+        return verify_register_write("rc_discharge_limit", val, reg_query, reg_result)
+    except solaredge_modbus.InverterUnreachable:
+        raise
     except Exception as err:
         LOGGER.error(f"Setting \"rc_discharge_limit\" (0xE010) to {val}Wh.")
         LOGGER.exception(err, stack_info=True, exc_info=True)
 
+    return False
+
 
 def set_rc_cmd_timeout(val=3600):
     """
@@ -304,13 +1196,17 @@ def set_rc_cmd_timeout(val=3600):
 
         if is_response_exception(reg_query):
             LOGGER.error(f"Setting \"rc_cmd_timeout\": {val} sec. Error: " + str(reg_query.message))
-            return
+            return False
 
-        verify_register_write("rc_cmd_timeout", val, reg_query, reg_result)
+        return verify_register_write("rc_cmd_timeout", val, reg_query, reg_result)
+    except solaredge_modbus.InverterUnreachable:
+        raise
     except Exception as err:
         LOGGER.error(f"Setting \"rc_cmd_timeout\": {val} sec.")
         LOGGER.exception(err, stack_info=True, exc_info=True)
 
+    return False
+
 
 def set_rc_cmd_mode(val=0):
     """
@@ -334,13 +1230,26 @@ def set_rc_cmd_mode(val=0):
 
         if is_response_exception(reg_query):
             LOGGER.error(f"Set \"rc_cmd_mode\" (0xE00A) to {val}. Error: " + str(reg_query.message))
-            return
+            return False
 
-        verify_register_write("rc_cmd_mode", val, reg_query, reg_result)
+        return verify_register_write("rc_cmd_mode", val, reg_query, reg_result)
+    except solaredge_modbus.InverterUnreachable:
+        raise
     except Exception as err:
         LOGGER.error(f"Set \"rc_cmd_mode\" (0xE00A) to {val}.")
         LOGGER.exception(err, stack_info=True, exc_info=True)
 
+    return False
+
+
+# Setters of the registers written by the update
+WRITERS = {
+    "rc_cmd_timeout": set_rc_cmd_timeout,
+    "rc_cmd_mode": set_rc_cmd_mode,
+    "rc_charge_limit": set_rc_charge_limit,
+    "storage_backup_reserved_setting": lambda value: set_storage_backup_reserved(value)
+}
+
 
 def is_response_exception(reg_query):
     """
@@ -364,6 +1273,17 @@ def is_response_exception(reg_query):
         return False
 
 
+def is_write_error(result):
+    """
+    Check whether a write failed: no response, an exception or an exception response of the device
+
+    :param result: PyModBus response of the write
+
+    :return: True when the write failed
+    """
+    return result is None or isinstance(result, pymbEx.ModbusException) or result.isError()
+
+
 def verify_register_write(register_name, exp_val, reg_query, reg_result):
     """
     Verify the result of a write query according to official documentation:
@@ -391,73 +1311,397 @@ def verify_register_write(register_name, exp_val, reg_query, reg_result):
     return True
 
 
+def apply_profile(file_name, dry_run=False):
+    """
+    Bring the inverter to the register values declared in a profile: the current values are read (one read
+    per span of registers), only the differing registers are written - contiguous ones by one request -
+    and verified by one read. Registers which fail or don't read back are retried after RETRY_DELAY seconds
+    (up to 3 attempts), then the written registers are rolled back.
+
+    :param file_name: Profile file (YAML), see inverter_profile.load()
+    :param dry_run: Only print the changes and the write requests
+
+    :return: Whether the inverter matches the profile (dry run: whether the profile could be checked)
+    """
+    devices = {"storage": storage, "inverter": inverter}
+
+    try:
+        profile = inverter_profile.load(file_name, devices)
+        changes, unchanged = inverter_profile.diff(profile, inverter_profile.read_current(profile, devices))
+    except (OSError, yaml.YAMLError, inverter_profile.ProfileError) as err:
+        LOGGER.error(f"Profile \"{file_name}\": {err}")
+        return False
+
+    print(inverter_profile.format_plan(changes, unchanged, devices))
+
+    if dry_run or not changes:
+        return True
+
+    ok, errors = inverter_profile.apply(changes, devices, is_write_error, retry_delay=RETRY_DELAY)
+    for error in errors:
+        LOGGER.error(error)
+
+    if ok:
+        LOGGER.info(f"Profile \"{file_name}\" applied: {sum(len(values) for values in changes.values())} registers written.")
+
+    return ok
+
+
 # -------------------------------------------------------------------------------
 
-def inverter_update_routine():
+class CycleBudget:
+    """
+    Time budget of a single update cycle, measured on the monotonic clock
     """
-    Routine run for updating the SolarEdge corresponding configuration parameters
-    according to the values specified in the current / default period
 
-    :return: None
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+
+def process_alive(pid):
+    """
+    Check whether a process is running without sending it anything.
+    On Windows os.kill() terminates the process for any signal, so the process is opened instead.
+
+    :param pid: Process ID
+
+    :return: True when running, False when not, None when it can't be determined
     """
+    if os.name == "nt":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            error = kernel32.GetLastError()
+            if error == 87:  # ERROR_INVALID_PARAMETER - no such process
+                return False
+            return True if error == 5 else None  # ERROR_ACCESS_DENIED - running as another user
+
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return None
+            return exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+
+    return True
 
-    read_config()  # Reads the config according to the periods
-    inverter.connect()
-    values = read_values()
-    soe = values["batteries"]["Battery1"].get("soe")
-    battery_capacity = values["batteries"]["Battery1"].get("rated_energy")
-    battery_manufacturer = values["batteries"]["Battery1"].get("c_manufacturer")
-    if battery_manufacturer == "SolarEdge":
-        battery_capacity = round(battery_capacity / 0.9)
-    charing_limit_15p = round(battery_capacity * 0.15, -2)
-    rc_cmd_mode = values["storage"].get("rc_cmd_mode")
-    rc_charge_limit = values["storage"].get("rc_charge_limit")
-    storage_backup_reserved_setting = values["storage"].get("storage_backup_reserved_setting")
-
-    if soe >= UPPER_CHARGING_LIMIT and rc_cmd_mode != 5:
-        LOGGER.info(f"SoC {round(soe, 2)}%. Reached upper limit of {UPPER_CHARGING_LIMIT}%.")
-        LOGGER.info("Setting \"rc_cmd_timeout\" to 8h.")
-        set_rc_cmd_timeout(28800)  # 8 Hours
-        LOGGER.info("Setting \"set_rc_cmd_mode\" to \"5: Discharge to match load\".")
-        set_rc_cmd_mode(5)
-
-    if soe < (UPPER_CHARGING_LIMIT - SOE_DELTA_CHARGE) and rc_cmd_mode != 7:
-        LOGGER.info(f"SoC {round(soe, 2)}%. Dropped by delta of {SOE_DELTA_CHARGE}%.")
-        LOGGER.info("Setting \"rc_cmd_timeout\" to 1h.")
-        set_rc_cmd_timeout()
-        LOGGER.info("Setting \"set_rc_cmd_mode\" to \"7: Maximize self consumption\".")
-        set_rc_cmd_mode(7)
+
+class ControllerLock:
+    """
+    Lock file ensuring that only one controller instance talks to the same inverter at a time.
+    Uses flock() where available (released by the OS when the owner dies), otherwise an exclusively
+    created file with the owner PID, which is removed when the owner is not running anymore. A file
+    without a readable owner PID (e.g. the owner died before writing it) is removed after STALE_LOCK_AGE.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.owner = None
+
+    def _read_owner(self):
+        try:
+            with open(self.path, "r") as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _is_stale(self):
+        owner = self._read_owner()
+
+        if owner > 0:
+            alive = process_alive(owner)
+            if alive is not None:
+                return not alive
+
+        # The owner is unknown: a running owner writes its PID right after creating the file
+        try:
+            return time.time() - os.path.getmtime(self.path) > STALE_LOCK_AGE
+        except OSError:
+            return True
+
+    def acquire(self):
+        """
+        Try to acquire the lock without blocking
+
+        :return: True when acquired, False when another instance holds the lock
+        """
+        if fcntl:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.owner = self._read_owner()
+                os.close(self.fd)
+                self.fd = None
+                return False
+        else:
+            try:
+                self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                if not self._is_stale():
+                    self.owner = self._read_owner()
+                    return False
+                LOGGER.warning(f"Removing stale lock file \"{self.path}\" of PID {self._read_owner()}.")
+                os.remove(self.path)
+                return self.acquire()
+
+        os.ftruncate(self.fd, 0)
+        os.write(self.fd, str(os.getpid()).encode())
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+
+        if fcntl:
+            os.ftruncate(self.fd, 0)
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+        else:
+            os.close(self.fd)
+            os.remove(self.path)
+
+        self.fd = None
+
+
+# Lower value - higher priority. When the cycle budget is exhausted the remaining actions are skipped
+ACTION_PRIORITY = {
+    "rc_cmd_timeout": 0,
+    "rc_cmd_mode": 0,
+    "rc_charge_limit": 1,
+    "storage_backup_reserved_setting": 2
+}
+
+
+def control_actions(soe, rc_cmd_mode, rc_charge_limit, storage_backup_reserved_setting, charging_limit_15p,
+                    upper_charging_limit, soe_delta_charge, backup_reserve, charge_limit):
+    """
+    Decide which storage registers have to be written for the current battery state.
+    Pure function without any inverter access, so it can be replayed by the backtester as well.
+
+    :param soe: Battery state of energy in %
+    :param rc_cmd_mode: Current "rc_cmd_mode" register value
+    :param rc_charge_limit: Current "rc_charge_limit" register value in W
+    :param storage_backup_reserved_setting: Current "storage_backup_reserved_setting" register value in %
+    :param charging_limit_15p: Charge power of 0.15C in W used for the last 3% before the upper limit
+    :param upper_charging_limit: Upper charging limit in %
+    :param soe_delta_charge: SoE drop in % after which charging is started again
+    :param backup_reserve: Backup reserve in %
+    :param charge_limit: Battery maximum charge power in W
+
+    :return: List of (register name, value) tuples to be written in this order
+    """
+    actions = []
+
+    if soe >= upper_charging_limit and rc_cmd_mode != 5:
+        actions.append(("rc_cmd_timeout", 28800))  # 8 Hours
+        actions.append(("rc_cmd_mode", 5))
+
+    if soe < (upper_charging_limit - soe_delta_charge) and rc_cmd_mode != 7:
+        actions.append(("rc_cmd_timeout", 3600))  # 1 Hour
+        actions.append(("rc_cmd_mode", 7))
 
     # For the last 3%, reduce the charging power to 0.15C in order to increase stop charging accurancy
-    if rc_charge_limit > charing_limit_15p and soe >= (UPPER_CHARGING_LIMIT - 3):
-        LOGGER.info(f"Battery SoC is {round(soe, 2)}%. " +
-                    f"Lowering charging power to {charing_limit_15p} W. (0.15C) in order to increase stop charging accurancy.")
-        LOGGER.info(f"Current battery charge limit: {rc_charge_limit} W.")
-        LOGGER.info(f"Setting battery charge limit to: {charing_limit_15p} W.")
-        set_rc_charge_limit(charing_limit_15p)
+    if rc_charge_limit > charging_limit_15p and soe >= (upper_charging_limit - 3):
+        actions.append(("rc_charge_limit", charging_limit_15p))
+
+    if rc_charge_limit != charge_limit and soe <= (upper_charging_limit - 5):
+        actions.append(("rc_charge_limit", charge_limit))
+
+    if storage_backup_reserved_setting != backup_reserve:
+        actions.append(("storage_backup_reserved_setting", backup_reserve))
 
-    if rc_charge_limit != CHARGE_LIMIT and soe <= (UPPER_CHARGING_LIMIT - 5):
-        LOGGER.info(f"Current battery charge limit: {rc_charge_limit} W.")
-        LOGGER.info(f"Setting battery charge limit to: {CHARGE_LIMIT} W.")
-        set_rc_charge_limit(CHARGE_LIMIT)
+    return actions
 
-    if storage_backup_reserved_setting != BACKUP_RESERVE:
-        LOGGER.info(f"Current backup reserve: {storage_backup_reserved_setting}%.")
-        LOGGER.info(f"Setting backup reserve to: {BACKUP_RESERVE}%.")
-        set_storage_backup_reserved(BACKUP_RESERVE)
 
-    inverter.disconnect()
+def inverter_update_routine(keep_connected=False):
+    """
+    Routine run for updating the SolarEdge corresponding configuration parameters
+    according to the values specified in the current / default period
+
+    :param keep_connected: Keep the connection open after the update (service mode)
+
+    :return: None
+    """
+
+    budget = CycleBudget(CYCLE_BUDGET)
+    with TRACER.span("read_config"):
+        read_config()  # Reads the config according to the periods
+
+    try:
+        with TRACER.span("connect"):
+            inverter.connection.ensure()
+        with TRACER.span("read_control_values"):
+            values = read_control_values()
+        if JOURNAL:
+            with TRACER.span("verify_journal"):
+                verify_journal(values["storage"])
+        battery = aggregate_batteries(values["batteries"])
+        if not battery:
+            LOGGER.error("No battery found. Skipping the update.")
+            return
+
+        soe = battery["soe"]
+        if PLANNER:
+            with TRACER.span("planner"):
+                apply_plan(battery)
+        if TELEMETRY:
+            LOGGER.debug(f"Battery power over the last {UPDATE_INTERVAL}s: {TELEMETRY.summary('battery_power', UPDATE_INTERVAL)}")
+        battery_capacity = battery["rated_energy"]
+        charing_limit_15p = round(battery_capacity * 0.15, -2)
+        rc_cmd_mode = values["storage"].get("rc_cmd_mode")
+        rc_charge_limit = values["storage"].get("rc_charge_limit")
+        storage_backup_reserved_setting = values["storage"].get("storage_backup_reserved_setting")
+
+        with TRACER.span("control_actions"):
+            actions = control_actions(
+                soe, rc_cmd_mode, rc_charge_limit, storage_backup_reserved_setting, charing_limit_15p,
+                UPPER_CHARGING_LIMIT, SOE_DELTA_CHARGE, BACKUP_RESERVE, CHARGE_LIMIT
+            )
+            if STATUS:
+                actions = apply_overrides(actions, values["storage"])
+            if FAST_CONTROLLER:
+                actions = hand_over_charge_limit(actions, soe, rc_cmd_mode, rc_charge_limit, charing_limit_15p)
+            if EXPORT_LIMITER:
+                EXPORT_LIMITER.reset(charge_ceiling(actions, rc_cmd_mode, rc_charge_limit))
+
+        if ALERTS:
+            # The read values are checked against the mode set by the previous update, then the expected one is updated
+            evaluate_alerts({**values["storage"], **battery, "battery_power": battery["instantaneous_power"]})
+            ALERT_VALUES["expected_rc_cmd_mode"] = next(
+                (value for register, value in actions if register == "rc_cmd_mode"), rc_cmd_mode
+            )
+
+        actions = sorted(actions, key=lambda action: ACTION_PRIORITY[action[0]])
+        # The writes are journaled (and synced) before the first of them is sent
+        intent_ids = JOURNAL.intend(actions) if JOURNAL else [None] * len(actions)
+
+        for (register, value), intent_id in zip(actions, intent_ids):
+            if budget.expired():
+                LOGGER.warning(f"Cycle time budget of {CYCLE_BUDGET}s exhausted. Skipping \"{register}\" = {value}.")
+                if JOURNAL:
+                    JOURNAL.done(intent_id, False)
+                continue
+
+            with TRACER.span(f"write.{register}", value=value):
+                if register == "rc_cmd_timeout":
+                    if "rc_cmd_mode" in OVERRIDES:
+                        LOGGER.info(f"Manual override of \"rc_cmd_mode\". Setting \"rc_cmd_timeout\" to {value} sec.")
+                    else:
+                        if value == 28800:
+                            LOGGER.info(f"SoC {round(soe, 2)}%. Reached upper limit of {UPPER_CHARGING_LIMIT}%.")
+                        else:
+                            LOGGER.info(f"SoC {round(soe, 2)}%. Dropped by delta of {SOE_DELTA_CHARGE}%.")
+                        LOGGER.info(f"Setting \"rc_cmd_timeout\" to {value // 3600}h.")
+                    ok = set_rc_cmd_timeout(value)
+                elif register == "rc_cmd_mode":
+                    LOGGER.info(f"Setting \"set_rc_cmd_mode\" to \"{value}: {RC_CMD_MODES[value]}\".")
+                    ok = set_rc_cmd_mode(value)
+                elif register == "rc_charge_limit":
+                    if value == charing_limit_15p:
+                        LOGGER.info(f"Battery SoC is {round(soe, 2)}%. " +
+                                    f"Lowering charging power to {charing_limit_15p} W. (0.15C) in order to increase stop charging accurancy.")
+                    LOGGER.info(f"Current battery charge limit: {rc_charge_limit} W.")
+                    LOGGER.info(f"Setting battery charge limit to: {value} W.")
+                    ok = set_rc_charge_limit(value)
+                elif register == "storage_backup_reserved_setting":
+                    LOGGER.info(f"Current backup reserve: {storage_backup_reserved_setting}%.")
+                    LOGGER.info(f"Setting backup reserve to: {value}%.")
+                    ok = set_storage_backup_reserved(value, budget=budget)
+
+            if JOURNAL:
+                JOURNAL.done(intent_id, ok)
+
+        if JOURNAL:
+            JOURNAL.sync()
+
+        if not budget.expired():
+            with TRACER.span("battery_wear"):
+                update_battery_wear(battery, battery_capacity)
+
+        if ENERGY_DB and not budget.expired():
+            with TRACER.span("energy_store"):
+                update_energy_store(values)
+
+        if SNAPSHOT:
+            SNAPSHOT.publish({
+                **{f"storage.{register}": value for register, value in values["storage"].items()},
+                **{f"battery.{register}": value for register, value in battery.items()},
+                "update_timestamp": time.time()
+            })
+
+        publish_status(
+            values={"storage": values["storage"], "battery": battery},
+            controller={
+                "last_update": round(time.time()),
+                "actions": actions,
+                "rc_cmd_expiry": rc_cmd_expiry(),
+                "fast_control": {
+                    "active": FAST_CONTROLLER.active,
+                    "ceiling": FAST_CONTROLLER.ceiling,
+                    "charge_limit": FAST_CONTROLLER.written,
+                    "late_ticks": FAST_CONTROLLER.late_ticks
+                } if FAST_CONTROLLER else None,
+                "export_control": {
+                    "cap": EXPORT_LIMITER.cap,
+                    "charge_ceiling": EXPORT_LIMITER.ceiling,
+                    "export_limit": EXPORT_LIMITER.written,
+                    "late_ticks": EXPORT_LIMITER.late_ticks
+                } if EXPORT_LIMITER else None
+            }
+        )
+    except solaredge_modbus.InverterUnreachable as err:
+        LOGGER.warning(f"Skipping the update. {err}")
+        publish_status()
+    finally:
+        if not keep_connected:
+            inverter.disconnect()
 
 
 # -------------------------------------------------------------------------------
 
 if __name__ == "__main__":
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("host", type=str, help="Modbus TCP address")
+    arg_parser.add_argument("host", type=str, nargs="?", default=None, help="Modbus TCP address")
     arg_parser.add_argument("--port", type=int, default=1502, help="Modbus TCP port")
+    arg_parser.add_argument("--device", type=str, default=None,
+                            help="Serial device for Modbus RTU (e.g. /dev/ttyUSB0) instead of Modbus TCP")
+    arg_parser.add_argument("--baud", type=int, default=115200, help="Modbus RTU baud rate")
+    arg_parser.add_argument("--parity", type=str, choices=["N", "E", "O"], default="N", help="Modbus RTU parity")
+    arg_parser.add_argument("--stopbits", type=int, choices=[1, 2], default=1, help="Modbus RTU stop bits")
     arg_parser.add_argument("--timeout", type=int, default=1, help="Connection timeout")
     arg_parser.add_argument("--unit", type=int, default=1, help="Modbus device address")
     arg_parser.add_argument("--info", action="store_true", default=False, help="Print all inverter settings")
+    arg_parser.add_argument("--raw", action="store_true", default=False,
+                            help="With --info print the raw register values and their scale factors instead of engineering units")
+    arg_parser.add_argument("--snapshot", action="store_true", default=False,
+                            help="Print the inverter, grid meter and battery powers read as one low-skew burst and the energy flows")
+    arg_parser.add_argument("--wear_report", action="store_true", default=False,
+                            help="Print the battery cycle counts per DoD and the estimated battery wear")
+    arg_parser.add_argument("--energy_report", type=str, choices=energy_store.RESOLUTIONS, default=None,
+                            help="Print the energy per hour (last 2 days), day or month (last year) from the energy store")
+    arg_parser.add_argument("--profile", type=str, nargs="?", const=TRACE_FILE, default=None,
+                            help=f"Trace the phases and Modbus transactions into a Chrome trace-event JSON file (default \"{TRACE_FILE}\")")
+    arg_parser.add_argument("--cprofile", type=str, default=None, help="Write a cProfile dump (pstats) into the given file")
+    arg_parser.add_argument("--service", action="store_true", default=False,
+                            help="Run continuously every \"update_interval\" on a persistent connection instead of once (CronJob)")
 
     arg_parser.add_argument(
       "--enable_storage_remote_control_mode", action="store_true", default=False,
@@ -475,8 +1719,16 @@ if __name__ == "__main__":
            "the \"storage_default_mode\" is set to \"7. Maximize self consumption\"."
     )
 
+    arg_parser.add_argument("--apply", type=str, default=None, metavar="PROFILE",
+                            help="Write the registers declared in the profile (YAML) which differ from the current values")
+    arg_parser.add_argument("--plan", type=str, default=None, metavar="PROFILE",
+                            help="Show the changes and the write requests --apply would make, without writing")
+
     args = arg_parser.parse_args()
 
+    if not args.host and not args.device:
+        arg_parser.error("Either the Modbus TCP host or the serial --device is required")
+
     # Setup logging to console & file
     LOGGER = logging.getLogger("se_battery_control")
     LOGGER.setLevel(LOGGER_LEVEL)
@@ -493,44 +1745,198 @@ if __name__ == "__main__":
     rotationLogHandler.setLevel(LOGGER_LEVEL)
     LOGGER.addHandler(rotationLogHandler)
 
-    read_config(True)
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        atexit.register(profiler.dump_stats, args.cprofile)
+        atexit.register(profiler.disable)
+
+    if args.profile or args.service:
+        TRACER = tracing.Tracer(events=bool(args.profile), stats=True)
+        for handler in LOGGER.handlers:
+            tracing.instrument(TRACER, handler, "emit", "logging")
+
+    if args.profile:
+        def write_trace():
+            TRACER.write(args.profile)
+            for phase, stats in TRACER.percentiles().items():
+                print(f"{phase:40} {stats}")
+        atexit.register(write_trace)
+
+    with TRACER.span("read_config"):
+        read_config(True)
+
+    if args.wear_report:
+        print(json.dumps(battery_wear.load_state(WEAR_STATE_FILE, BATTERY_CHEMISTRY).report(), indent=2))
+        exit()
+
+    if args.energy_report:
+        store = energy_store.EnergyStore(ENERGY_DB)
+        print(json.dumps(store.report(args.energy_report, time.time() - ENERGY_REPORT_WINDOWS[args.energy_report]), indent=2))
+        store.close()
+        exit()
+
+    # Only one controller instance per inverter at a time. Several inverters on one serial bus
+    # (different units) can be controlled by separate instances - the bus itself is arbitrated by the library.
+    if args.device:
+        target = args.device
+        lock_name = f"se_battery_control-{os.path.realpath(args.device).strip('/').replace('/', '_')}-{args.unit}.lock"
+    else:
+        target = f"{args.host}:{args.port}"
+        lock_name = f"se_battery_control-{args.host}-{args.port}-{args.unit}.lock"
+
+    # Taken by the modes which write only, the read-only modes run alongside a controlling instance
+    lock = ControllerLock(os.path.join(tempfile.gettempdir(), lock_name))
+
+    def acquire_lock():
+        if not lock.acquire():
+            LOGGER.warning(f"Another instance (PID {lock.owner}) is already controlling {target}. Exiting.")
+            exit()
+        atexit.register(lock.release)
 
     inverter = solaredge_modbus.Inverter(
         host=args.host,
         port=args.port,
+        device=args.device,
+        baud=args.baud,
+        parity=args.parity,
+        stopbits=args.stopbits,
         timeout=args.timeout,
         unit=args.unit
     )
     storage = solaredge_modbus.StorageInverter(parent=inverter)
+    inverter.capabilities.state_file = CAPABILITY_STATE_FILE
 
-    if args.info:
-        values = read_values()
-        # Don't log 'info' mode output into the log file - console output only
-        print(json.dumps(values, indent=2))
-        exit()
-
-    if args.enable_storage_remote_control_mode:
-        inverter.connect()
-        set_storage_control_mode(4)
-        set_storage_default_mode(7)
-        inverter.disconnect()
-        exit()
+    # Nested spans for the Modbus transactions and the device discovery
+    if TRACER.stats_enabled:
+        tracing.instrument(TRACER, inverter.client, "connect", "modbus.connect")
+        tracing.instrument(TRACER, inverter.client, "read_holding_registers", "modbus.read", ["address", "count"])
+        tracing.instrument(TRACER, inverter.client, "write_registers", "modbus.write", ["address", "values"])
+        tracing.instrument(TRACER, inverter, "discover", "discover")
 
-    if args.set_storage_default_mode != -1:
-        inverter.connect()
-        set_storage_default_mode(args.set_storage_default_mode)
-        inverter.disconnect()
+    try:
+        if args.info:
+            with TRACER.span("read_values"):
+                values = read_values(scaled=not args.raw)
+            # Don't log 'info' mode output into the log file - console output only
+            print(json.dumps(values, indent=2))
+            exit()
+
+        if args.snapshot:
+            with TRACER.span("read_coherent_values"):
+                values = read_coherent_values()
+            print(json.dumps(values, indent=2))
+            exit()
+
+        if args.apply or args.plan:
+            if args.apply:
+                acquire_lock()
+            exit(0 if apply_profile(args.apply or args.plan, dry_run=not args.apply) else 1)
+
+        if args.enable_storage_remote_control_mode:
+            acquire_lock()
+            inverter.connection.ensure()
+            set_storage_control_mode(4)
+            set_storage_default_mode(7)
+            inverter.disconnect()
+            exit()
+
+        if args.set_storage_default_mode != -1:
+            acquire_lock()
+            inverter.connection.ensure()
+            set_storage_default_mode(args.set_storage_default_mode)
+            inverter.disconnect()
+            exit()
+    except solaredge_modbus.InverterUnreachable as err:
+        LOGGER.error(err)
+        exit(1)
+
+    acquire_lock()
+
+    if JOURNAL_FILE:
+        restore_journal()
+
+    if not args.service:
+        # In order to be used as CronJob - just runs once.
+        # The circuit breaker state is persisted, so the next runs fail fast while the inverter is unreachable.
+        inverter.connection.state_file = CONNECTION_STATE_FILE
+        with TRACER.span("update_cycle"):
+            inverter_update_routine()
         exit()
 
-    # In order to be used as CronJob - just runs once
-    inverter_update_routine()
-
-    # Alternately, an infinite loop can be used instead of CronJob - runs every UPDATE_INTERVAL
+    # Alternately, run as a service - runs every UPDATE_INTERVAL and keeps the connection warm in between.
+    # In between the updates the telemetry is sampled every SAMPLE_INTERVAL into the in-memory history.
     # Installing it as a service in this case is recommended in order to have automatic restarts
-    # Before the "solaredge_modbus" library is fixed to work good with the storage registers, better use CronJob
-    #
-    # while True:
-    #   inverter_update_routine()
-    #   time.sleep(UPDATE_INTERVAL)
+    # The status API serves the state from memory and queues the manual overrides for the next update,
+    # which is started right away when an override is posted.
+    if SAMPLE_INTERVAL:
+        TELEMETRY = telemetry.Telemetry(memory=TELEMETRY_MEMORY)
+
+    if FAST_CONTROL:
+        FAST_CONTROLLER = fast_control.SurplusFollower(SLEW_RATE, WRITE_DEADBAND, interval=FAST_CONTROL_INTERVAL)
+
+    if EXPORT_CONTROL:
+        EXPORT_LIMITER = fast_control.ExportLimiter(EXPORT_LIMIT, EXPORT_BOOST, WRITE_DEADBAND, EXPORT_WRITE_INTERVAL)
+        atexit.register(restore_export_control)
+        LOGGER.info(f"Export limiting at {EXPORT_LIMIT} W every {EXPORT_CONTROL_INTERVAL}s.")
+
+    alert_config = CONFIG.get("alerts") or {}
+    if alert_config.get("rules"):
+        try:
+            ALERTS = alerts.RuleEngine(alert_config["rules"], alerts.Notifier(LOGGER, alert_config.get("webhook")))
+        except (KeyError, TypeError, ValueError, SyntaxError) as err:
+            LOGGER.error(f"Invalid alert rule in config.yaml: {err}")
+            exit(1)
+        LOGGER.info(f"{len(ALERTS.rules)} alert rules loaded.")
+
+    # Stopping the service (SIGTERM) exits like Ctrl+C, so the journal is synced and the shared memory removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+
+    if SHARED_MEMORY:
+        try:
+            SNAPSHOT = shared_snapshot.SnapshotWriter(snapshot_fields(), SHARED_MEMORY)
+            atexit.register(SNAPSHOT.close)
+            LOGGER.info(f"Publishing the snapshots to the shared memory \"{SHARED_MEMORY}\".")
+        except FileExistsError as err:
+            LOGGER.error(f"{err}. Set a different \"shared_memory\" per controller instance. Not publishing snapshots.")
+
+    if API_PORT:
+        STATUS = status_api.ControllerStatus()
+        status_api.start(STATUS, API_HOST, API_PORT, TELEMETRY)
+        LOGGER.info(f"Status API listening on http://{API_HOST}:{API_PORT}/status")
+
+    def wait(seconds):
+        if STATUS:
+            return STATUS.wakeup.wait(max(0, seconds))
+        time.sleep(max(0, seconds))
+        return False
+
+    while True:
+        next_update = time.monotonic() + UPDATE_INTERVAL
+        if STATUS:
+            STATUS.wakeup.clear()
+        with TRACER.span("update_cycle"):
+            inverter_update_routine(keep_connected=True)
+
+        # Deadlines of the periodic tasks in between the updates: fast control, telemetry and keepalive (only probes when idle)
+        tasks = {}
+        if FAST_CONTROLLER:
+            tasks[fast_control_tick] = FAST_CONTROL_INTERVAL
+        if EXPORT_LIMITER:
+            tasks[export_control_tick] = EXPORT_CONTROL_INTERVAL
+        if TELEMETRY:
+            tasks[sample_telemetry] = SAMPLE_INTERVAL
+        tasks[inverter.connection.keepalive] = inverter.connection.probe_interval
+        deadlines = {task: time.monotonic() for task in tasks}
+
+        while time.monotonic() < next_update:
+            for task, interval in tasks.items():
+                if time.monotonic() >= deadlines[task]:
+                    deadlines[task] = time.monotonic() + interval
+                    with TRACER.span(task.__name__):
+                        task()
+
+            if wait(min(min(deadlines.values()), next_update) - time.monotonic()):
+                break
 
     # -------------------------------------------------------------------------------
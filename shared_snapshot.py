@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import struct
+import time
+from operator import itemgetter
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+
+NAME = "se_battery_control"   # Name of the shared memory segment
+MAGIC = b"SESN"
+VERSION = 2
+HEADER = struct.Struct("<4sIQIII")  # magic, version, sequence, field count, length of the field names, writer PID
+SPIN_RETRIES = 100             # Attempts to get a consistent read before yielding the CPU to a preempted writer
+READ_TIMEOUT = 1               # Seconds without a consistent read before giving up (the writer died mid-publish)
+NAN = float("nan")
+
+
+def _layout(fields):
+    names = "\n".join(fields).encode()
+    # The values start 8 byte aligned after the header and the field names
+    offset = (HEADER.size + len(names) + 7) // 8 * 8
+    return names, offset, offset + 8 * len(fields)
+
+
+def _writer_alive(shm):
+    """
+    Whether the writer of an existing segment is still running. On Windows a segment only exists while a process
+    has it open, on POSIX systems the writer PID in the header is checked.
+    """
+    if os.name == "nt":
+        return True
+
+    magic, version, sequence, count, names_length, pid = HEADER.unpack_from(shm.buf, 0) if shm.size >= HEADER.size else (None,) * 6
+    if magic != MAGIC or version != VERSION or not pid:
+        return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+
+    return True
+
+
+class SnapshotWriter:
+    """
+    Publishes the latest values into a shared memory segment with a fixed layout: a header with a sequence
+    counter, the field names and one float64 per field (NaN when unknown).
+
+    The sequence counter is a seqlock: it is odd while the values are written and even once they are complete,
+    so the readers need neither a lock nor a copy of the segment. There is a single writer per segment: a segment
+    left over by a writer which didn't exit cleanly is replaced, one of a running writer raises FileExistsError.
+    """
+
+    def __init__(self, fields, name=NAME):
+        self.fields = list(fields)
+        self.index = {field: idx for idx, field in enumerate(self.fields)}
+        names, offset, size = _layout(self.fields)
+
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            existing = shared_memory.SharedMemory(name)
+            alive = _writer_alive(existing)
+            existing.close()
+            if alive:
+                # Python < 3.13 would unlink the segment of the running writer at exit as if it had been created here
+                resource_tracker.unregister(existing._name, "shared_memory")
+                raise FileExistsError(f"Shared memory \"{name}\" is in use by another running writer")
+
+            # Left over by a writer which didn't exit cleanly
+            existing.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        buf = self.shm.buf
+        buf[HEADER.size:HEADER.size + len(names)] = names
+        self.values = buf[offset:size].cast("d")
+        for idx in range(len(self.fields)):
+            self.values[idx] = NAN
+
+        HEADER.pack_into(buf, 0, MAGIC, VERSION, 0, len(self.fields), len(names), os.getpid())
+        self.sequence = buf[8:16].cast("Q")
+
+    def publish(self, values):
+        """
+        Write the values of the given fields, the other fields keep their values
+
+        :param values: Dictionary field -> number (None - unknown). Fields not in the layout are ignored.
+
+        :return: None
+        """
+        index = self.index
+        target = self.values
+        updates = [(index[field], NAN if value is None else float(value)) for field, value in values.items() if field in index]
+
+        self.sequence[0] += 1
+        for idx, value in updates:
+            target[idx] = value
+        self.sequence[0] += 1
+
+    def close(self):
+        self.values.release()
+        self.sequence.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SnapshotReader:
+    """
+    Reads the values published by SnapshotWriter. The layout is read from the segment when attaching.
+    """
+
+    def __init__(self, name=NAME):
+        self.shm = shared_memory.SharedMemory(name)
+        # Python < 3.13 would unlink the segment at exit of the reader process as if it had created it
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        buf = self.shm.buf
+        magic, version, sequence, count, names_length, pid = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"Shared memory \"{name}\" is no snapshot of version {VERSION}")
+
+        self.fields = bytes(buf[HEADER.size:HEADER.size + names_length]).decode().split("\n") if count else []
+        self.index = {field: idx for idx, field in enumerate(self.fields)}
+        _, offset, size = _layout(self.fields)
+        self.values = buf[offset:size].cast("d")
+        self.sequence = buf[8:16].cast("Q")
+        self.getters = {}
+
+    def get(self, field):
+        """
+        Latest value of a single field (a single aligned 8 byte read is never torn)
+
+        :param field: Field name
+
+        :return: Value, NaN when unknown
+        """
+        return self.values[self.index[field]]
+
+    def values_of(self, fields):
+        """
+        Consistent values of several fields - all of them from the same publish
+
+        :param fields: Tuple of field names
+
+        :return: Tuple of the values (NaN when unknown)
+        """
+        getter = self.getters.get(fields)
+        if getter is None:
+            # A view of the values from the first to the last field and the positions of the fields in it
+            indexes = [self.index[field] for field in fields]
+            first = min(indexes)
+            positions = [idx - first for idx in indexes]
+            getter = self.getters[fields] = (
+                self.values[first:max(indexes) + 1],
+                itemgetter(*positions) if len(positions) > 1 else lambda row: (row[positions[0]],)
+            )
+
+        view, pick = getter
+        sequence = self.sequence
+        attempts = 0
+        deadline = None
+
+        while True:
+            before = sequence[0]
+            if not before & 1:
+                # One copy of the values in a single call, the seqlock is checked once it is done
+                row = view.tolist()
+
+                if sequence[0] == before:
+                    return pick(row)
+
+            attempts += 1
+            if attempts >= SPIN_RETRIES:
+                if deadline is None:
+                    deadline = time.monotonic() + READ_TIMEOUT
+                elif time.monotonic() > deadline:
+                    raise TimeoutError("No consistent snapshot - the writer doesn't complete its publish")
+                time.sleep(0)
+
+    def read(self, fields=None):
+        """
+        Consistent values of several fields as a dictionary
+
+        :param fields: List of field names, defaults to all
+
+        :return: Dictionary field -> value (NaN when unknown)
+        """
+        fields = tuple(fields or self.fields)
+        return dict(zip(fields, self.values_of(fields)))
+
+    def close(self):
+        for view, pick in self.getters.values():
+            view.release()
+        self.values.release()
+        self.sequence.release()
+        self.shm.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Print the snapshot published by se_battery_control.py --service")
+    arg_parser.add_argument("fields", type=str, nargs="*", help="Fields to print, defaults to all")
+    arg_parser.add_argument("--name", type=str, default=NAME, help="Name of the shared memory segment")
+    arg_parser.add_argument("--watch", type=float, default=0, help="Print the snapshot every WATCH seconds")
+    args = arg_parser.parse_args()
+
+    reader = SnapshotReader(args.name)
+
+    try:
+        while True:
+            values = reader.read(args.fields)
+            print(json.dumps({field: None if value != value else value for field, value in values.items()}))
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
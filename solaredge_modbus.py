@@ -1,5 +1,11 @@
+import contextlib
 import enum
+import json
+import os
+import tempfile
+import threading
 import time
+from collections import namedtuple
 
 from pymodbus.constants import Endian
 from pymodbus.payload import BinaryPayloadBuilder
@@ -7,12 +13,32 @@ from pymodbus.payload import BinaryPayloadDecoder
 from pymodbus.client import ModbusTcpClient
 from pymodbus.client import ModbusSerialClient
 from pymodbus.register_read_message import ReadHoldingRegistersResponse
+from pymodbus.register_read_message import ReadInputRegistersResponse
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.exceptions import ModbusException
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 RETRIES = 3
 TIMEOUT = 1
 UNIT = 1
 
+PROBE_INTERVAL = 30        # Seconds without a successful transaction after which the link is probed
+BACKOFF = 0.5              # Initial reconnect backoff in seconds
+BACKOFF_MAX = 8            # Maximum reconnect backoff in seconds
+FAILURE_THRESHOLD = 3      # Consecutive failures after which the circuit breaker opens
+COOLDOWN = 300             # Seconds the circuit breaker stays open
+MAX_READ_REGISTERS = 125   # Maximum number of registers in a single Modbus read request
+MAX_WRITE_REGISTERS = 123  # Maximum number of registers in a single Modbus write multiple registers request
+REPROBE_INTERVAL = 86400   # Seconds after which registers learned as unsupported are read again
+CAPABILITY_STRIKES = 3     # Consecutive "not implemented" values after which a register is unsupported
+RTU_TURNAROUND = 0.02      # Typical response latency of a device on an RS485 bus in seconds
+RTU_FRAME_OVERHEAD = 13    # Bytes of a read transaction besides the register data: request (8), response header and CRC (5)
+
 
 class sunspecDID(enum.Enum):
     SINGLE_PHASE_INVERTER = 101
@@ -63,6 +89,13 @@ class registerType(enum.Enum):
     HOLDING = 2
 
 
+class pollClass(enum.Enum):
+    STATIC = 1
+    SLOW = 2
+    MEDIUM = 3
+    FAST = 4
+
+
 class registerDataType(enum.Enum):
     UINT16 = 1
     UINT32 = 2
@@ -76,6 +109,14 @@ class registerDataType(enum.Enum):
     STRING = 9
 
 
+# Seconds between the reads of the registers of each poll class by PollScheduler (0 - every poll)
+POLL_INTERVALS = {
+    pollClass.STATIC: REPROBE_INTERVAL,   # Identity, ratings and rarely changed settings
+    pollClass.SLOW: 300,                  # Settings, temperatures, health
+    pollClass.MEDIUM: 30,                 # State of energy, status, energy counters
+    pollClass.FAST: 0                     # Powers and currents
+}
+
 SUNSPEC_NOTIMPLEMENTED = {
     "UINT16": 0xffff,
     "UINT32": 0xffffffff,
@@ -89,6 +130,21 @@ SUNSPEC_NOTIMPLEMENTED = {
     "STRING": ""
 }
 
+# Registers consumed by decoding a value - strings take their whole register length
+DATA_TYPE_WORDS = {
+    registerDataType.UINT16: 1,
+    registerDataType.INT16: 1,
+    registerDataType.UINT32: 2,
+    registerDataType.ACC32: 2,
+    registerDataType.INT32: 2,
+    registerDataType.UINT64: 4,
+    registerDataType.FLOAT32: 2,
+    registerDataType.SEFLOAT: 2
+}
+
+# The "not implemented" values as decoded - the signed types are decoded into negative values
+SUNSPEC_NOTIMPLEMENTED_DECODED = {**SUNSPEC_NOTIMPLEMENTED, "INT16": -0x8000, "INT32": -0x80000000}
+
 C_SUNSPEC_DID_MAP = {
     "101": "Single Phase Inverter",
     "102": "Split Phase Inverter",
@@ -153,6 +209,391 @@ BATTERY_REGISTER_OFFSETS = [
     0x100
 ]
 
+SUNSPEC_START = 0x9c40        # "SunS" marker, followed by the model chain
+SUNSPEC_MARKER = [0x5375, 0x6e53]
+SUNSPEC_END = 0xffff          # DID terminating the model chain
+SUNSPEC_MAX_MODELS = 32
+METER_COMMON_ADDRESS = 0x9cb9  # Common model of the first meter - the base of the Meter register map
+
+
+class RegisterSpec(namedtuple("RegisterSpec", ["address", "length", "rtype", "dtype", "vtype", "label", "fmt", "batch", "poll"],
+                              defaults=(pollClass.MEDIUM,))):
+    __slots__ = ()
+
+
+def register_specs(table):
+    return {k: RegisterSpec(*v) for k, v in table.items()}
+
+
+class Snapshot:
+    """
+    Fixed layout record of the register values of a device. The values list is reused between polls,
+    the layout (keys and their indexes) is shared by all snapshots of the same device class.
+    """
+
+    __slots__ = ("keys", "index", "values", "timestamp")
+
+    def __init__(self, keys, index):
+        self.keys = keys
+        self.index = index
+        self.values = [None] * len(keys)
+        self.timestamp = 0
+
+    def __getitem__(self, key):
+        return self.values[self.index[key]]
+
+    def get(self, key, default=None):
+        idx = self.index.get(key)
+
+        return default if idx is None else self.values[idx]
+
+    def as_dict(self):
+        return dict(zip(self.keys, self.values))
+
+
+class CapabilityMap:
+    """
+    Registers a device doesn't support, learned per device model / serial number / firmware version:
+    registers answered with a Modbus exception response right away, registers returning the SunSpec
+    "not implemented" value after CAPABILITY_STRIKES consecutive reads. Timeouts are never learned -
+    they tell about the link, not about the device.
+    They are left out of the read plans and read again after 'reprobe_interval'.
+    The map is shared by all devices on the same connection and persisted in 'state_file' (if set).
+    """
+
+    def __init__(self, state_file=None, reprobe_interval=REPROBE_INTERVAL, strikes=CAPABILITY_STRIKES):
+        self.state_file = state_file
+        self.reprobe_interval = reprobe_interval
+        self.max_strikes = strikes
+
+        self.devices = {}     # identity -> {register: timestamp when learned}
+        self.chains = {}      # inverter identity -> discovered devices (see Inverter.discover())
+        self.identities = {}  # "<class>:<offset>" -> (identity or None, timestamp when read)
+        self.strikes = {}     # (identity, register) -> count
+        self.version = 0
+        self.spans = {}       # Read spans split around the unsupported registers per version
+        self.state_loaded = False
+
+    def _load_state(self):
+        self.state_loaded = True
+
+        try:
+            with open(self.state_file, "r") as file:
+                state = json.load(file)
+            self.devices = state["devices"]
+            self.identities = {k: tuple(v) for k, v in state["identities"].items()}
+            self.chains = state.get("chains", {})
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    def _save_state(self):
+        if not self.state_file:
+            return
+
+        # Written to a temporary file and renamed, so a crash never leaves a truncated state behind
+        tmp_file = self.state_file + ".tmp"
+
+        with open(tmp_file, "w") as file:
+            json.dump({"devices": self.devices, "identities": self.identities, "chains": self.chains}, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(tmp_file, self.state_file)
+
+    def identity(self, device):
+        """
+        Identity of the device ("<model>:<serial>:<firmware>"), read once per 'reprobe_interval'
+
+        :param device: SolarEdge device
+
+        :return: Identity or None if it couldn't be read
+        """
+        if self.state_file and not self.state_loaded:
+            self._load_state()
+
+        key = f"{type(device).__name__}:{device.offset}"
+        identity = self.identities.get(key)
+
+        # Devices without a serial number are not learned, retried after PROBE_INTERVAL
+        if identity and time.time() - identity[1] < (self.reprobe_interval if identity[0] else PROBE_INTERVAL):
+            return identity[0]
+
+        values = device._read_all({k: device.registers[k] for k in ("c_version", "c_serialnumber")
+                                   if k in device.registers}, registerType.HOLDING)
+
+        if not values.get("c_serialnumber"):
+            self.identities[key] = (None, time.time())
+            return None
+
+        self.identities[key] = (f"{device.model}:{values['c_serialnumber']}:{values.get('c_version', '')}", time.time())
+        self._save_state()
+
+        return self.identities[key][0]
+
+    def unsupported(self, identity):
+        """
+        Registers currently treated as unsupported. Expired ones are dropped, so they are read again.
+
+        :param identity: Device identity
+
+        :return: Dictionary register -> timestamp when learned
+        """
+        registers = self.devices.get(identity)
+
+        if not registers:
+            return {}
+
+        now = time.time()
+        expired = [k for k, learned in registers.items() if now - learned >= self.reprobe_interval]
+
+        if expired:
+            for k in expired:
+                del registers[k]
+            self.version += 1
+            self.spans = {}
+            self._save_state()
+
+        return registers
+
+    def mark(self, identity, keys):
+        if not keys:
+            return
+
+        registers = self.devices.setdefault(identity, {})
+
+        for k in keys:
+            registers[k] = time.time()
+            self.strikes.pop((identity, k), None)
+
+        self.version += 1
+        self.spans = {}
+        self._save_state()
+
+    def strike(self, identity, keys):
+        """
+        Count a "not implemented" value read from the registers
+
+        :return: Registers which reached the strike limit
+        """
+        reached = []
+
+        for k in keys:
+            count = self.strikes.get((identity, k), 0) + 1
+            self.strikes[(identity, k)] = count
+            if count >= self.max_strikes:
+                reached.append(k)
+
+        return reached
+
+    def clear(self, identity, keys):
+        for k in keys:
+            self.strikes.pop((identity, k), None)
+
+
+class InverterUnreachable(ConnectionError):
+    pass
+
+
+def rtu_timing(baud, parity="N", stopbits=1, bytesize=8):
+    """
+    Modbus RTU timing of a serial line. A character is start bit, data bits, parity bit (unless "N")
+    and stop bits. Above 19200 baud the specification fixes the timeouts instead of scaling them.
+
+    :param baud: Baud rate
+    :param parity: "N", "E" or "O"
+    :param stopbits: Stop bits
+    :param bytesize: Data bits
+
+    :return: Tuple (character time, inter-character timeout, inter-frame silence) in seconds
+    """
+    char_time = (1 + bytesize + (parity != "N") + stopbits) / baud
+
+    if baud > 19200:
+        return char_time, 0.00075, 0.00175
+
+    return char_time, 1.5 * char_time, 3.5 * char_time
+
+
+class BusLock:
+    """
+    Arbitration of a serial bus shared by several devices, threads and processes (e.g. the controller and
+    a command line tool): a thread lock plus an exclusive flock on a lock file per serial device.
+
+    The lock is re-entrant, so a burst of transactions holds the bus as a whole. The release time is kept
+    in the lock file: a process taking over the bus keeps the inter-frame silence after the last frame
+    of the previous owner.
+    """
+
+    def __init__(self, device, silence=0):
+        self.file_name = os.path.join(tempfile.gettempdir(), f"solaredge_modbus-{os.path.realpath(device).strip('/').replace('/', '_')}.lock")
+        self.silence = silence
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.depth += 1
+
+        if self.depth == 1 and fcntl:
+            try:
+                if self.fd is None:
+                    self.fd = os.open(self.file_name, os.O_RDWR | os.O_CREAT, 0o666)
+
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+                wait = float(os.pread(self.fd, 32, 0) or 0) + self.silence - time.time()
+            except (OSError, ValueError):
+                wait = 0
+
+            if 0 < wait <= self.silence:
+                time.sleep(wait)
+
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+
+        if self.depth == 0 and self.fd is not None:
+            try:
+                os.pwrite(self.fd, f"{time.time():20.6f}".encode(), 0)
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            except OSError:
+                pass
+
+        self.lock.release()
+
+
+class ConnectionManager:
+    """
+    Keeps the Modbus link of a SolarEdge device (and all devices sharing its client) alive.
+
+    The link is probed with a single register read when it has been idle for 'probe_interval',
+    reconnects are retried with a capped exponential backoff, and after 'failure_threshold'
+    consecutive failures (failed reconnects, probes, writes or reads - a read counts once with all its retries)
+    the circuit breaker opens: for 'cooldown' seconds all transactions fail fast with InverterUnreachable
+    instead of running into timeouts.
+    On a shared serial bus all transactions are made holding the BusLock 'bus'.
+    """
+
+    def __init__(
+        self, client, unit=UNIT, probe_address=0x9c40,
+        probe_interval=PROBE_INTERVAL, backoff=BACKOFF, backoff_max=BACKOFF_MAX,
+        failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, state_file=None, bus=None
+    ):
+        self.client = client
+        self.bus = bus or contextlib.nullcontext()
+        self.unit = unit
+        self.probe_address = probe_address
+        self.probe_interval = probe_interval
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state_file = state_file
+
+        self.failures = 0
+        self.open_until = 0
+        self.last_success = 0
+        self.state_loaded = False
+
+    def _load_state(self):
+        self.state_loaded = True
+
+        try:
+            with open(self.state_file, "r") as file:
+                state = json.load(file)
+            self.failures = state["failures"]
+            self.open_until = state["open_until"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    def _save_state(self):
+        # Written to a temporary file and renamed, so a crash never leaves a truncated state behind
+        tmp_file = self.state_file + ".tmp"
+
+        with open(tmp_file, "w") as file:
+            json.dump({"failures": self.failures, "open_until": self.open_until}, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(tmp_file, self.state_file)
+
+    def is_open(self):
+        if self.state_file and not self.state_loaded:
+            self._load_state()
+
+        return time.time() < self.open_until
+
+    def success(self):
+        self.last_success = time.monotonic()
+
+        if self.failures or self.open_until:
+            self.failures = 0
+            self.open_until = 0
+            if self.state_file:
+                self._save_state()
+
+    def failure(self):
+        self.failures += 1
+        self.client.close()
+
+        if self.failures >= self.failure_threshold:
+            self.open_until = time.time() + self.cooldown
+
+        if self.state_file:
+            self._save_state()
+
+    def probe(self):
+        try:
+            with self.bus:
+                result = self.client.read_holding_registers(self.probe_address, 1, slave=self.unit)
+        except ModbusException:
+            result = None
+
+        if isinstance(result, (ReadHoldingRegistersResponse, ExceptionResponse)):
+            self.success()
+            return True
+
+        self.failure()
+        return False
+
+    def ensure(self):
+        """
+        Make sure the link is up. Raises InverterUnreachable while the circuit breaker is open.
+        """
+        backoff = self.backoff
+
+        while True:
+            if self.is_open():
+                raise InverterUnreachable(
+                    f"Inverter unreachable after {self.failures} consecutive failures, " +
+                    f"retrying in {round(self.open_until - time.time())}s")
+
+            if self.client.is_socket_open():
+                if time.monotonic() - self.last_success < self.probe_interval or self.probe():
+                    return True
+            elif self.client.connect() and self.probe():
+                return True
+            else:
+                self.failure()
+
+            if self.is_open():
+                continue
+
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def keepalive(self):
+        """
+        Probe the link if it was idle for longer than 'probe_interval'. Never raises.
+        """
+        try:
+            if time.monotonic() - self.last_success >= self.probe_interval:
+                self.ensure()
+            return True
+        except InverterUnreachable:
+            return False
+
 
 class SolarEdge:
 
@@ -161,6 +602,14 @@ class SolarEdge:
     parity = "N"
     baud = 115200
     wordorder = Endian.BIG
+    offset = 0
+    register_map = {}
+    scale_factors = {}
+    writable_registers = []
+
+    # Register maps with the offset applied, read plans and snapshot layouts - shared by all instances
+    _cache = {}
+    last_error = None  # Reason of the last failed read, see _read_registers_raw()
 
     def __init__(
         self, host=False, port=False,
@@ -170,9 +619,12 @@ class SolarEdge:
     ):
         if parent:
             self.client = parent.client
+            self.connection = parent.connection
+            self.capabilities = parent.capabilities
             self.mode = parent.mode
             self.timeout = parent.timeout
             self.retries = parent.retries
+            self.max_gap = parent.max_gap
 
             if unit:
                 self.unit = unit
@@ -217,6 +669,16 @@ class SolarEdge:
                     parity=self.parity,
                     baudrate=self.baud,
                     timeout=self.timeout)
+
+                # pymodbus leaves the parity bit out of the character time
+                char_time, inter_char, silence = rtu_timing(self.baud, self.parity, self.stopbits)
+                self.client.inter_char_timeout = inter_char
+                self.client.silent_interval = silence
+
+                # A gap is read along as long as it costs less than another transaction on the bus
+                overhead = RTU_FRAME_OVERHEAD * char_time + 2 * silence + RTU_TURNAROUND
+                self.max_gap = int(overhead / (2 * char_time))
+                bus = BusLock(self.device, silence)
             else:
                 self.mode = connectionType.TCP
                 self.client = ModbusTcpClient(
@@ -224,6 +686,11 @@ class SolarEdge:
                     port=self.port,
                     timeout=self.timeout
                 )
+                self.max_gap = MAX_READ_REGISTERS
+                bus = None
+
+            self.connection = ConnectionManager(self.client, self.unit, bus=bus)
+            self.capabilities = CapabilityMap()
 
     def __repr__(self):
         if self.mode == connectionType.RTU:
@@ -234,25 +701,81 @@ class SolarEdge:
             return f"<{self.__class__.__module__}.{self.__class__.__name__} object at {hex(id(self))}>"
 
     def _read_holding_registers(self, address, length):
-        for i in range(self.retries):
-            if not self.connected():
-                self.connect()
-                time.sleep(0.1)
-                continue
+        registers = self._read_holding_registers_raw(address, length)
 
-            result = self.client.read_holding_registers(address, length, slave=self.unit)
+        if registers is None:
+            return None
 
-            if not isinstance(result, ReadHoldingRegistersResponse):
+        return BinaryPayloadDecoder.fromRegisters(registers, byteorder=Endian.BIG, wordorder=self.wordorder)
+
+    def _read_input_registers(self, address, length):
+        registers = self._read_input_registers_raw(address, length)
+
+        if registers is None:
+            return None
+
+        return BinaryPayloadDecoder.fromRegisters(registers, byteorder=Endian.BIG, wordorder=self.wordorder)
+
+    def _read_holding_registers_raw(self, address, length):
+        return self._read_registers_raw(self.client.read_holding_registers, ReadHoldingRegistersResponse, address, length)
+
+    def _read_input_registers_raw(self, address, length):
+        return self._read_registers_raw(self.client.read_input_registers, ReadInputRegistersResponse, address, length)
+
+    def _read_registers_raw(self, read, response_type, address, length):
+        # Reason of the last failed read: "exception" (answered with an exception response) or "timeout"
+        self.last_error = None
+
+        for i in range(self.retries):
+            self.connection.ensure()
+
+            try:
+                with self.connection.bus:
+                    result = read(address, length, slave=self.unit)
+            except ModbusException:
+                result = None
+
+            if isinstance(result, ExceptionResponse):
+                # The device answered, the link is fine - and it answers the same to a retry
+                self.connection.success()
+                self.last_error = "exception"
+                return None
+            if not isinstance(result, response_type):
+                # Reconnect for the retry, the failure is counted once per read below
+                self.client.close()
+                self.last_error = "timeout"
                 continue
+
+            self.connection.success()
             if len(result.registers) != length:
+                self.last_error = "timeout"
                 continue
 
-            return BinaryPayloadDecoder.fromRegisters(result.registers, byteorder=Endian.BIG, wordorder=self.wordorder)
+            self.last_error = None
+            return result.registers
+
+        if self.last_error == "timeout":
+            # One failed read is one failure of the link, however often it was retried
+            self.connection.failure()
 
         return None
 
     def _write_holding_register(self, address, value):
-        return self.client.write_registers(address=address, values=value, slave=self.unit)
+        self.connection.ensure()
+
+        try:
+            with self.connection.bus:
+                result = self.client.write_registers(address=address, values=value, slave=self.unit)
+        except ModbusException as err:
+            self.connection.failure()
+            return err
+
+        if isinstance(result, ModbusException):
+            self.connection.failure()
+        else:
+            self.connection.success()
+
+        return result
 
     def _encode_value(self, data, dtype):
         builder = BinaryPayloadBuilder(byteorder=Endian.BIG, wordorder=self.wordorder)
@@ -302,86 +825,288 @@ class SolarEdge:
             else:
                 raise NotImplementedError(dtype)
 
-            if decoded == SUNSPEC_NOTIMPLEMENTED[dtype.name]:
-                return vtype(False)
+            # vtype() - zero, or an empty string for the strings
+            if decoded == SUNSPEC_NOTIMPLEMENTED_DECODED[dtype.name]:
+                return vtype()
             elif decoded != decoded:
-                return vtype(False)
+                return vtype()
             else:
                 return vtype(decoded)
         except NotImplementedError:
             raise
 
     def _read(self, value):
-        address, length, rtype, dtype, vtype, label, fmt, batch = value
-
         try:
-            if rtype == registerType.INPUT:
-                return self._decode_value(self._read_input_registers(address, length), length, dtype, vtype)
-            elif rtype == registerType.HOLDING:
-                return self._decode_value(self._read_holding_registers(address, length), length, dtype, vtype)
+            if value.rtype == registerType.INPUT:
+                return self._decode_value(self._read_input_registers(value.address, value.length), value.length, value.dtype, value.vtype)
+            elif value.rtype == registerType.HOLDING:
+                return self._decode_value(self._read_holding_registers(value.address, value.length), value.length, value.dtype, value.vtype)
             else:
-                raise NotImplementedError(rtype)
+                raise NotImplementedError(value.rtype)
         except NotImplementedError:
             raise
         except AttributeError:
             return False
 
-    def _read_all(self, values, rtype):
-        addr_min = False
-        addr_max = False
+    @property
+    def registers(self):
+        registers = self._cache.get((type(self), self.offset))
 
-        for k, v in values.items():
-            v_addr = v[0]
-            v_length = v[1]
+        if registers is None:
+            offset = self.offset
+            registers = {k: v._replace(address=v.address + offset) for k, v in self.register_map.items()}
+            self._cache[(type(self), offset)] = registers
 
-            if addr_min is False:
-                addr_min = v_addr
-            if addr_max is False:
-                addr_max = v_addr + v_length
+        return registers
 
-            if v_addr < addr_min:
-                addr_min = v_addr
-            if (v_addr + v_length) > addr_max:
-                addr_max = v_addr + v_length
+    def _scale_registers(self):
+        scale_registers = self._cache.get((type(self), "scales"))
 
-        results = {}
-        offset = addr_min
-        length = addr_max - addr_min
+        if scale_registers is None:
+            scale_registers = {k: scale for scale, keys in self.scale_factors.items() for k in keys}
+            self._cache[(type(self), "scales")] = scale_registers
 
-        try:
-            if rtype == registerType.INPUT:
-                data = self._read_input_registers(offset, length)
-            elif rtype == registerType.HOLDING:
-                data = self._read_holding_registers(offset, length)
-            else:
-                raise NotImplementedError(rtype)
+        return scale_registers
 
-            if not data:
-                return results
+    def _batches(self, rtype):
+        batches = self._cache.get((type(self), self.offset, "batches", rtype))
 
-            for k, v in values.items():
-                address, length, rtype, dtype, vtype, label, fmt, batch = v
+        if batches is None:
+            registers = {k: v for k, v in self.registers.items() if v.rtype == rtype}
+            batches = []
 
-                if address > offset:
-                    skip_bytes = address - offset
-                    offset += skip_bytes
-                    data.skip_bytes(skip_bytes * 2)
+            for batch in range(1, len(registers)):
+                register_batch = {k: v for k, v in registers.items() if v.batch == batch}
 
-                results[k] = self._decode_value(data, length, dtype, vtype)
-                offset += length
-        except NotImplementedError:
-            raise
+                if not register_batch:
+                    break
+
+                batches.append(register_batch)
+
+            self._cache[(type(self), self.offset, "batches", rtype)] = batches
+
+        return batches
+
+    def _read_plan(self, values, rtype, scaled, layout=None):
+        plan_key = (type(self), self.offset, rtype, scaled, layout is not None, tuple(values))
+        plan = self._cache.get(plan_key)
+
+        if plan:
+            return plan
+
+        scale_registers = self._scale_registers() if scaled else {}
+
+        # A value is only returned scaled: its scale factor register is read within the same span
+        scales = {scale_registers[k] for k in values if k in scale_registers} - set(values)
+        items = sorted([*values.items(), *((k, self.registers[k]) for k in scales)], key=lambda item: item[1].address)
+        offset = items[0][1].address
+        length = max(v.address + v.length for k, v in items) - offset
+
+        if length > MAX_READ_REGISTERS:
+            raise ValueError(f"Span of {length} registers from 0x{offset:04x} with the scale factors "
+                             f"{', '.join(sorted(scales))} exceeds {MAX_READ_REGISTERS} registers")
+        position = offset
+        entries = []
+
+        for k, v in items:
+            # The scale factors are applied to their values, they are not returned separately
+            if scaled and k in self.scale_factors:
+                continue
+
+            scale = None
+            if k in scale_registers:
+                scale = self.registers[scale_registers[k]].address - offset
+
+            entries.append((layout[k] if layout else k, v.address - position, v.length, v.dtype, v.vtype, scale,
+                            v.address - offset, self._sentinel(v)))
+            # A value can be shorter than its register (e.g. UINT16 in 2 registers), the rest is skipped with the next gap
+            position = v.address + DATA_TYPE_WORDS.get(v.dtype, v.length)
+
+        plan = (offset, length, entries)
+        self._cache[plan_key] = plan
+
+        return plan
+
+    def _sentinel(self, value):
+        """
+        Register words of the SunSpec "not implemented" value of the register (None if it has none).
+        Strings and accumulators are left out - empty and zero are valid values for them.
+        """
+        words = {
+            registerDataType.UINT16: (0xffff,),
+            registerDataType.INT16: (0x8000,),
+            registerDataType.SCALE: (0x8000,),
+            registerDataType.UINT32: (0xffff, 0xffff),
+            registerDataType.SEFLOAT: (0xffff, 0xffff),
+            registerDataType.INT32: (0x8000, 0x0000),
+            registerDataType.FLOAT32: (0x7fc0, 0x0000),
+            registerDataType.UINT64: (0xffff, 0xffff, 0xffff, 0xffff)
+        }.get(value.dtype)
+
+        if words and self.wordorder == Endian.LITTLE:
+            words = words[::-1]
+
+        return words
+
+    def _unsupported(self):
+        identity = self.capabilities.identity(self)
+
+        return self.capabilities.unsupported(identity) if identity else {}
+
+    def _supported(self, values):
+        """
+        Split the given registers into spans which neither contain nor cover any register
+        learned as unsupported
+
+        :param values: Dictionary key -> RegisterSpec of one span
+
+        :return: List of span dictionaries
+        """
+        unsupported = self._unsupported()
+
+        if not unsupported:
+            return [values]
+
+        split_key = (type(self).__name__, self.offset, self.capabilities.version, tuple(values))
+        spans = self.capabilities.spans.get(split_key)
+
+        if spans is not None:
+            return spans
+
+        holes = [(self.registers[k].address, self.registers[k].address + self.registers[k].length)
+                 for k in unsupported if k in self.registers]
+        spans = []
+        span = {}
+        span_start = None
+
+        for k, v in sorted(values.items(), key=lambda item: item[1].address):
+            if k in unsupported:
+                continue
+
+            if span and any(span_start < end and start < v.address + v.length for start, end in holes):
+                spans.append(span)
+                span = {}
+
+            if not span:
+                span_start = v.address
+
+            span[k] = v
+
+        if span:
+            spans.append(span)
+
+        self.capabilities.spans[split_key] = spans
+
+        return spans
+
+    def _learn(self, values, rtype, scaled, results, missing, ok):
+        """
+        Update the capability map after a span read and - when the device rejected the span - read its
+        registers one by one to find the unsupported ones
+
+        :param values: Registers of the span
+        :param rtype: Register type
+        :param scaled: Scaled read
+        :param results: Values read so far, the values read one by one are added
+        :param missing: Registers which returned the "not implemented" value
+        :param ok: Whether the span read succeeded
+
+        :return: None
+        """
+        # Taken before the identity is read, which may read the device again
+        error = self.last_error
+        identity = self.capabilities.identity(self)
+        if not identity:
+            return
+
+        keys = [k for k in values if k not in self.scale_factors]
+
+        if ok:
+            self.capabilities.clear(identity, [k for k in keys if k not in missing])
+            self.capabilities.mark(identity, self.capabilities.strike(identity, [k for k in missing if k not in self.scale_factors]))
+            return
+
+        # A timeout says nothing about the registers - the link or the device is down
+        if error != "exception":
+            return
+
+        if len(keys) == 1:
+            self.capabilities.mark(identity, keys)
+            return
+
+        # Rejected span - find the registers the device doesn't answer
+        scale_registers = self._scale_registers() if scaled else {}
+        rejected = []
+
+        for k in keys:
+            single = {k: values[k]}
+            if k in scale_registers:
+                single[scale_registers[k]] = self.registers[scale_registers[k]]
+
+            if not self._read_span(self._read_plan(single, rtype, scaled), rtype, results):
+                if self.last_error != "exception":
+                    break
+                rejected.append(k)
+
+        self.capabilities.mark(identity, rejected)
+
+    def _read_span(self, plan, rtype, results, missing=None):
+        offset, length, entries = plan
+
+        if rtype == registerType.INPUT:
+            registers = self._read_input_registers_raw(offset, length)
+        elif rtype == registerType.HOLDING:
+            registers = self._read_holding_registers_raw(offset, length)
+        else:
+            raise NotImplementedError(rtype)
+
+        if not registers:
+            return False
+
+        self._decode_span(plan, registers, results, missing)
+
+        return True
+
+    def _decode_span(self, plan, registers, results, missing=None):
+        data = BinaryPayloadDecoder.fromRegisters(registers, byteorder=Endian.BIG, wordorder=self.wordorder)
+
+        for slot, skip, length, dtype, vtype, scale, position, sentinel in plan[2]:
+            if skip:
+                data.skip_bytes(skip * 2)
+
+            value = self._decode_value(data, length, dtype, vtype)
+
+            if missing is not None and sentinel and tuple(registers[position:position + len(sentinel)]) == sentinel:
+                missing.append(slot)
+
+            if scale is not None:
+                scale = registers[scale]
+                if scale != SUNSPEC_NOTIMPLEMENTED["SCALE"]:
+                    scale = scale - 0x10000 if scale & 0x8000 else scale
+                    value = round(value * 10 ** scale, -scale) if scale < 0 else value * 10 ** scale
+
+            results[slot] = value
+
+    def _read_all(self, values, rtype, scaled=True):
+        results = {}
+        self._read_span(self._read_plan(values, rtype, scaled), rtype, results)
 
         return results
 
-    def _write(self, value, data):
-        address, length, rtype, dtype, vtype, label, fmt, batch = value
+    def _read_learning(self, values, rtype, scaled, results):
+        if not values:
+            return
+
+        missing = []
+        ok = self._read_span(self._read_plan(values, rtype, scaled), rtype, results, missing)
+        self._learn(values, rtype, scaled, results, missing, ok)
 
+    def _write(self, value, data):
         try:
-            if rtype == registerType.HOLDING:
-                return self._write_holding_register(address, self._encode_value(data, dtype))
+            if value.rtype == registerType.HOLDING:
+                return self._write_holding_register(value.address, self._encode_value(data, value.dtype))
             else:
-                raise NotImplementedError(rtype)
+                raise NotImplementedError(value.rtype)
         except NotImplementedError:
             raise
 
@@ -394,10 +1119,13 @@ class SolarEdge:
     def connected(self):
         return self.client.is_socket_open()
 
-    def read(self, key):
+    def read(self, key, scaled=True):
         if key not in self.registers:
             raise KeyError(key)
 
+        if scaled and key in self._scale_registers():
+            return {key: self.read_registers([key]).get(key, False)}
+
         return {key: self._read(self.registers[key])}
 
     def write(self, key, data):
@@ -406,296 +1134,766 @@ class SolarEdge:
 
         return self._write(self.registers[key], data)
 
-    def read_all(self, rtype=registerType.HOLDING):
-        registers = {k: v for k, v in self.registers.items() if (v[2] == rtype)}
+    def _write_groups(self, values):
+        """
+        Group registers at consecutive addresses into "write multiple registers" requests of up to
+        MAX_WRITE_REGISTERS registers
+
+        :param values: Dictionary key -> value
+
+        :return: List of (address, list of keys, encoded register words), in the order of the addresses
+        """
+        for k in values:
+            if k not in self.registers:
+                raise KeyError(k)
+
+        groups = []
+
+        for k in sorted(values, key=lambda key: self.registers[key].address):
+            v = self.registers[k]
+            words = self._encode_value(values[k], v.dtype)
+
+            if (groups and groups[-1][0] + len(groups[-1][2]) == v.address
+                    and len(groups[-1][2]) + len(words) <= MAX_WRITE_REGISTERS):
+                groups[-1][1].append(k)
+                groups[-1][2].extend(words)
+            else:
+                groups.append((v.address, [k], list(words)))
+
+        return groups
+
+    def write_registers(self, values):
+        """
+        Write several registers with as few transactions as possible: registers at consecutive addresses
+        are written by one "write multiple registers" request of up to MAX_WRITE_REGISTERS registers.
+
+        :param values: Dictionary key -> value
+
+        :return: Dictionary key -> result of the request which wrote the register
+        """
         results = {}
 
-        for batch in range(1, len(registers)):
-            register_batch = {k: v for k, v in registers.items() if (v[7] == batch)}
+        for address, keys, words in self._write_groups(values):
+            result = self._write_holding_register(address, words)
+            results.update(dict.fromkeys(keys, result))
 
-            if not register_batch:
-                break
+        return results
+
+    def read_registers(self, keys, rtype=registerType.HOLDING, scaled=True):
+        """
+        Read the given registers with as few transactions as possible: the registers are sorted by address
+        and grouped into spans of up to MAX_READ_REGISTERS registers.
+        With 'scaled' the values are returned in engineering units - each value is read within the same span
+        as its scale factor register.
+        """
+        results = {}
+
+        unsupported = self._unsupported()
+        if unsupported:
+            keys = [k for k in keys if k not in unsupported]
+
+        for span in self._spans(keys, rtype, scaled):
+            for supported in self._supported(span):
+                self._read_learning(supported, rtype, scaled, results)
+
+        return results
+
+    def _spans(self, keys, rtype, scaled):
+        spans_key = (type(self), self.offset, "spans", rtype, scaled, self.max_gap, tuple(keys))
+        spans = self._cache.get(spans_key)
+
+        if spans is not None:
+            return spans
+
+        scale_registers = self._scale_registers() if scaled else {}
+        units = []
+
+        for k in keys:
+            v = self.registers[k]
+            if v.rtype != rtype:
+                continue
+
+            if k in scale_registers:
+                scale = self.registers[scale_registers[k]]
+                units.append((min(v.address, scale.address), max(v.address + v.length, scale.address + scale.length),
+                              ((k, v), (scale_registers[k], scale))))
+            else:
+                units.append((v.address, v.address + v.length, ((k, v),)))
+
+        spans = []
+        span = {}
+        span_start = span_end = None
+
+        for start, end, registers in sorted(units, key=lambda unit: unit[0]):
+            if span and (max(span_end, end) - span_start > MAX_READ_REGISTERS or start - span_end > self.max_gap):
+                spans.append(span)
+                span = {}
 
-            results.update(self._read_all(register_batch, rtype))
+            if not span:
+                span_start = start
+                span_end = end
+
+            span.update(registers)
+            span_end = max(span_end, end)
+
+        if span:
+            spans.append(span)
+
+        self._cache[spans_key] = spans
+
+        return spans
+
+    def _read_batches(self, rtype):
+        """
+        Batches read by read_all() and read_snapshot(). Over TCP these are the register batches, on a serial
+        bus the batches are coalesced into spans of up to MAX_READ_REGISTERS registers as long as the gaps
+        between them cost less than the transactions saved.
+        """
+        if self.max_gap >= MAX_READ_REGISTERS:
+            return self._batches(rtype)
+
+        batches_key = (type(self), self.offset, "read_batches", rtype, self.max_gap)
+        batches = self._cache.get(batches_key)
+
+        if batches is None:
+            batches = []
+            span_start = span_end = None
+
+            for register_batch in sorted(self._batches(rtype), key=lambda batch: min(v.address for v in batch.values())):
+                start = min(v.address for v in register_batch.values())
+                end = max(v.address + v.length for v in register_batch.values())
+
+                if batches and max(span_end, end) - span_start <= MAX_READ_REGISTERS and start - span_end <= self.max_gap:
+                    batches[-1] = {**batches[-1], **register_batch}
+                    span_end = max(span_end, end)
+                    continue
+
+                batches.append(register_batch)
+                span_start = start
+                span_end = end
+
+            self._cache[batches_key] = batches
+
+        return batches
+
+    def read_all(self, rtype=registerType.HOLDING, scaled=True):
+        results = {}
+
+        for register_batch in self._read_batches(rtype):
+            for supported in self._supported(register_batch):
+                self._read_learning(supported, rtype, scaled, results)
 
         return results
 
+    def read_snapshot(self, snapshot=None, rtype=registerType.HOLDING, scaled=True):
+        """
+        Read all registers like read_all() but into a fixed layout Snapshot. Passing the snapshot
+        of the previous poll reuses it instead of allocating a new one.
+        Values of batches which couldn't be read are set to None.
+        """
+        layout_key = (type(self), self.offset, "layout", rtype, scaled)
+        layout = self._cache.get(layout_key)
+
+        if layout is None:
+            keys = tuple(k for batch in self._batches(rtype) for k in batch
+                         if not (scaled and k in self.scale_factors))
+            layout = (keys, {k: idx for idx, k in enumerate(keys)})
+            self._cache[layout_key] = layout
+
+        if snapshot is None or snapshot.keys is not layout[0]:
+            snapshot = Snapshot(*layout)
+
+        values = snapshot.values
+
+        unsupported = self._unsupported()
+
+        for k in unsupported:
+            if k in layout[1]:
+                values[layout[1][k]] = None
+
+        for register_batch in self._read_batches(rtype):
+            for supported in self._supported(register_batch):
+                plan = self._read_plan(supported, rtype, scaled, layout[1])
+                missing = []
+
+                if not self._read_span(plan, rtype, values, missing):
+                    for entry in plan[2]:
+                        values[entry[0]] = None
+
+                # Only the "not implemented" values are learned here - rejected batches are resolved by read_all()
+                identity = self.capabilities.identity(self)
+                if identity and missing:
+                    self.capabilities.mark(identity, self.capabilities.strike(identity, [layout[0][slot] for slot in missing]))
+
+        snapshot.timestamp = time.time()
+
+        return snapshot
+
+
+class Burst:
+    """
+    Values of several devices read as one burst by read_burst(). Each value is stamped with the monotonic
+    request and response time of its span; 'skew' is the time between the first request and the last response.
+    """
+
+    __slots__ = ("values", "stamps", "first_request", "last_response", "timestamp")
+
+    def __init__(self):
+        self.values = {}
+        self.stamps = {}
+        self.first_request = None
+        self.last_response = None
+        self.timestamp = time.time()
+
+    @property
+    def skew(self):
+        if self.first_request is None or self.last_response is None:
+            return None
+
+        return self.last_response - self.first_request
+
+
+def read_burst(requests, scaled=True):
+    """
+    Read registers of several devices (sharing one connection) with minimal skew: all the span reads are
+    planned upfront and sent back-to-back, the decoding happens only after the last response.
+
+    :param requests: Dictionary name -> (device, list of register keys)
+    :param scaled: Return the values in engineering units
+
+    :return: Burst with the values and stamps per name. Values of spans which couldn't be read are missing.
+    """
+    rtype = registerType.HOLDING
+    plans = []
+
+    for name, (device, keys) in requests.items():
+        unsupported = device._unsupported()
+        if unsupported:
+            keys = [k for k in keys if k not in unsupported]
+
+        for span in device._spans(keys, rtype, scaled):
+            for supported in device._supported(span):
+                plans.append((name, device, device._read_plan(supported, rtype, scaled)))
+
+    if plans:
+        # Reconnect (if needed) before the burst, not in the middle of it
+        plans[0][1].connection.ensure()
+
+    responses = []
+    with plans[0][1].connection.bus if plans else contextlib.nullcontext():
+        # On a serial bus the burst holds the bus as a whole
+        for name, device, plan in plans:
+            requested = time.monotonic()
+            registers = device._read_holding_registers_raw(plan[0], plan[1])
+            responses.append((registers, requested, time.monotonic()))
+
+    burst = Burst()
+
+    for (name, device, plan), (registers, requested, responded) in zip(plans, responses):
+        values = burst.values.setdefault(name, {})
+        stamps = burst.stamps.setdefault(name, {})
+
+        if not registers:
+            continue
+
+        device._decode_span(plan, registers, values)
+        for entry in plan[2]:
+            stamps[entry[0]] = (requested, responded)
+
+        if burst.first_request is None or requested < burst.first_request:
+            burst.first_request = requested
+        if burst.last_response is None or responded > burst.last_response:
+            burst.last_response = responded
+
+    return burst
+
+
+class PollScheduler:
+    """
+    Polls registers of several devices, each at the interval of its poll class (POLL_INTERVALS): every poll()
+    reads only the registers which are due, all of them merged into as few span reads as possible by read_burst().
+    The registers which aren't due keep the value of their last read, a register which couldn't be read stays due.
+    A register read on every poll (e.g. FAST) which couldn't be read is returned as None: a power of the previous
+    poll is no current value.
+    """
+
+    def __init__(self, requests, intervals=None, scaled=True):
+        """
+        :param requests: Dictionary name -> (device, list of register keys) like read_burst()
+        :param intervals: Dictionary pollClass or register key -> seconds overriding POLL_INTERVALS
+        :param scaled: Return the values in engineering units
+        """
+        self.requests = requests
+        self.intervals = {**POLL_INTERVALS, **(intervals or {})}
+        self.scaled = scaled
+        self.values = {name: {} for name in requests}
+        self.next_read = {name: dict.fromkeys(keys, 0) for name, (device, keys) in requests.items()}
+
+    def interval(self, registers, k):
+        """
+        Poll interval of a register in seconds: the one of the register key, otherwise the one of its poll class
+        """
+        return self.intervals.get(k, self.intervals[registers[k].poll])
+
+    def due(self, now=None):
+        """
+        Registers due at the given time
+
+        :param now: Monotonic time, defaults to now
+
+        :return: Dictionary name -> (device, list of register keys), only the devices with registers due
+        """
+        now = time.monotonic() if now is None else now
+        due = {}
+
+        for name, (device, keys) in self.requests.items():
+            next_read = self.next_read[name]
+            due_keys = [k for k in keys if next_read[k] <= now]
+            if due_keys:
+                due[name] = (device, due_keys)
+
+        return due
+
+    def poll(self, now=None):
+        """
+        Read the registers which are due
+
+        :param now: Monotonic time, defaults to now
+
+        :return: Burst with the latest values of all the requested registers (None for the FAST registers which
+        couldn't be read), the stamps and the skew cover only the registers read by this poll
+        """
+        now = time.monotonic() if now is None else now
+        due = self.due(now)
+        burst = read_burst(due, self.scaled)
+        values = {name: dict(values) for name, values in self.values.items()}
+
+        for name, (device, keys) in due.items():
+            fresh = burst.values.get(name, {})
+            next_read = self.next_read[name]
+            registers = device.registers
+
+            for k in fresh:
+                next_read[k] = now + self.interval(registers, k)
+
+            self.values[name].update(fresh)
+            values[name].update(fresh)
+
+            for k in keys:
+                if k not in fresh and not self.interval(registers, k):
+                    values[name][k] = None
+
+        burst.values = values
+
+        return burst
+
 
 class Inverter(SolarEdge):
 
-    def __init__(self, *args, **kwargs):
-        self.model = "Inverter"
-        self.wordorder = Endian.BIG
+    model = "Inverter"
+    wordorder = Endian.BIG
 
-        super().__init__(*args, **kwargs)
+    register_map = register_specs({
+        # name, address, length, register, type, target type, description, unit, batch, poll class
+        "c_id": (0x9c40, 2, registerType.HOLDING, registerDataType.STRING, str, "SunSpec ID", "", 1, pollClass.STATIC),
+        "c_did": (0x9c42, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", "", 1, pollClass.STATIC),
+        "c_length": (0x9c43, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec Length", "16Bit Words", 1, pollClass.STATIC),
+        "c_manufacturer": (0x9c44, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1, pollClass.STATIC),
+        "c_model": (0x9c54, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1, pollClass.STATIC),
+        "c_version": (0x9c6c, 8, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1, pollClass.STATIC),
+        "c_serialnumber": (0x9c74, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1, pollClass.STATIC),
+        "c_deviceaddress": (0x9c84, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1, pollClass.STATIC),
+        "c_sunspec_did": (0x9c85, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", C_SUNSPEC_DID_MAP, 2, pollClass.STATIC),
+        "c_sunspec_length": (0x9c86, 1, registerType.HOLDING, registerDataType.UINT16, int, "Length", "16Bit Words", 2, pollClass.STATIC),
+
+        "current": (0x9c87, 1, registerType.HOLDING, registerDataType.UINT16, int, "Current", "A", 2, pollClass.FAST),
+        "l1_current": (0x9c88, 1, registerType.HOLDING, registerDataType.UINT16, int, "L1 Current", "A", 2, pollClass.FAST),
+        "l2_current": (0x9c89, 1, registerType.HOLDING, registerDataType.UINT16, int, "L2 Current", "A", 2, pollClass.FAST),
+        "l3_current": (0x9c8a, 1, registerType.HOLDING, registerDataType.UINT16, int, "L3 Current", "A", 2, pollClass.FAST),
+        "current_scale": (0x9c8b, 1, registerType.HOLDING, registerDataType.SCALE, int, "Current Scale Factor", "", 2, pollClass.FAST),
+
+        "l1_voltage": (0x9c8c, 1, registerType.HOLDING, registerDataType.UINT16, int, "L1 Voltage", "V", 2, pollClass.MEDIUM),
+        "l2_voltage": (0x9c8d, 1, registerType.HOLDING, registerDataType.UINT16, int, "L2 Voltage", "V", 2, pollClass.MEDIUM),
+        "l3_voltage": (0x9c8e, 1, registerType.HOLDING, registerDataType.UINT16, int, "L3 Voltage", "V", 2, pollClass.MEDIUM),
+        "l1n_voltage": (0x9c8f, 1, registerType.HOLDING, registerDataType.UINT16, int, "L1-N Voltage", "V", 2, pollClass.MEDIUM),
+        "l2n_voltage": (0x9c90, 1, registerType.HOLDING, registerDataType.UINT16, int, "L2-N Voltage", "V", 2, pollClass.MEDIUM),
+        "l3n_voltage": (0x9c91, 1, registerType.HOLDING, registerDataType.UINT16, int, "L3-N Voltage", "V", 2, pollClass.MEDIUM),
+        "voltage_scale": (0x9c92, 1, registerType.HOLDING, registerDataType.SCALE, int, "Voltage Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "power_ac": (0x9c93, 1, registerType.HOLDING, registerDataType.INT16, int, "Power", "W", 2, pollClass.FAST),
+        "power_ac_scale": (0x9c94, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Scale Factor", "", 2, pollClass.FAST),
+
+        "frequency": (0x9c95, 1, registerType.HOLDING, registerDataType.UINT16, int, "Frequency", "Hz", 2, pollClass.MEDIUM),
+        "frequency_scale": (0x9c96, 1, registerType.HOLDING, registerDataType.SCALE, int, "Frequency Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "power_apparent": (0x9c97, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Apparent)", "VA", 2, pollClass.FAST),
+        "power_apparent_scale": (0x9c98, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Apparent) Scale Factor", "", 2, pollClass.FAST),
+        "power_reactive": (0x9c99, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Reactive)", "VAr", 2, pollClass.FAST),
+        "power_reactive_scale": (0x9c9a, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Reactive) Scale Factor", "", 2, pollClass.FAST),
+        "power_factor": (0x9c9b, 1, registerType.HOLDING, registerDataType.INT16, int, "Power Factor", "%", 2, pollClass.MEDIUM),
+        "power_factor_scale": (0x9c9c, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Factor Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "energy_total": (0x9c9d, 2, registerType.HOLDING, registerDataType.ACC32, int, "Total Energy", "Wh", 2, pollClass.MEDIUM),
+        "energy_total_scale": (0x9c9f, 1, registerType.HOLDING, registerDataType.SCALE, int, "Total Energy Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "current_dc": (0x9ca0, 1, registerType.HOLDING, registerDataType.UINT16, int, "DC Current", "A", 2, pollClass.FAST),
+        "current_dc_scale": (0x9ca1, 1, registerType.HOLDING, registerDataType.SCALE, int, "DC Current Scale Factor", "", 2, pollClass.FAST),
+
+        "voltage_dc": (0x9ca2, 1, registerType.HOLDING, registerDataType.UINT16, int, "DC Voltage", "V", 2, pollClass.MEDIUM),
+        "voltage_dc_scale": (0x9ca3, 1, registerType.HOLDING, registerDataType.SCALE, int, "DC Voltage Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "power_dc": (0x9ca4, 1, registerType.HOLDING, registerDataType.INT16, int, "DC Power", "W", 2, pollClass.FAST),
+        "power_dc_scale": (0x9ca5, 1, registerType.HOLDING, registerDataType.SCALE, int, "DC Power Scale Factor", "", 2, pollClass.FAST),
+
+        "temperature": (0x9ca7, 1, registerType.HOLDING, registerDataType.INT16, int, "Temperature", "°C", 2, pollClass.SLOW),
+        "temperature_scale": (0x9caa, 1, registerType.HOLDING, registerDataType.SCALE, int, "Temperature Scale Factor", "", 2, pollClass.SLOW),
+
+        "status": (0x9cab, 1, registerType.HOLDING, registerDataType.UINT16, int, "Status", INVERTER_STATUS_MAP, 2, pollClass.MEDIUM),
+        "vendor_status": (0x9cac, 1, registerType.HOLDING, registerDataType.UINT16, int, "Vendor Status", "", 2, pollClass.MEDIUM),
+
+        "rrcr_state": (0xf000, 1, registerType.HOLDING, registerDataType.UINT16, int, "RRCR State", "", 3, pollClass.SLOW),
+        "active_power_limit": (0xf001, 1, registerType.HOLDING, registerDataType.UINT16, int, "Active Power Limit", "%", 3, pollClass.SLOW),
+        "cosphi": (0xf002, 2, registerType.HOLDING, registerDataType.FLOAT32, int, "CosPhi", "", 3, pollClass.SLOW),
+
+        "commit_power_control_settings": (0xf100, 1, registerType.HOLDING, registerDataType.INT16, int, "Commit Power Control Settings", "", 4, pollClass.STATIC),
+        "restore_power_control_default_settings": (0xf101, 1, registerType.HOLDING, registerDataType.INT16, int, "Restore Power Control Default Settings", "", 4, pollClass.STATIC),
+
+        "reactive_power_config": (0xf103, 2, registerType.HOLDING, registerDataType.INT32, int, "Reactive Power Config", REACTIVE_POWER_CONFIG_MAP, 4, pollClass.STATIC),
+        "reactive_power_response_time": (0xf105, 2, registerType.HOLDING, registerDataType.UINT32, int, "Reactive Power Response Time", "ms", 4, pollClass.STATIC),
+
+        "advanced_power_control_enable": (0xf142, 2, registerType.HOLDING, registerDataType.UINT16, int, "Advanced Power Control Enable", "", 4, pollClass.STATIC),
+
+        "export_control_mode": (0xf700, 1, registerType.HOLDING, registerDataType.UINT16, int, "Export Control Mode", "", 5, pollClass.SLOW),
+        "export_control_limit_mode": (0xf701, 1, registerType.HOLDING, registerDataType.UINT16, int, "Export Control Limit Mode", EXPORT_CONTROL_LIMIT_MAP, 5, pollClass.SLOW),
+        "export_control_site_limit": (0xf702, 2, registerType.HOLDING, registerDataType.FLOAT32, int, "Export Control Site Limit", "W", 5, pollClass.SLOW)
+    })
+
+    # Power control registers which can be written, they take effect with "commit_power_control_settings"
+    writable_registers = [
+        "active_power_limit", "cosphi", "reactive_power_config", "reactive_power_response_time",
+        "advanced_power_control_enable", "export_control_mode", "export_control_limit_mode", "export_control_site_limit"
+    ]
+
+    # scale factor register: registers it applies to
+    scale_factors = {
+        "current_scale": ["current", "l1_current", "l2_current", "l3_current"],
+        "voltage_scale": ["l1_voltage", "l2_voltage", "l3_voltage", "l1n_voltage", "l2n_voltage", "l3n_voltage"],
+        "power_ac_scale": ["power_ac"],
+        "frequency_scale": ["frequency"],
+        "power_apparent_scale": ["power_apparent"],
+        "power_reactive_scale": ["power_reactive"],
+        "power_factor_scale": ["power_factor"],
+        "energy_total_scale": ["energy_total"],
+        "current_dc_scale": ["current_dc"],
+        "voltage_dc_scale": ["voltage_dc"],
+        "power_dc_scale": ["power_dc"],
+        "temperature_scale": ["temperature"]
+    }
+
+    meter_dids = [
+        RegisterSpec(0x9cfc, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1),
+        RegisterSpec(0x9daa, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1),
+        RegisterSpec(0x9e59, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1)
+    ]
+
+    battery_dids = [
+        RegisterSpec(0xe140, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1),
+        RegisterSpec(0xe240, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1)
+    ]
+
+    def _walk_chain(self):
+        """
+        Walk the SunSpec model chain starting at SUNSPEC_START with reads of up to MAX_READ_REGISTERS
+        registers - usually several model headers are found in one read.
+
+        :return: List of [did, address, length] per model or None if there is no SunSpec chain
+        """
+        chunk_start = SUNSPEC_START
+        chunk = self._read_holding_registers_raw(chunk_start, MAX_READ_REGISTERS)
+
+        if not chunk or chunk[:2] != SUNSPEC_MARKER:
+            return None
+
+        models = []
+        address = SUNSPEC_START + 2
+
+        while len(models) < SUNSPEC_MAX_MODELS:
+            if not chunk_start <= address < chunk_start + len(chunk) - 1:
+                chunk_start = address
+                # Near the end of the register space a long read may be rejected - fall back to the header only
+                chunk = (self._read_holding_registers_raw(address, min(MAX_READ_REGISTERS, 0x10000 - address))
+                         or self._read_holding_registers_raw(address, 2))
+                if not chunk:
+                    return None
+
+            did, length = chunk[address - chunk_start], chunk[address - chunk_start + 1]
+            if did == SUNSPEC_END:
+                break
+
+            models.append([did, address, length])
+            address += 2 + length
+
+        return models
+
+    def discover(self, refresh=False):
+        """
+        Discover the meters and batteries: the meters from the SunSpec model chain (a common model followed
+        by a meter model, at any position), the batteries from their DIDs - they are not part of the SunSpec
+        chain, SolarEdge keeps them in its own register block. Only the device positions are discovered,
+        the register maps are the built-in ones moved to these positions. The result is kept in memory and
+        persisted per inverter serial number / firmware with the capability map until it is re-probed.
+        Falls back to the fixed meter positions without a SunSpec chain.
+
+        :param refresh: Ignore the cached result
 
-        self.registers = {
-            # name, address, length, register, type, target type, description, unit, batch
-            "c_id": (0x9c40, 2, registerType.HOLDING, registerDataType.STRING, str, "SunSpec ID", "", 1),
-            "c_did": (0x9c42, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", "", 1),
-            "c_length": (0x9c43, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec Length", "16Bit Words", 1),
-            "c_manufacturer": (0x9c44, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1),
-            "c_model": (0x9c54, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1),
-            "c_version": (0x9c6c, 8, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1),
-            "c_serialnumber": (0x9c74, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1),
-            "c_deviceaddress": (0x9c84, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1),
-            "c_sunspec_did": (0x9c85, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", C_SUNSPEC_DID_MAP, 2),
-            "c_sunspec_length": (0x9c86, 1, registerType.HOLDING, registerDataType.UINT16, int, "Length", "16Bit Words", 2),
-
-            "current": (0x9c87, 1, registerType.HOLDING, registerDataType.UINT16, int, "Current", "A", 2),
-            "l1_current": (0x9c88, 1, registerType.HOLDING, registerDataType.UINT16, int, "L1 Current", "A", 2),
-            "l2_current": (0x9c89, 1, registerType.HOLDING, registerDataType.UINT16, int, "L2 Current", "A", 2),
-            "l3_current": (0x9c8a, 1, registerType.HOLDING, registerDataType.UINT16, int, "L3 Current", "A", 2),
-            "current_scale": (0x9c8b, 1, registerType.HOLDING, registerDataType.SCALE, int, "Current Scale Factor", "", 2),
-
-            "l1_voltage": (0x9c8c, 1, registerType.HOLDING, registerDataType.UINT16, int, "L1 Voltage", "V", 2),
-            "l2_voltage": (0x9c8d, 1, registerType.HOLDING, registerDataType.UINT16, int, "L2 Voltage", "V", 2),
-            "l3_voltage": (0x9c8e, 1, registerType.HOLDING, registerDataType.UINT16, int, "L3 Voltage", "V", 2),
-            "l1n_voltage": (0x9c8f, 1, registerType.HOLDING, registerDataType.UINT16, int, "L1-N Voltage", "V", 2),
-            "l2n_voltage": (0x9c90, 1, registerType.HOLDING, registerDataType.UINT16, int, "L2-N Voltage", "V", 2),
-            "l3n_voltage": (0x9c91, 1, registerType.HOLDING, registerDataType.UINT16, int, "L3-N Voltage", "V", 2),
-            "voltage_scale": (0x9c92, 1, registerType.HOLDING, registerDataType.SCALE, int, "Voltage Scale Factor", "", 2),
-
-            "power_ac": (0x9c93, 1, registerType.HOLDING, registerDataType.INT16, int, "Power", "W", 2),
-            "power_ac_scale": (0x9c94, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Scale Factor", "", 2),
-
-            "frequency": (0x9c95, 1, registerType.HOLDING, registerDataType.UINT16, int, "Frequency", "Hz", 2),
-            "frequency_scale": (0x9c96, 1, registerType.HOLDING, registerDataType.SCALE, int, "Frequency Scale Factor", "", 2),
-
-            "power_apparent": (0x9c97, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Apparent)", "VA", 2),
-            "power_apparent_scale": (0x9c98, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Apparent) Scale Factor", "", 2),
-            "power_reactive": (0x9c99, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Reactive)", "VAr", 2),
-            "power_reactive_scale": (0x9c9a, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Reactive) Scale Factor", "", 2),
-            "power_factor": (0x9c9b, 1, registerType.HOLDING, registerDataType.INT16, int, "Power Factor", "%", 2),
-            "power_factor_scale": (0x9c9c, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Factor Scale Factor", "", 2),
-
-            "energy_total": (0x9c9d, 2, registerType.HOLDING, registerDataType.ACC32, int, "Total Energy", "Wh", 2),
-            "energy_total_scale": (0x9c9f, 1, registerType.HOLDING, registerDataType.SCALE, int, "Total Energy Scale Factor", "", 2),
-
-            "current_dc": (0x9ca0, 1, registerType.HOLDING, registerDataType.UINT16, int, "DC Current", "A", 2),
-            "current_dc_scale": (0x9ca1, 1, registerType.HOLDING, registerDataType.SCALE, int, "DC Current Scale Factor", "", 2),
-
-            "voltage_dc": (0x9ca2, 1, registerType.HOLDING, registerDataType.UINT16, int, "DC Voltage", "V", 2),
-            "voltage_dc_scale": (0x9ca3, 1, registerType.HOLDING, registerDataType.SCALE, int, "DC Voltage Scale Factor", "", 2),
-
-            "power_dc": (0x9ca4, 1, registerType.HOLDING, registerDataType.INT16, int, "DC Power", "W", 2),
-            "power_dc_scale": (0x9ca5, 1, registerType.HOLDING, registerDataType.SCALE, int, "DC Power Scale Factor", "", 2),
-
-            "temperature": (0x9ca7, 1, registerType.HOLDING, registerDataType.INT16, int, "Temperature", "°C", 2),
-            "temperature_scale": (0x9caa, 1, registerType.HOLDING, registerDataType.SCALE, int, "Temperature Scale Factor", "", 2),
-
-            "status": (0x9cab, 1, registerType.HOLDING, registerDataType.UINT16, int, "Status", INVERTER_STATUS_MAP, 2),
-            "vendor_status": (0x9cac, 1, registerType.HOLDING, registerDataType.UINT16, int, "Vendor Status", "", 2),
-
-            "rrcr_state": (0xf000, 1, registerType.HOLDING, registerDataType.UINT16, int, "RRCR State", "", 3),
-            "active_power_limit": (0xf001, 1, registerType.HOLDING, registerDataType.UINT16, int, "Active Power Limit", "%", 3),
-            "cosphi": (0xf002, 2, registerType.HOLDING, registerDataType.FLOAT32, int, "CosPhi", "", 3),
-
-            "commit_power_control_settings": (0xf100, 1, registerType.HOLDING, registerDataType.INT16, int, "Commit Power Control Settings", "", 4),
-            "restore_power_control_default_settings": (0xf101, 1, registerType.HOLDING, registerDataType.INT16, int, "Restore Power Control Default Settings", "", 4),
-
-            "reactive_power_config": (0xf103, 2, registerType.HOLDING, registerDataType.INT32, int, "Reactive Power Config", REACTIVE_POWER_CONFIG_MAP, 4),
-            "reactive_power_response_time": (0xf105, 2, registerType.HOLDING, registerDataType.UINT32, int, "Reactive Power Response Time", "ms", 4),
-
-            "advanced_power_control_enable": (0xf142, 2, registerType.HOLDING, registerDataType.UINT16, int, "Advanced Power Control Enable", "", 4),
-
-            "export_control_mode": (0xf700, 1, registerType.HOLDING, registerDataType.UINT16, int, "Export Control Mode", "", 5),
-            "export_control_limit_mode": (0xf701, 1, registerType.HOLDING, registerDataType.UINT16, int, "Export Control Limit Mode", EXPORT_CONTROL_LIMIT_MAP, 5),
-            "export_control_site_limit": (0xf702, 2, registerType.HOLDING, registerDataType.FLOAT32, int, "Export Control Site Limit", "W", 5)
+        :return: Dictionary with "models" ([did, address, length] per model), "meters" (register offsets),
+        "batteries" (battery indexes) and "timestamp"
+        """
+        identity = self.capabilities.identity(self)
+        discovery = self.capabilities.chains.get(identity)
+
+        if discovery and not refresh and time.time() - discovery["timestamp"] < self.capabilities.reprobe_interval:
+            return discovery
+
+        models = self._walk_chain()
+
+        if models is None:
+            meters = [METER_REGISTER_OFFSETS[idx] for idx, v in enumerate(self.meter_dids) if self._read(v)]
+            models = []
+        else:
+            meters = [
+                models[idx - 1][1] - METER_COMMON_ADDRESS for idx in range(1, len(models))
+                if models[idx - 1][0] == 1 and 200 < models[idx][0] < 300
+            ]
+
+        discovery = {
+            "models": models,
+            "meters": meters,
+            "batteries": [idx for idx, v in enumerate(self.battery_dids) if self._read(v) not in (255, 0xffff)],
+            "timestamp": time.time()
         }
 
-        self.meter_dids = [
-            (0x9cfc, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1),
-            (0x9daa, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1),
-            (0x9e59, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1)
-        ]
+        if identity:
+            self.capabilities.chains[identity] = discovery
+            self.capabilities._save_state()
 
-        self.battery_dids = [
-            (0xe140, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1),
-            (0xe240, 1, registerType.HOLDING, registerDataType.UINT16, int, "", "", 1)
-        ]
+        return discovery
 
     def meters(self):
-        meters = [self._read(v) for v in self.meter_dids]
-
-        return {f"Meter{idx + 1}": Meter(offset=idx, parent=self) for idx, v in enumerate(meters) if v}
+        return {f"Meter{idx + 1}": Meter(offset=idx, base=base, parent=self)
+                for idx, base in enumerate(self.discover()["meters"])}
 
     def batteries(self):
-        batteries = [self._read(v) for v in self.battery_dids]
-
-        return {f"Battery{idx + 1}": Battery(offset=idx, parent=self) for idx, v in enumerate(batteries) if v != 255}
+        return {f"Battery{idx + 1}": Battery(offset=idx, parent=self) for idx in self.discover()["batteries"]}
 
 
 class Meter(SolarEdge):
 
-    def __init__(self, offset=False, *args, **kwargs):
+    wordorder = Endian.BIG
+
+    register_map = register_specs({
+        "c_manufacturer": (0x9cbb, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1, pollClass.STATIC),
+        "c_model": (0x9ccb, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1, pollClass.STATIC),
+        "c_option": (0x9cdb, 8, registerType.HOLDING, registerDataType.STRING, str, "Mode", "", 1, pollClass.STATIC),
+        "c_version": (0x9ce3, 8, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1, pollClass.STATIC),
+        "c_serialnumber": (0x9ceb, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1, pollClass.STATIC),
+        "c_deviceaddress": (0x9cfb, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1, pollClass.STATIC),
+        "c_sunspec_did": (0x9cfc, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", C_SUNSPEC_DID_MAP, 2, pollClass.STATIC),
+        "c_sunspec_length": (0x9cfd, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec Length", "16Bit Words", 2, pollClass.STATIC),
+
+        "current": (0x9cfe, 1, registerType.HOLDING, registerDataType.INT16, int, "Current", "A", 2, pollClass.FAST),
+        "l1_current": (0x9cff, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Current", "A", 2, pollClass.FAST),
+        "l2_current": (0x9d00, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Current", "A", 2, pollClass.FAST),
+        "l3_current": (0x9d01, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Current", "A", 2, pollClass.FAST),
+        "current_scale": (0x9d02, 1, registerType.HOLDING, registerDataType.SCALE, int, "Current Scale Factor", "", 2, pollClass.FAST),
+
+        "voltage_ln": (0x9d03, 1, registerType.HOLDING, registerDataType.INT16, int, "L-N Voltage", "V", 2, pollClass.MEDIUM),
+        "l1n_voltage": (0x9d04, 1, registerType.HOLDING, registerDataType.INT16, int, "L1-N Voltage", "V", 2, pollClass.MEDIUM),
+        "l2n_voltage": (0x9d05, 1, registerType.HOLDING, registerDataType.INT16, int, "L2-N Voltage", "V", 2, pollClass.MEDIUM),
+        "l3n_voltage": (0x9d06, 1, registerType.HOLDING, registerDataType.INT16, int, "L3-N Voltage", "V", 2, pollClass.MEDIUM),
+        "voltage_ll": (0x9d07, 1, registerType.HOLDING, registerDataType.INT16, int, "L-L Voltage", "V", 2, pollClass.MEDIUM),
+        "l12_voltage": (0x9d08, 1, registerType.HOLDING, registerDataType.INT16, int, "L1-l2 Voltage", "V", 2, pollClass.MEDIUM),
+        "l23_voltage": (0x9d09, 1, registerType.HOLDING, registerDataType.INT16, int, "L2-l3 Voltage", "V", 2, pollClass.MEDIUM),
+        "l31_voltage": (0x9d0a, 1, registerType.HOLDING, registerDataType.INT16, int, "L3-l1 Voltage", "V", 2, pollClass.MEDIUM),
+        "voltage_scale": (0x9d0b, 1, registerType.HOLDING, registerDataType.SCALE, int, "Voltage Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "frequency": (0x9d0c, 1, registerType.HOLDING, registerDataType.INT16, int, "Frequency", "Hz", 2, pollClass.MEDIUM),
+        "frequency_scale": (0x9d0d, 1, registerType.HOLDING, registerDataType.SCALE, int, "Frequency Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "power": (0x9d0e, 1, registerType.HOLDING, registerDataType.INT16, int, "Power", "W", 2, pollClass.FAST),
+        "l1_power": (0x9d0f, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power", "W", 2, pollClass.FAST),
+        "l2_power": (0x9d10, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power", "W", 2, pollClass.FAST),
+        "l3_power": (0x9d11, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power", "W", 2, pollClass.FAST),
+        "power_scale": (0x9d12, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Scale Factor", "", 2, pollClass.FAST),
+
+        "power_apparent": (0x9d13, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Apparent)", "VA", 2, pollClass.FAST),
+        "l1_power_apparent": (0x9d14, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power (Apparent)", "VA", 2, pollClass.FAST),
+        "l2_power_apparent": (0x9d15, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power (Apparent)", "VA", 2, pollClass.FAST),
+        "l3_power_apparent": (0x9d16, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power (Apparent)", "VA", 2, pollClass.FAST),
+        "power_apparent_scale": (0x9d17, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Apparent) Scale Factor", "", 2, pollClass.FAST),
+
+        "power_reactive": (0x9d18, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Reactive)", "VAr", 2, pollClass.FAST),
+        "l1_power_reactive": (0x9d19, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power (Reactive)", "VAr", 2, pollClass.FAST),
+        "l2_power_reactive": (0x9d1a, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power (Reactive)", "VAr", 2, pollClass.FAST),
+        "l3_power_reactive": (0x9d1b, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power (Reactive)", "VAr", 2, pollClass.FAST),
+        "power_reactive_scale": (0x9d1c, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Reactive) Scale Factor", "", 2, pollClass.FAST),
+
+        "power_factor": (0x9d1d, 1, registerType.HOLDING, registerDataType.INT16, int, "Power Factor", "", 2, pollClass.MEDIUM),
+        "l1_power_factor": (0x9d1e, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power Factor", "", 2, pollClass.MEDIUM),
+        "l2_power_factor": (0x9d1f, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power Factor", "", 2, pollClass.MEDIUM),
+        "l3_power_factor": (0x9d20, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power Factor", "", 2, pollClass.MEDIUM),
+        "power_factor_scale": (0x9d21, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Factor Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "export_energy_active": (0x9d22, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "l1_export_energy_active": (0x9d24, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "l2_export_energy_active": (0x9d26, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "l3_export_energy_active": (0x9d28, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "import_energy_active": (0x9d2a, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "l1_import_energy_active": (0x9d2c, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "l2_import_energy_active": (0x9d2e, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "l3_import_energy_active": (0x9d30, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Active)", "Wh", 2, pollClass.MEDIUM),
+        "energy_active_scale": (0x9d32, 1, registerType.HOLDING, registerDataType.SCALE, int, "Energy (Active) Scale Factor", "", 2, pollClass.MEDIUM),
+
+        "export_energy_apparent": (0x9d33, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "l1_export_energy_apparent": (0x9d35, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "l2_export_energy_apparent": (0x9d37, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "l3_export_energy_apparent": (0x9d39, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "import_energy_apparent": (0x9d3b, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "l1_import_energy_apparent": (0x9d3d, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "l2_import_energy_apparent": (0x9d3f, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "l3_import_energy_apparent": (0x9d41, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Apparent)", "VAh", 3, pollClass.MEDIUM),
+        "energy_apparent_scale": (0x9d43, 1, registerType.HOLDING, registerDataType.SCALE, int, "Energy (Apparent) Scale Factor", "", 3, pollClass.MEDIUM),
+
+        "import_energy_reactive_q1": (0x9d44, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Reactive) Quadrant 1", "VArh", 3, pollClass.MEDIUM),
+        "l1_import_energy_reactive_q1": (0x9d46, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Reactive) Quadrant 1", "VArh", 3, pollClass.MEDIUM),
+        "l2_import_energy_reactive_q1": (0x9d48, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Reactive) Quadrant 1", "VArh", 3, pollClass.MEDIUM),
+        "l3_import_energy_reactive_q1": (0x9d4a, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Reactive) Quadrant 1", "VArh", 3, pollClass.MEDIUM),
+        "import_energy_reactive_q2": (0x9d4c, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Reactive) Quadrant 2", "VArh", 3, pollClass.MEDIUM),
+        "l1_import_energy_reactive_q2": (0x9d4e, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Reactive) Quadrant 2", "VArh", 3, pollClass.MEDIUM),
+        "l2_import_energy_reactive_q2": (0x9d50, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Reactive) Quadrant 2", "VArh", 3, pollClass.MEDIUM),
+        "l3_import_energy_reactive_q2": (0x9d52, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Reactive) Quadrant 2", "VArh", 3, pollClass.MEDIUM),
+        "export_energy_reactive_q3": (0x9d54, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Reactive) Quadrant 3", "VArh", 3, pollClass.MEDIUM),
+        "l1_export_energy_reactive_q3": (0x9d56, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Reactive) Quadrant 3", "VArh", 3, pollClass.MEDIUM),
+        "l2_export_energy_reactive_q3": (0x9d58, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Reactive) Quadrant 3", "VArh", 3, pollClass.MEDIUM),
+        "l3_export_energy_reactive_q3": (0x9d5a, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Reactive) Quadrant 3", "VArh", 3, pollClass.MEDIUM),
+        "export_energy_reactive_q4": (0x9d5c, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Reactive) Quadrant 4", "VArh", 3, pollClass.MEDIUM),
+        "l1_export_energy_reactive_q4": (0x9d5e, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Reactive) Quadrant 4", "VArh", 3, pollClass.MEDIUM),
+        "l2_export_energy_reactive_q4": (0x9d60, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Reactive) Quadrant 4", "VArh", 3, pollClass.MEDIUM),
+        "l3_export_energy_reactive_q4": (0x9d62, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Reactive) Quadrant 4", "VArh", 3, pollClass.MEDIUM),
+        "energy_reactive_scale": (0x9d64, 1, registerType.HOLDING, registerDataType.SCALE, int, "Energy (Reactive) Scale Factor", "", 3, pollClass.MEDIUM)
+    })
+
+    # scale factor register: registers it applies to
+    scale_factors = {
+        "current_scale": ["current", "l1_current", "l2_current", "l3_current"],
+        "voltage_scale": [
+            "voltage_ln", "l1n_voltage", "l2n_voltage", "l3n_voltage",
+            "voltage_ll", "l12_voltage", "l23_voltage", "l31_voltage"
+        ],
+        "frequency_scale": ["frequency"],
+        "power_scale": ["power", "l1_power", "l2_power", "l3_power"],
+        "power_apparent_scale": ["power_apparent", "l1_power_apparent", "l2_power_apparent", "l3_power_apparent"],
+        "power_reactive_scale": ["power_reactive", "l1_power_reactive", "l2_power_reactive", "l3_power_reactive"],
+        "power_factor_scale": ["power_factor", "l1_power_factor", "l2_power_factor", "l3_power_factor"],
+        "energy_active_scale": [
+            "export_energy_active", "l1_export_energy_active", "l2_export_energy_active", "l3_export_energy_active",
+            "import_energy_active", "l1_import_energy_active", "l2_import_energy_active", "l3_import_energy_active"
+        ],
+        "energy_apparent_scale": [
+            "export_energy_apparent", "l1_export_energy_apparent", "l2_export_energy_apparent", "l3_export_energy_apparent",
+            "import_energy_apparent", "l1_import_energy_apparent", "l2_import_energy_apparent", "l3_import_energy_apparent"
+        ],
+        "energy_reactive_scale": [
+            "import_energy_reactive_q1", "l1_import_energy_reactive_q1", "l2_import_energy_reactive_q1", "l3_import_energy_reactive_q1",
+            "import_energy_reactive_q2", "l1_import_energy_reactive_q2", "l2_import_energy_reactive_q2", "l3_import_energy_reactive_q2",
+            "export_energy_reactive_q3", "l1_export_energy_reactive_q3", "l2_export_energy_reactive_q3", "l3_export_energy_reactive_q3",
+            "export_energy_reactive_q4", "l1_export_energy_reactive_q4", "l2_export_energy_reactive_q4", "l3_export_energy_reactive_q4"
+        ]
+    }
+
+    def __init__(self, offset=False, *args, base=None, **kwargs):
         self.model = f"Meter{offset + 1}"
-        self.wordorder = Endian.BIG
 
         super().__init__(*args, **kwargs)
 
-        self.offset = METER_REGISTER_OFFSETS[offset]
-        self.registers = {
-            "c_manufacturer": (0x9cbb + self.offset, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1),
-            "c_model": (0x9ccb + self.offset, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1),
-            "c_option": (0x9cdb + self.offset, 8, registerType.HOLDING, registerDataType.STRING, str, "Mode", "", 1),
-            "c_version": (0x9ce3 + self.offset, 8, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1),
-            "c_serialnumber": (0x9ceb + self.offset, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1),
-            "c_deviceaddress": (0x9cfb + self.offset, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1),
-            "c_sunspec_did": (0x9cfc + self.offset, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", C_SUNSPEC_DID_MAP, 2),
-            "c_sunspec_length": (0x9cfd + self.offset, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec Length", "16Bit Words", 2),
-
-            "current": (0x9cfe + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "Current", "A", 2),
-            "l1_current": (0x9cff + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Current", "A", 2),
-            "l2_current": (0x9d00 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Current", "A", 2),
-            "l3_current": (0x9d01 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Current", "A", 2),
-            "current_scale": (0x9d02 + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Current Scale Factor", "", 2),
-
-            "voltage_ln": (0x9d03 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L-N Voltage", "V", 2),
-            "l1n_voltage": (0x9d04 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L1-N Voltage", "V", 2),
-            "l2n_voltage": (0x9d05 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L2-N Voltage", "V", 2),
-            "l3n_voltage": (0x9d06 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L3-N Voltage", "V", 2),
-            "voltage_ll": (0x9d07 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L-L Voltage", "V", 2),
-            "l12_voltage": (0x9d08 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L1-l2 Voltage", "V", 2),
-            "l23_voltage": (0x9d09 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L2-l3 Voltage", "V", 2),
-            "l31_voltage": (0x9d0a + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L3-l1 Voltage", "V", 2),
-            "voltage_scale": (0x9d0b + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Voltage Scale Factor", "", 2),
-
-            "frequency": (0x9d0c + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "Frequency", "Hz", 2),
-            "frequency_scale": (0x9d0d + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Frequency Scale Factor", "", 2),
-
-            "power": (0x9d0e + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "Power", "W", 2),
-            "l1_power": (0x9d0f + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power", "W", 2),
-            "l2_power": (0x9d10 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power", "W", 2),
-            "l3_power": (0x9d11 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power", "W", 2),
-            "power_scale": (0x9d12 + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Scale Factor", "", 2),
-
-            "power_apparent": (0x9d13 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Apparent)", "VA", 2),
-            "l1_power_apparent": (0x9d14 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power (Apparent)", "VA", 2),
-            "l2_power_apparent": (0x9d15 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power (Apparent)", "VA", 2),
-            "l3_power_apparent": (0x9d16 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power (Apparent)", "VA", 2),
-            "power_apparent_scale": (0x9d17 + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Apparent) Scale Factor", "", 2),
-
-            "power_reactive": (0x9d18 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "Power (Reactive)", "VAr", 2),
-            "l1_power_reactive": (0x9d19 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power (Reactive)", "VAr", 2),
-            "l2_power_reactive": (0x9d1a + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power (Reactive)", "VAr", 2),
-            "l3_power_reactive": (0x9d1b + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power (Reactive)", "VAr", 2),
-            "power_reactive_scale": (0x9d1c + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power (Reactive) Scale Factor", "", 2),
-
-            "power_factor": (0x9d1d + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "Power Factor", "", 2),
-            "l1_power_factor": (0x9d1e + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L1 Power Factor", "", 2),
-            "l2_power_factor": (0x9d1f + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L2 Power Factor", "", 2),
-            "l3_power_factor": (0x9d20 + self.offset, 1, registerType.HOLDING, registerDataType.INT16, int, "L3 Power Factor", "", 2),
-            "power_factor_scale": (0x9d21 + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Power Factor Scale Factor", "", 2),
-
-            "export_energy_active": (0x9d22 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Active)", "Wh", 2),
-            "l1_export_energy_active": (0x9d24 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Active)", "Wh", 2),
-            "l2_export_energy_active": (0x9d26 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Active)", "Wh", 2),
-            "l3_export_energy_active": (0x9d28 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Active)", "Wh", 2),
-            "import_energy_active": (0x9d2a + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Active)", "Wh", 2),
-            "l1_import_energy_active": (0x9d2c + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Active)", "Wh", 2),
-            "l2_import_energy_active": (0x9d2e + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Active)", "Wh", 2),
-            "l3_import_energy_active": (0x9d30 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Active)", "Wh", 2),
-            "energy_active_scale": (0x9d32 + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Energy (Active) Scale Factor", "", 2),
-
-            "export_energy_apparent": (0x9d33 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Apparent)", "VAh", 3),
-            "l1_export_energy_apparent": (0x9d35 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Apparent)", "VAh", 3),
-            "l2_export_energy_apparent": (0x9d37 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Apparent)", "VAh", 3),
-            "l3_export_energy_apparent": (0x9d39 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Apparent)", "VAh", 3),
-            "import_energy_apparent": (0x9d3b + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Apparent)", "VAh", 3),
-            "l1_import_energy_apparent": (0x9d3d + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Apparent)", "VAh", 3),
-            "l2_import_energy_apparent": (0x9d3f + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Apparent)", "VAh", 3),
-            "l3_import_energy_apparent": (0x9d41 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Apparent)", "VAh", 3),
-            "energy_apparent_scale": (0x9d43 + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Energy (Apparent) Scale Factor", "", 3),
-
-            "import_energy_reactive_q1": (0x9d44 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Reactive) Quadrant 1", "VArh", 3),
-            "l1_import_energy_reactive_q1": (0x9d46 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Reactive) Quadrant 1", "VArh", 3),
-            "l2_import_energy_reactive_q1": (0x9d48 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Reactive) Quadrant 1", "VArh", 3),
-            "l3_import_energy_reactive_q1": (0x9d4a + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Reactive) Quadrant 1", "VArh", 3),
-            "import_energy_reactive_q2": (0x9d4c + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Imported Energy (Reactive) Quadrant 2", "VArh", 3),
-            "l1_import_energy_reactive_q2": (0x9d4e + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Imported Energy (Reactive) Quadrant 2", "VArh", 3),
-            "l2_import_energy_reactive_q2": (0x9d50 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Imported Energy (Reactive) Quadrant 2", "VArh", 3),
-            "l3_import_energy_reactive_q2": (0x9d52 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Imported Energy (Reactive) Quadrant 2", "VArh", 3),
-            "export_energy_reactive_q3": (0x9d54 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Reactive) Quadrant 3", "VArh", 3),
-            "l1_export_energy_reactive_q3": (0x9d56 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Reactive) Quadrant 3", "VArh", 3),
-            "l2_export_energy_reactive_q3": (0x9d58 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Reactive) Quadrant 3", "VArh", 3),
-            "l3_export_energy_reactive_q3": (0x9d5a + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Reactive) Quadrant 3", "VArh", 3),
-            "export_energy_reactive_q4": (0x9d5c + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Total Exported Energy (Reactive) Quadrant 4", "VArh", 3),
-            "l1_export_energy_reactive_q4": (0x9d5e + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L1 Exported Energy (Reactive) Quadrant 4", "VArh", 3),
-            "l2_export_energy_reactive_q4": (0x9d60 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L2 Exported Energy (Reactive) Quadrant 4", "VArh", 3),
-            "l3_export_energy_reactive_q4": (0x9d62 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "L3 Exported Energy (Reactive) Quadrant 4", "VArh", 3),
-            "energy_reactive_scale": (0x9d64 + self.offset, 1, registerType.HOLDING, registerDataType.SCALE, int, "Energy (Reactive) Scale Factor", "", 3)
-        }
+        # 'base' - register offset found by the discovery, otherwise the fixed position of the meter
+        self.offset = METER_REGISTER_OFFSETS[offset] if base is None else base
 
 
 class StorageInverter(SolarEdge):
-    def __init__(self, *args, **kwargs):
-        self.model = "StorageInverter"
-        self.wordorder = Endian.LITTLE
 
-        super().__init__(*args, **kwargs)
+    model = "StorageInverter"
+    wordorder = Endian.LITTLE
+
+    register_map = register_specs({
+        # name, address, length, register, type, target type, description, unit, batch, poll class
+        "c_manufacturer": (0x9c44, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1, pollClass.STATIC),
+        "c_model": (0x9c54, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1, pollClass.STATIC),
+        "c_version": (0x9c6c, 8, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1, pollClass.STATIC),
+        "c_serialnumber": (0x9c74, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1, pollClass.STATIC),
+        "c_deviceaddress": (0x9c84, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1, pollClass.STATIC),
+
+        "storage_control_mode": (0xe004, 1, registerType.HOLDING, registerDataType.UINT16, int, "Storage Control Mode", "", 2, pollClass.SLOW),
+        "storage_ac_charge_policy": (0xe005, 1, registerType.HOLDING, registerDataType.UINT16, int, "Storage AC Charge Policy", "", 2, pollClass.SLOW),
+        "storage_ac_charge_limit": (0xe006, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Storage AC Charge Limit", "", 2, pollClass.SLOW),
+        "storage_backup_reserved_setting": (0xe008, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Storage Backup Reserved Setting", "%", 2, pollClass.SLOW),
+        "storage_default_mode": (0xe00a, 1, registerType.HOLDING, registerDataType.UINT16, int, "Storage Charge/Discharge Default Mode", "", 2, pollClass.STATIC),
+        "rc_cmd_timeout": (0xe00B, 2, registerType.HOLDING, registerDataType.UINT32, int, "Remote Control Command Timeout", "s", 2, pollClass.MEDIUM),
+        "rc_cmd_mode": (0xe00d, 1, registerType.HOLDING, registerDataType.UINT16, int, "Remote Control Command Mode", "", 2, pollClass.MEDIUM),
+        "rc_charge_limit": (0xe00e, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Remote Control Command Charge Limit", "W", 2, pollClass.MEDIUM),
+        "rc_discharge_limit": (0xe010, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Remote Control Command Discharge Limit", "W", 2, pollClass.MEDIUM)
+    })
+
+    writable_registers = [
+        "storage_control_mode", "storage_ac_charge_policy", "storage_ac_charge_limit", "storage_backup_reserved_setting",
+        "storage_default_mode", "rc_cmd_timeout", "rc_cmd_mode", "rc_charge_limit", "rc_discharge_limit"
+    ]
+
 
-        self.registers = {
-            # name, address, length, register, type, target type, description, unit, batch
-            "c_manufacturer": (0x9c44, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1),
-            "c_model": (0x9c54, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1),
-            "c_version": (0x9c6c, 8, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1),
-            "c_serialnumber": (0x9c74, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1),
-            "c_deviceaddress": (0x9c84, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1),
-
-            "storage_control_mode": (0xe004, 1, registerType.HOLDING, registerDataType.UINT16, int, "Storage Control Mode", "", 2),
-            "storage_ac_charge_policy": (0xe005, 1, registerType.HOLDING, registerDataType.UINT16, int, "Storage AC Charge Policy", "", 2),
-            "storage_ac_charge_limit": (0xe006, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Storage AC Charge Limit", "", 2),
-            "storage_backup_reserved_setting": (0xe008, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Storage Backup Reserved Setting", "%", 2),
-            "storage_default_mode": (0xe00a, 1, registerType.HOLDING, registerDataType.UINT16, int, "Storage Charge/Discharge Default Mode", "", 2),
-            "rc_cmd_timeout": (0xe00B, 2, registerType.HOLDING, registerDataType.UINT32, int, "Remote Control Command Timeout", "s", 2),
-            "rc_cmd_mode": (0xe00d, 1, registerType.HOLDING, registerDataType.UINT16, int, "Remote Control Command Mode", "", 2),
-            "rc_charge_limit": (0xe00e, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Remote Control Command Charge Limit", "W", 2),
-            "rc_discharge_limit": (0xe010, 2, registerType.HOLDING, registerDataType.FLOAT32, float, "Remote Control Command Discharge Limit", "W", 2)
-        }
-        
 class Battery(SolarEdge):
 
+    wordorder = Endian.LITTLE
+
+    register_map = register_specs({
+        "c_manufacturer": (0xe100, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1, pollClass.STATIC),
+        "c_model": (0xe110, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1, pollClass.STATIC),
+        "c_version": (0xe120, 16, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1, pollClass.STATIC),
+        "c_serialnumber": (0xe130, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1, pollClass.STATIC),
+        "c_deviceaddress": (0xe140, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1, pollClass.STATIC),
+        "c_sunspec_did": (0xe141, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", "", 1, pollClass.STATIC),
+
+        "rated_energy": (0xe142, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Rated Energy", "Wh", 2, pollClass.STATIC),
+        "maximum_charge_continuous_power": (0xe144, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Charge Continuous Power", "W", 2, pollClass.STATIC),
+        "maximum_discharge_continuous_power": (0xe146, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Discharge Continuous Power", "W", 2, pollClass.STATIC),
+        "maximum_charge_peak_power": (0xe148, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Charge Peak Power", "W", 2, pollClass.STATIC),
+        "maximum_discharge_peak_power": (0xe14a, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Discharge Peak Power", "W", 2, pollClass.STATIC),
+
+        "average_temperature": (0xe16c, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Average Temperature", "°C", 2, pollClass.SLOW),
+        "maximum_temperature": (0xe16e, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Temperature", "°C", 2, pollClass.SLOW),
+
+        "instantaneous_voltage": (0xe170, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Instantaneous Voltage", "V", 2, pollClass.FAST),
+        "instantaneous_current": (0xe172, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Instantaneous Current", "A", 2, pollClass.FAST),
+        "instantaneous_power": (0xe174, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Instantaneous Power", "W", 2, pollClass.FAST),
+
+        "lifetime_export_energy_counter": (0xe176, 4, registerType.HOLDING, registerDataType.UINT64, int, "Total Exported Energy", "Wh", 2, pollClass.MEDIUM),
+        "lifetime_import_energy_counter": (0xe17A, 4, registerType.HOLDING, registerDataType.UINT64, int, "Total Imported Energy", "Wh", 2, pollClass.MEDIUM),
+
+        "maximum_energy": (0xe17e, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Energy", "Wh", 2, pollClass.SLOW),
+        "available_energy": (0xe180, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Available Energy", "Wh", 2, pollClass.MEDIUM),
+
+        "soh": (0xe182, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "State of Health (SOH)", "%", 2, pollClass.SLOW),
+        "soe": (0xe184, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "State of Energy (SOE)", "%", 2, pollClass.MEDIUM),
+
+        "status": (0xe186, 2, registerType.HOLDING, registerDataType.UINT32, int, "Status", BATTERY_STATUS_MAP, 2, pollClass.MEDIUM),
+        "status_internal": (0xe188, 2, registerType.HOLDING, registerDataType.UINT32, int, "Internal Status", BATTERY_STATUS_MAP, 2, pollClass.MEDIUM),
+
+        "event_log": (0xe18a, 2, registerType.HOLDING, registerDataType.UINT16, int, "Event Log", "", 2, pollClass.SLOW),
+        "event_log_internal": (0xe192, 2, registerType.HOLDING, registerDataType.UINT16, int, "Internal Event Log", "", 2, pollClass.SLOW),
+    })
+
     def __init__(self, offset=False, *args, **kwargs):
         self.model = f"Battery{offset + 1}"
-        self.wordorder = Endian.LITTLE
 
         super().__init__(*args, **kwargs)
 
         self.offset = BATTERY_REGISTER_OFFSETS[offset]
-        self.registers = {
-            "c_manufacturer": (0xe100 + self.offset, 16, registerType.HOLDING, registerDataType.STRING, str, "Manufacturer", "", 1),
-            "c_model": (0xe110 + self.offset, 16, registerType.HOLDING, registerDataType.STRING, str, "Model", "", 1),
-            "c_version": (0xe120 + self.offset, 16, registerType.HOLDING, registerDataType.STRING, str, "Version", "", 1),
-            "c_serialnumber": (0xe130 + self.offset, 16, registerType.HOLDING, registerDataType.STRING, str, "Serial", "", 1),
-            "c_deviceaddress": (0xe140 + self.offset, 1, registerType.HOLDING, registerDataType.UINT16, int, "Modbus ID", "", 1),
-            "c_sunspec_did": (0xe141 + self.offset, 1, registerType.HOLDING, registerDataType.UINT16, int, "SunSpec DID", "", 1),
-
-            "rated_energy": (0xe142 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Rated Energy", "Wh", 2),
-            "maximum_charge_continuous_power": (0xe144 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Charge Continuous Power", "W", 2),
-            "maximum_discharge_continuous_power": (0xe146 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Discharge Continuous Power", "W", 2),
-            "maximum_charge_peak_power": (0xe148 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Charge Peak Power", "W", 2),
-            "maximum_discharge_peak_power": (0xe14a + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Discharge Peak Power", "W", 2),
-
-            "average_temperature": (0xe16c + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Average Temperature", "°C", 2),
-            "maximum_temperature": (0xe16e + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Temperature", "°C", 2),
-
-            "instantaneous_voltage": (0xe170 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Instantaneous Voltage", "V", 2),
-            "instantaneous_current": (0xe172 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Instantaneous Current", "A", 2),
-            "instantaneous_power": (0xe174 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Instantaneous Power", "W", 2),
-
-            "lifetime_export_energy_counter": (0xe176 + self.offset, 4, registerType.HOLDING, registerDataType.UINT64, int, "Total Exported Energy", "Wh", 2),
-            "lifetime_import_energy_counter": (0xe17A + self.offset, 4, registerType.HOLDING, registerDataType.UINT64, int, "Total Imported Energy", "Wh", 2),
-
-            "maximum_energy": (0xe17e + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Maximum Energy", "Wh", 2),
-            "available_energy": (0xe180 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "Available Energy", "Wh", 2),
-
-            "soh": (0xe182 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "State of Health (SOH)", "%", 2),
-            "soe": (0xe184 + self.offset, 2, registerType.HOLDING, registerDataType.SEFLOAT, float, "State of Energy (SOE)", "%", 2),
-
-            "status": (0xe186 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Status", BATTERY_STATUS_MAP, 2),
-            "status_internal": (0xe188 + self.offset, 2, registerType.HOLDING, registerDataType.UINT32, int, "Internal Status", BATTERY_STATUS_MAP, 2),
-
-            "event_log": (0xe18a + self.offset, 2, registerType.HOLDING, registerDataType.UINT16, int, "Event Log", "", 2),
-            "event_log_internal": (0xe192 + self.offset, 2, registerType.HOLDING, registerDataType.UINT16, int, "Internal Event Log", "", 2),
-        }
\ No newline at end of file
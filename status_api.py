@@ -0,0 +1,198 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+MAX_WAIT = 60             # Upper bound of the long-poll wait in seconds
+OVERRIDE_DURATION = 3600  # Default lifetime of a manual override in seconds
+
+# Registers which can be overridden manually with their valid ranges
+OVERRIDE_LIMITS = {
+    "rc_cmd_mode": (0, 7),
+    "rc_charge_limit": (0, 100000),
+    "backup_reserve": (0, 100)
+}
+
+RC_CMD_MODES = [0, 1, 2, 3, 4, 5, 7]
+
+
+class ControllerStatus:
+    """
+    Versioned in-memory status of the controller, published by the control loop and served by the API.
+    Every change increments the version, which is used as the ETag and wakes up the long-polling clients.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.sections = {}
+        self.updated = None
+        self.overrides = queue.Queue()
+        self.wakeup = threading.Event()
+
+    def publish(self, **sections):
+        """
+        Update the given status sections. The version is incremented only if something has changed.
+
+        :param sections: Section name / JSON serialisable value
+
+        :return: None
+        """
+        with self.condition:
+            changed = {k: v for k, v in sections.items() if self.sections.get(k) != v}
+            if not changed:
+                return
+
+            self.sections.update(changed)
+            self.version += 1
+            self.updated = time.time()
+            self.condition.notify_all()
+
+    def get(self, since=None, timeout=0):
+        """
+        Current status. With 'since' waits up to 'timeout' seconds for a version newer than 'since'.
+
+        :param since: Version the client already has
+        :param timeout: Long-poll timeout in seconds
+
+        :return: Tuple (version, status) - status is None if not changed
+        """
+        with self.condition:
+            if since is not None:
+                self.condition.wait_for(lambda: self.version != since, timeout=timeout)
+                if self.version == since:
+                    return self.version, None
+
+            return self.version, {"version": self.version, "updated": self.updated, **self.sections}
+
+    def enqueue_override(self, values, duration=OVERRIDE_DURATION):
+        """
+        Validate and enqueue manual overrides for the control loop
+
+        :param values: Dictionary with any of OVERRIDE_LIMITS keys. None clears the override
+        :param duration: Lifetime of the override in seconds
+
+        :return: None, raises ValueError for invalid values
+        """
+        overrides = {}
+
+        for key, value in values.items():
+            if key not in OVERRIDE_LIMITS:
+                raise ValueError(f"\"{key}\" can't be overridden. Valid keys: {', '.join(OVERRIDE_LIMITS)}")
+
+            if value is not None:
+                low, high = OVERRIDE_LIMITS[key]
+                if not isinstance(value, (int, float)) or isinstance(value, bool) or not low <= value <= high:
+                    raise ValueError(f"\"{key}\" must be a number between {low} and {high}")
+                if key == "rc_cmd_mode" and value not in RC_CMD_MODES:
+                    raise ValueError(f"\"rc_cmd_mode\" must be one of {RC_CMD_MODES}")
+
+            overrides[key] = value
+
+        if not isinstance(duration, (int, float)) or duration <= 0:
+            raise ValueError("\"duration\" must be a positive number of seconds")
+
+        self.overrides.put((overrides, time.time() + duration))
+        self.wakeup.set()
+
+    def pending_overrides(self):
+        """
+        Drain the override queue
+
+        :return: List of (overrides, expiry timestamp) in the order they were posted
+        """
+        pending = []
+
+        while True:
+            try:
+                pending.append(self.overrides.get_nowait())
+            except queue.Empty:
+                return pending
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """
+    GET  /status               - controller status; ETag / If-None-Match, ?wait=<s> long-polls for a change
+    GET  /telemetry?channel=soe&seconds=600&resolution=60 - in-memory telemetry history
+    POST /override             - {"rc_cmd_mode": 3, "rc_charge_limit": 2000, "backup_reserve": 20, "duration": 3600}
+    """
+
+    status = None
+    telemetry = None
+
+    def _send(self, code, body=None, version=None):
+        data = json.dumps(body).encode() if body is not None else b""
+
+        self.send_response(code)
+        if version is not None:
+            self.send_header("ETag", f"\"{version}\"")
+        self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        try:
+            if url.path == "/status":
+                etag = self.headers.get("If-None-Match", "").strip("\"")
+                since = int(etag) if etag.isdigit() else None
+                wait = min(float(query.get("wait", 0)), MAX_WAIT) if since is not None else 0
+                version, status = self.status.get(since, wait)
+
+                if status is None:
+                    self._send(304, version=version)
+                else:
+                    self._send(200, status, version)
+            elif url.path == "/telemetry" and self.telemetry:
+                history = self.telemetry.query(query.get("channel", "soe"), int(query.get("seconds", 600)),
+                                               int(query.get("resolution", 0)))
+                self._send(200, history)
+            else:
+                self._send(404, {"error": "Not found"})
+        except (KeyError, ValueError) as err:
+            self._send(400, {"error": str(err)})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/override":
+            self._send(404, {"error": "Not found"})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("The body must be a JSON object of the overrides")
+            duration = body.pop("duration", OVERRIDE_DURATION)
+            self.status.enqueue_override(body, duration)
+            self._send(202, {"queued": body, "duration": duration})
+        except (AttributeError, TypeError, ValueError) as err:
+            self._send(400, {"error": str(err)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(status, host="127.0.0.1", port=8080, telemetry=None):
+    """
+    Serve the status API from a daemon thread
+
+    :param status: ControllerStatus to be served
+    :param host: Listen address - keep it local, the API has no authentication
+    :param port: Listen port
+    :param telemetry: Optional telemetry.Telemetry history
+
+    :return: The HTTP server
+    """
+    handler = type("Handler", (StatusHandler,), {"status": status, "telemetry": telemetry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="status_api", daemon=True).start()
+
+    return server
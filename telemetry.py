@@ -0,0 +1,243 @@
+import math
+import time
+from array import array
+
+
+CHANNELS = ["battery_power", "soe", "meter_power", "power_ac"]
+
+# Resolution in seconds (0 - raw samples) and the default retention in seconds
+RESOLUTIONS = [
+    (0, 3600),         # Raw samples: 1 hour
+    (10, 6 * 3600),    # 10 s: 6 hours
+    (60, 48 * 3600),   # 1 min: 2 days
+    (900, 30 * 86400)  # 15 min: 30 days
+]
+
+MEMORY_BUDGET = 2 * 1024 * 1024  # Upper bound of the buffer memory in bytes
+ITEM_SIZE = array("d").itemsize
+NAN = float("nan")
+
+
+class Ring:
+    """
+    Fixed capacity ring of columns (array("d") each) sharing the same write position.
+    Appending overwrites the oldest row once the ring is full.
+    """
+
+    __slots__ = ("capacity", "columns", "head", "count")
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = {name: array("d", bytes(capacity * ITEM_SIZE)) for name in columns}
+        self.head = 0
+        self.count = 0
+
+    def append(self, row):
+        head = self.head
+
+        for column, value in zip(self.columns.values(), row):
+            column[head] = value
+
+        self.head = (head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def last(self, column, n):
+        """
+        The last n values of the column, the oldest first
+
+        :param column: Column name
+        :param n: Number of rows
+
+        :return: List of values
+        """
+        n = min(n, self.count)
+        data = self.columns[column]
+        start = self.head - n
+
+        if start >= 0:
+            return data[start:self.head].tolist()
+
+        return data[start:].tolist() + data[:self.head].tolist()
+
+    def nbytes(self):
+        return len(self.columns) * self.capacity * ITEM_SIZE
+
+
+class Rollup:
+    """
+    Rolling min/max/mean/last aggregates and the sample counts of all channels in fixed time buckets.
+    The bucket being filled is kept in plain lists and moved into the ring when the next bucket starts.
+    """
+
+    __slots__ = ("resolution", "channels", "ring", "bucket", "minimum", "maximum", "total", "count", "latest")
+
+    def __init__(self, resolution, capacity, channels):
+        self.resolution = resolution
+        self.channels = channels
+        columns = ["timestamp"] + [f"{channel}_{stat}" for channel in channels for stat in ("min", "max", "mean", "last", "count")]
+        self.ring = Ring(capacity, columns)
+        self.bucket = None
+        self._reset()
+
+    def _reset(self):
+        size = len(self.channels)
+        self.minimum = [math.inf] * size
+        self.maximum = [-math.inf] * size
+        self.total = [0.0] * size
+        self.count = [0] * size
+        self.latest = [NAN] * size
+
+    def _close(self):
+        row = [self.bucket]
+
+        for idx in range(len(self.channels)):
+            if self.count[idx]:
+                row += [self.minimum[idx], self.maximum[idx], self.total[idx] / self.count[idx], self.latest[idx],
+                        self.count[idx]]
+            else:
+                row += [NAN, NAN, NAN, NAN, 0]
+
+        self.ring.append(row)
+        self._reset()
+
+    def add(self, timestamp, values):
+        bucket = timestamp - timestamp % self.resolution
+
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                self._close()
+            self.bucket = bucket
+
+        for idx, value in enumerate(values):
+            if value != value:  # NaN - sample missing
+                continue
+
+            if value < self.minimum[idx]:
+                self.minimum[idx] = value
+            if value > self.maximum[idx]:
+                self.maximum[idx] = value
+            self.total[idx] += value
+            self.count[idx] += 1
+            self.latest[idx] = value
+
+
+class Telemetry:
+    """
+    In-memory 1 Hz history of the given channels with a fixed memory budget: a ring of the raw samples
+    plus rollups at 10 s, 1 min and 15 min. Queries are served from memory only - the cost depends on the
+    number of returned points, not on the amount of stored history.
+    """
+
+    def __init__(self, channels=CHANNELS, resolutions=RESOLUTIONS, memory=MEMORY_BUDGET):
+        self.channels = list(channels)
+        self.index = {channel: idx for idx, channel in enumerate(self.channels)}
+
+        # Bytes per stored row: timestamp + one value (raw) or min/max/mean/last/count (rollups) per channel
+        rows = {resolution: retention // max(resolution, 1) for resolution, retention in resolutions}
+        row_size = {resolution: ITEM_SIZE * (1 + len(self.channels) * (5 if resolution else 1)) for resolution in rows}
+        needed = sum(rows[resolution] * row_size[resolution] for resolution in rows)
+        ratio = min(1.0, memory / needed)
+
+        self.raw = None
+        self.rollups = {}
+
+        for resolution, count in rows.items():
+            capacity = max(1, int(count * ratio))
+            if resolution:
+                self.rollups[resolution] = Rollup(resolution, capacity, self.channels)
+            else:
+                self.raw = Ring(capacity, ["timestamp"] + self.channels)
+
+    def add(self, values, timestamp=None):
+        """
+        Add a sample
+
+        :param values: Dictionary with the channel values. Missing channels are stored as NaN
+        :param timestamp: Sample time (UNIX seconds), defaults to now
+
+        :return: None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        row = [float(values[channel]) if values.get(channel) is not None else NAN for channel in self.channels]
+
+        if self.raw:
+            self.raw.append([timestamp] + row)
+
+        for rollup in self.rollups.values():
+            rollup.add(timestamp, row)
+
+    def last(self, channel):
+        """
+        The latest raw value of the channel
+
+        :param channel: Channel name
+
+        :return: Value or None
+        """
+        if not self.raw or not self.raw.count:
+            return None
+
+        value = self.raw.columns[channel][self.raw.head - 1]
+
+        return None if value != value else value
+
+    def query(self, channel, seconds, resolution=0):
+        """
+        History of the channel over the last given seconds
+
+        :param channel: Channel name
+        :param seconds: Length of the window in seconds
+        :param resolution: 0 for the raw samples or one of the rollup resolutions (10, 60, 900)
+
+        :return: List of (timestamp, value) for the raw samples,
+        list of (timestamp, min, max, mean, last) for the rollups - the oldest first
+        """
+        if not resolution:
+            timestamps = self.raw.last("timestamp", seconds)
+            values = self.raw.last(channel, seconds)
+            since = time.time() - seconds
+
+            return [(t, v) for t, v in zip(timestamps, values) if t >= since]
+
+        rollup = self.rollups[resolution]
+        count = -(-seconds // resolution)
+        ring = rollup.ring
+        columns = [ring.last("timestamp", count)] + [ring.last(f"{channel}_{stat}", count)
+                                                      for stat in ("min", "max", "mean", "last")]
+        since = time.time() - seconds - resolution
+
+        return [row for row in zip(*columns) if row[0] >= since]
+
+    def summary(self, channel, seconds):
+        """
+        min/max/mean/last of the channel over the last given seconds, combined from the coarsest
+        rollup which fits into the window (closed buckets only). The mean is weighted by the sample
+        counts of the buckets, so partial buckets and gaps don't skew it.
+
+        :param channel: Channel name
+        :param seconds: Length of the window in seconds
+
+        :return: Dictionary with "min", "max", "mean", "last" or None when there is no data
+        """
+        resolution = max([r for r in self.rollups if r <= seconds] or [min(self.rollups)])
+        ring = self.rollups[resolution].ring
+        count = -(-seconds // resolution)
+        columns = [ring.last("timestamp", count)] + [ring.last(f"{channel}_{stat}", count)
+                                                      for stat in ("min", "max", "mean", "last", "count")]
+        since = time.time() - seconds - resolution
+        rows = [row for row in zip(*columns) if row[0] >= since and row[5]]
+
+        if not rows:
+            return None
+
+        return {
+            "min": min(row[1] for row in rows),
+            "max": max(row[2] for row in rows),
+            "mean": sum(row[3] * row[5] for row in rows) / sum(row[5] for row in rows),
+            "last": rows[-1][4]
+        }
+
+    def nbytes(self):
+        return (self.raw.nbytes() if self.raw else 0) + sum(rollup.ring.nbytes() for rollup in self.rollups.values())
@@ -0,0 +1,89 @@
+import pytest
+
+import alerts
+
+
+def states(notifications):
+    return [(notification["rule"], notification["state"]) for notification in notifications]
+
+
+def test_debounce():
+    engine = alerts.RuleEngine([{"name": "hot", "field": "temperature", "op": ">", "value": 45, "for": 10}])
+
+    assert engine.evaluate({"temperature": 50}, now=0) == []
+    assert engine.evaluate({"temperature": 50}, now=9) == []
+    assert states(engine.evaluate({"temperature": 50}, now=10)) == [("hot", "firing")]
+    assert engine.active() == ["hot"]
+
+
+def test_debounce_restarts_when_the_condition_breaks():
+    engine = alerts.RuleEngine([{"name": "hot", "field": "temperature", "op": ">", "value": 45, "for": 10}])
+
+    engine.evaluate({"temperature": 50}, now=0)
+    engine.evaluate({"temperature": 40}, now=5)
+    engine.evaluate({"temperature": 50}, now=6)
+
+    assert engine.evaluate({"temperature": 50}, now=12) == []
+    assert states(engine.evaluate({"temperature": 50}, now=16)) == [("hot", "firing")]
+
+
+def test_hysteresis():
+    engine = alerts.RuleEngine([{"name": "low", "field": "soe", "op": "<", "value": 10, "hysteresis": 5}])
+
+    assert states(engine.evaluate({"soe": 9}, now=0)) == [("low", "firing")]
+    # Above the threshold, but not by the hysteresis
+    assert engine.evaluate({"soe": 12}, now=1) == []
+    assert engine.evaluate({"soe": 9}, now=2) == []
+    assert states(engine.evaluate({"soe": 15}, now=3)) == [("low", "resolved")]
+    assert engine.active() == []
+
+
+def test_cooldown():
+    engine = alerts.RuleEngine([{"name": "import", "field": "meter_power", "op": "<", "value": -3000, "cooldown": 60}])
+
+    assert states(engine.evaluate({"meter_power": -4000}, now=0)) == [("import", "firing")]
+    assert states(engine.evaluate({"meter_power": 0}, now=1)) == [("import", "resolved")]
+    # Within the cooldown the rule stays pending and fires once it is over
+    assert engine.evaluate({"meter_power": -4000}, now=30) == []
+    assert engine.evaluate({"meter_power": -4000}, now=59) == []
+    assert states(engine.evaluate({"meter_power": -4000}, now=60)) == [("import", "firing")]
+
+
+def test_missing_values_never_match():
+    engine = alerts.RuleEngine([{"name": "hot", "field": "temperature", "op": ">", "value": 45}])
+
+    assert engine.evaluate({}, now=0) == []
+    assert engine.evaluate({"temperature": None}, now=1) == []
+
+
+def test_field_comparison_and_when():
+    engine = alerts.RuleEngine([{
+        "name": "charging from grid", "field": "battery_power", "op": ">", "value": {"field": "pv"},
+        "when": {"field": "meter_power", "op": "<", "value": 0}
+    }])
+
+    assert engine.evaluate({"battery_power": 3000, "pv": 1000, "meter_power": 100}, now=0) == []
+    assert states(engine.evaluate({"battery_power": 3000, "pv": 1000, "meter_power": -2000}, now=1)) == \
+        [("charging from grid", "firing")]
+
+
+def test_stuck_value():
+    engine = alerts.RuleEngine([{"name": "stuck", "field": "soe", "op": "unchanged", "value": 1, "for": 60}])
+
+    for second in range(0, 60, 10):
+        assert engine.evaluate({"soe": 50 + second / 100}, now=second) == []
+    assert states(engine.evaluate({"soe": 50.5}, now=70)) == [("stuck", "firing")]
+    assert states(engine.evaluate({"soe": 52}, now=80)) == [("stuck", "resolved")]
+
+
+def test_drop_from_the_peak():
+    engine = alerts.RuleEngine([{"name": "soh", "field": "soh", "op": "drop", "value": 2}])
+
+    assert engine.evaluate({"soh": 99}, now=0) == []
+    assert engine.evaluate({"soh": 97.5}, now=1) == []
+    assert states(engine.evaluate({"soh": 96.5}, now=2)) == [("soh", "firing")]
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError):
+        alerts.RuleEngine([{"name": "x", "field": "soe", "op": "~", "value": 1}])
@@ -0,0 +1,89 @@
+import math
+
+import pytest
+
+import battery_wear
+
+
+@pytest.mark.parametrize("dod, cycles", battery_wear.DOD_CYCLE_LIFE["NMC"])
+def test_cycle_life_of_the_table(dod, cycles):
+    assert battery_wear.cycle_life(dod) == pytest.approx(cycles)
+
+
+def test_cycle_life_is_interpolated_log_log():
+    # Between 20% (2000) and 40% (1000) the life halves with every doubling of the DoD
+    assert battery_wear.cycle_life(30) == pytest.approx(2000 / 1.5)
+    assert battery_wear.cycle_life(50, "LiFePO4") == pytest.approx(3000 * (50 / 40) ** (math.log(1500 / 3000) / math.log(60 / 40)))
+
+
+def test_cycle_life_outside_of_the_table():
+    # The first segment is extrapolated below 10%, above 100% the DoD is capped
+    assert battery_wear.cycle_life(5) == pytest.approx(18000)
+    assert battery_wear.cycle_life(120) == pytest.approx(300)
+
+
+def feed(counter, values):
+    for value in values:
+        counter.add(value)
+    return counter
+
+
+def test_rainflow_counts_closed_cycles():
+    counter = feed(battery_wear.RainflowCounter(), [20, 80, 50, 70, 40, 90, 20])
+
+    assert counter.cycles == {"10-20": 1, "20-40": 1}
+    assert counter.full_cycles == pytest.approx(0.6)
+    assert counter.damage == pytest.approx(1 / battery_wear.cycle_life(20) + 1 / battery_wear.cycle_life(40))
+    assert counter.residual == [20, 90]
+    assert counter.half_cycles() == [70, 70]
+
+
+def test_rainflow_ignores_noise_below_the_hysteresis():
+    noisy = feed(battery_wear.RainflowCounter(), [20, 80, 79.8, 80, 79.7, 50, 50.3, 50, 70, 40, 40.4, 60])
+    clean = feed(battery_wear.RainflowCounter(), [20, 80, 50, 70, 40, 60])
+
+    assert noisy.cycles == clean.cycles == {"10-20": 1}
+    assert noisy.residual == clean.residual
+
+
+def test_rainflow_residual_is_bounded():
+    # A growing oscillation never closes a cycle
+    counter = feed(battery_wear.RainflowCounter(max_residual=8), [50 + (-1) ** idx * idx for idx in range(1, 40)])
+
+    assert len(counter.residual) <= 8
+    assert sum(counter.cycles.values()) > 0
+
+
+def test_report_counts_the_open_half_cycles():
+    wear = battery_wear.BatteryWear(capacity=10000)
+    for soe, energy in ((20, 0), (80, 6000), (50, 9000), (70, 11000), (40, 14000), (90, 19000), (20, 26000)):
+        wear.add(soe, soh=100, export_energy=energy // 2, import_energy=energy - energy // 2)
+    report = wear.report()
+
+    assert report["cycles"] == {"10-20": 1, "20-40": 1, "60-80": 1.0}
+    assert report["equivalent_full_cycles"] == pytest.approx(1.3)
+    assert report["counter_equivalent_full_cycles"] == pytest.approx(1.3)
+
+
+def test_state_round_trip(tmp_path):
+    file_name = str(tmp_path / "wear.json")
+    wear = battery_wear.BatteryWear("LiFePO4", capacity=10000)
+    for soe in (20, 80, 50, 70, 40, 90):
+        wear.add(soe, soh=99.5, export_energy=0, import_energy=0, timestamp=1000 + soe)
+
+    battery_wear.save_state(wear, file_name)
+    loaded = battery_wear.load_state(file_name)
+
+    assert loaded.to_dict() == wear.to_dict()
+    assert loaded.first["export_energy"] == 0
+    assert loaded.report() == wear.report()
+    assert [path.name for path in tmp_path.iterdir()] == ["wear.json"]
+
+
+def test_missing_or_broken_state_starts_over(tmp_path):
+    file_name = tmp_path / "wear.json"
+    assert battery_wear.load_state(str(file_name), "LiFePO4", 5000).to_dict()["capacity"] == 5000
+
+    file_name.write_text('{"rainflow": ')
+    wear = battery_wear.load_state(str(file_name), "LiFePO4")
+    assert wear.samples == 0 and wear.rainflow.chemistry == "LiFePO4"
@@ -0,0 +1,178 @@
+import math
+import random
+import struct
+
+import pytest
+from pymodbus.constants import Endian
+from pymodbus.payload import BinaryPayloadDecoder
+
+import solaredge_modbus
+from codec_check import Devices, LENGTHS, encode, fill_image, random_value
+from solaredge_modbus import registerDataType, registerType
+
+
+SEED = 1
+ROUND_TRIPS = 2000         # Random values per data type and word order
+TABLE_ROUNDS = 50          # Random register images per register table
+
+B, L = Endian.BIG, Endian.LITTLE
+
+# Golden frames: data type, word order, register words, length, vtype, decoded value
+GOLDEN_FRAMES = [
+    (registerDataType.UINT16, B, [0x1234], 1, int, 0x1234),
+    (registerDataType.UINT16, B, [0xfffe], 1, int, 0xfffe),
+    (registerDataType.UINT16, B, [0xffff], 1, int, 0),
+    (registerDataType.INT16, B, [0xfffe], 1, int, -2),
+    (registerDataType.INT16, B, [0x7fff], 1, int, 0x7fff),
+    (registerDataType.INT16, B, [0x8001], 1, int, -0x7fff),
+    (registerDataType.INT16, B, [0x8000], 1, int, 0),
+    (registerDataType.SCALE, B, [0xfffe], 1, int, -2),
+    (registerDataType.SCALE, L, [0x8000], 1, int, 0),
+    (registerDataType.UINT32, B, [0x0001, 0x0002], 2, int, 0x10002),
+    (registerDataType.UINT32, L, [0x0002, 0x0001], 2, int, 0x10002),
+    (registerDataType.UINT32, L, [0xffff, 0xffff], 2, int, 0),
+    (registerDataType.ACC32, B, [0x00bc, 0x614e], 2, int, 12345678),
+    (registerDataType.ACC32, L, [0x614e, 0x00bc], 2, int, 12345678),
+    (registerDataType.ACC32, B, [0xffff, 0xffff], 2, int, 0xffffffff),
+    (registerDataType.ACC32, B, [0x0000, 0x0000], 2, int, 0),
+    (registerDataType.INT32, B, [0xffff, 0xfffe], 2, int, -2),
+    (registerDataType.INT32, L, [0xfffe, 0xffff], 2, int, -2),
+    (registerDataType.INT32, B, [0x8000, 0x0000], 2, int, 0),
+    (registerDataType.INT32, L, [0x0000, 0x8000], 2, int, 0),
+    (registerDataType.INT32, L, [0x8000, 0x0000], 2, int, 0x8000),
+    (registerDataType.UINT64, B, [0x0000, 0x0000, 0x002d, 0xc6c0], 4, int, 3000000),
+    (registerDataType.UINT64, L, [0xc6c0, 0x002d, 0x0000, 0x0000], 4, int, 3000000),
+    (registerDataType.UINT64, L, [0xffff, 0xffff, 0xffff, 0xffff], 4, int, 0),
+    (registerDataType.FLOAT32, B, [0x4120, 0x0000], 2, float, 10.0),
+    (registerDataType.FLOAT32, L, [0x0000, 0x4120], 2, float, 10.0),
+    (registerDataType.FLOAT32, B, [0xc2f6, 0xe979], 2, float, struct.unpack(">f", bytes.fromhex("c2f6e979"))[0]),
+    (registerDataType.FLOAT32, B, [0x7fc0, 0x0000], 2, float, 0.0),
+    (registerDataType.FLOAT32, L, [0x0000, 0x7fc0], 2, float, 0.0),
+    (registerDataType.FLOAT32, B, [0x7f80, 0x0001], 2, float, 0.0),
+    (registerDataType.FLOAT32, B, [0x7f80, 0x0000], 2, float, math.inf),
+    (registerDataType.SEFLOAT, L, [0x0000, 0x41c4], 2, float, 24.5),
+    (registerDataType.SEFLOAT, L, [0x0000, 0xc482], 2, float, -1040.0),
+    (registerDataType.SEFLOAT, L, [0xffff, 0xffff], 2, float, 0.0),
+    (registerDataType.SEFLOAT, B, [0x0000, 0x0000], 2, float, 0.0),
+    (registerDataType.STRING, B, [0x5375, 0x6e53], 2, str, "SunS"),
+    (registerDataType.STRING, L, [0x5375, 0x6e53], 2, str, "SunS"),
+    (registerDataType.STRING, B, [0x4142, 0x4300, 0x0000, 0x0000], 4, str, "ABC"),
+    (registerDataType.STRING, B, [0x4142, 0x2020, 0x0000, 0x0000], 4, str, "AB"),
+    (registerDataType.STRING, B, [0x0000, 0x0000], 2, str, ""),
+]
+
+ENCODABLE = [
+    registerDataType.UINT16, registerDataType.INT16, registerDataType.UINT32, registerDataType.INT32,
+    registerDataType.UINT64, registerDataType.FLOAT32, registerDataType.SEFLOAT, registerDataType.STRING,
+    registerDataType.ACC32
+]
+
+TABLES = ["Inverter", "Meter", "StorageInverter", "Battery"]
+
+
+@pytest.fixture(scope="module")
+def devices():
+    return Devices()
+
+
+def decode(device, words, length, dtype, vtype):
+    data = BinaryPayloadDecoder.fromRegisters(words, byteorder=Endian.BIG, wordorder=device.wordorder)
+    return device._decode_value(data, length, dtype, vtype)
+
+
+def vtype_of(dtype):
+    if dtype == registerDataType.STRING:
+        return str
+    if dtype in (registerDataType.FLOAT32, registerDataType.SEFLOAT):
+        return float
+    return int
+
+
+def same(decoded, expected):
+    if isinstance(expected, float):
+        return isinstance(decoded, float) and (decoded == expected or math.isclose(decoded, expected, rel_tol=1e-12))
+
+    return type(decoded) is type(expected) and decoded == expected
+
+
+def expected_value(device, k, raw, scales, scaled):
+    v = device.registers[k]
+    value = v.vtype() if raw[k] is None else v.vtype(raw[k])
+
+    scale_key = device._scale_registers().get(k)
+    if not scaled or scale_key is None or scales[scale_key] is None:
+        return value
+
+    return value * 10 ** scales[scale_key]
+
+
+@pytest.mark.parametrize("dtype, wordorder, words, length, vtype, expected", GOLDEN_FRAMES)
+def test_golden_frame(devices, dtype, wordorder, words, length, vtype, expected):
+    assert same(decode(devices.word_orders[wordorder], words, length, dtype, vtype), expected)
+
+
+@pytest.mark.parametrize("wordorder", [B, L])
+@pytest.mark.parametrize("dtype", ENCODABLE, ids=lambda dtype: dtype.name)
+def test_round_trip(devices, dtype, wordorder):
+    rnd = random.Random(SEED)
+    device = devices.word_orders[wordorder]
+    length = LENGTHS.get(dtype, 8)
+    vtype = vtype_of(dtype)
+
+    for _ in range(ROUND_TRIPS):
+        value = random_value(rnd, dtype, length)
+        words = encode(device, value, dtype, length)
+
+        assert len(words) == length
+        assert same(decode(device, words, length, dtype, vtype), vtype(value)), (value, [hex(w) for w in words])
+
+
+@pytest.mark.parametrize("wordorder", [B, L])
+@pytest.mark.parametrize("dtype", ENCODABLE, ids=lambda dtype: dtype.name)
+def test_not_implemented_decodes_as_empty(devices, dtype, wordorder):
+    device = devices.word_orders[wordorder]
+    length = LENGTHS.get(dtype, 8)
+    vtype = vtype_of(dtype)
+    sentinel = device._sentinel(solaredge_modbus.RegisterSpec(0, length, registerType.HOLDING, dtype, vtype, "", "", 1))
+
+    if sentinel:
+        assert same(decode(device, list(sentinel), length, dtype, vtype), vtype())
+
+
+@pytest.mark.parametrize("name", TABLES)
+def test_registers_dont_overlap(devices, name):
+    covered = {}
+
+    for k, v in devices.tables[name].registers.items():
+        for address in range(v.address, v.address + v.length):
+            assert address not in covered, f"{k} overlaps {covered[address]} at {hex(address)}"
+            covered[address] = k
+
+
+@pytest.mark.parametrize("scaled", [False, True])
+@pytest.mark.parametrize("name", TABLES)
+def test_table_read(devices, name, scaled):
+    rnd = random.Random(SEED)
+    device = devices.tables[name]
+
+    for _ in range(TABLE_ROUNDS):
+        devices.image = {}
+        raw, scales = fill_image(devices, device, rnd)
+        results = device.read_all(scaled=scaled)
+        snapshot = device.read_snapshot(scaled=scaled).as_dict()
+
+        for k in device.registers:
+            if scaled and k in device.scale_factors:
+                continue
+
+            expected = expected_value(device, k, raw, scales, scaled)
+            assert k in results, f"{k} not read"
+
+            if isinstance(expected, float) and isinstance(results[k], float):
+                # Scaled values are rounded to the decimals of the scale factor
+                assert math.isclose(results[k], expected, rel_tol=1e-9, abs_tol=1e-9) or \
+                    abs(results[k] - expected) <= 10 ** scales.get(device._scale_registers().get(k), 0) / 2, k
+            else:
+                assert same(results[k], expected), k
+
+            assert same(snapshot[k], results[k]), k
@@ -0,0 +1,80 @@
+import json
+
+from pymodbus.pdu import ExceptionResponse
+
+import solaredge_modbus
+
+
+class SilentClient:
+    """
+    Modbus client of a link which is up but whose reads time out
+    """
+
+    def __init__(self):
+        self.reads = 0
+
+    def connect(self):
+        return True
+
+    def close(self):
+        pass
+
+    def is_socket_open(self):
+        return True
+
+    def read_holding_registers(self, address, count, slave=1):
+        self.reads += 1
+        return None
+
+
+class RejectingClient(SilentClient):
+    """
+    Modbus client of a device which answers every read with "illegal data address"
+    """
+
+    def read_holding_registers(self, address, count, slave=1):
+        self.reads += 1
+        return ExceptionResponse(0x03, 0x02)
+
+
+def silent_inverter(state_file=None, client=SilentClient):
+    inverter = solaredge_modbus.Inverter(host="127.0.0.1", port=1502)
+    inverter.client = client()
+    inverter.connection = solaredge_modbus.ConnectionManager(inverter.client, state_file=state_file)
+    inverter.connection.ensure = lambda: True
+    return inverter
+
+
+def test_read_counts_one_failure_with_all_its_retries():
+    inverter = silent_inverter()
+
+    assert inverter._read_holding_registers_raw(0x9c40, 2) is None
+    assert inverter.client.reads == solaredge_modbus.RETRIES
+    assert inverter.last_error == "timeout"
+    assert inverter.connection.failures == 1
+    assert not inverter.connection.is_open()
+
+    for _ in range(solaredge_modbus.FAILURE_THRESHOLD - 1):
+        inverter._read_holding_registers_raw(0x9c40, 2)
+
+    assert inverter.connection.is_open()
+
+
+def test_state_is_replaced_as_a_whole(tmp_path):
+    state_file = str(tmp_path / "connection.json")
+    inverter = silent_inverter(state_file)
+
+    inverter._read_holding_registers_raw(0x9c40, 2)
+
+    with open(state_file) as file:
+        assert json.load(file) == {"failures": 1, "open_until": 0}
+    assert [path.name for path in tmp_path.iterdir()] == ["connection.json"]
+
+
+def test_exception_response_is_not_retried():
+    inverter = silent_inverter(client=RejectingClient)
+
+    assert inverter._read_holding_registers_raw(0x9c40, 2) is None
+    assert inverter.client.reads == 1
+    assert inverter.last_error == "exception"
+    assert inverter.connection.failures == 0
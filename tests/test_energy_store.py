@@ -0,0 +1,65 @@
+import pytest
+
+import energy_store
+
+
+HOUR = energy_store.HOUR
+H0 = energy_store.hour_start(1767225600 + 12 * HOUR)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = energy_store.EnergyStore(str(tmp_path / "energy.db"))
+    yield store
+    store.close()
+
+
+def test_split_hours():
+    assert energy_store.split_hours(H0 + 1800, H0 + 5400, 100) == [(H0, 50), (H0 + HOUR, 50)]
+    assert energy_store.split_hours(H0 + 60, H0 + 120, 10) == [(H0, 10)]
+    assert energy_store.split_hours(H0 + 60, H0 + 60, 10) == [(H0, 10)]
+
+
+def test_counter_deltas_are_split_over_the_hours(store):
+    store.add({"pv": 1000}, H0 + 1800)
+    store.add({"pv": 1100}, H0 + 5400)
+
+    assert store.report("hour", H0, H0 + HOUR) == {H0: {"pv": 50}, H0 + HOUR: {"pv": 50}}
+    day = energy_store.period_key("day", H0)
+    assert store.report("day", H0, H0) == {day: {"pv": 100}}
+
+
+def test_counter_reset_drops_the_interval(store):
+    store.add({"import": 5000}, H0)
+    store.add({"import": 200}, H0 + 600)
+    store.add({"import": 300}, H0 + 1200)
+
+    assert store.report("hour", H0, H0) == {H0: {"import": 100}}
+
+
+def test_transient_zero_keeps_the_reference(store):
+    store.add({"export": 1000}, H0)
+    store.add({"export": 0}, H0 + 600)
+    store.add({"export": None}, H0 + 900)
+    store.add({"export": 1100}, H0 + 1200)
+
+    assert store.report("hour", H0, H0) == {H0: {"export": 100}}
+
+
+def test_counters_persist_across_restarts(tmp_path):
+    file_name = str(tmp_path / "energy.db")
+    store = energy_store.EnergyStore(file_name)
+    store.add({"pv": 1000}, H0)
+    store.add({"pv": 1040}, H0 + 600)
+    store.close()
+
+    store = energy_store.EnergyStore(file_name)
+    store.add({"pv": 1100}, H0 + 1200)
+
+    assert store.report("hour", H0, H0) == {H0: {"pv": 100}}
+    store.close()
+
+
+def test_unknown_resolution(store):
+    with pytest.raises(ValueError):
+        store.report("week", H0)
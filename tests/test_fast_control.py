@@ -0,0 +1,101 @@
+import fast_control
+
+
+def follower(written=0, ceiling=5000):
+    controller = fast_control.SurplusFollower(slew_rate=1000, deadband=100, margin=0, interval=0.5)
+    controller.reset(written, ceiling, True)
+    return controller
+
+
+def test_follower_slews_towards_the_surplus():
+    controller = follower()
+
+    assert controller.update(3000, 0, now=0) is None
+    assert controller.update(3000, 0, now=0.5) == 500
+    controller.written_ok(500)
+    assert controller.update(3000, 0, now=1.0) == 1000
+
+
+def test_missed_ticks_dont_bypass_the_slew_rate():
+    controller = follower()
+    controller.update(3000, 0, now=0)
+
+    assert controller.update(3000, 0, now=10) == 500
+
+
+def test_follower_restarts_the_slew_after_an_inactive_period():
+    controller = follower()
+    controller.update(3000, 0, now=0)
+    controller.reset(0, 5000, False)
+    assert controller.update(3000, 0, now=100) is None
+
+    controller.reset(0, 5000, True)
+    assert controller.update(3000, 0, now=200) is None
+    assert controller.update(3000, 0, now=200.5) == 500
+
+
+def test_follower_deadband():
+    controller = follower(written=2000)
+    controller.update(2050, 0, now=0)
+
+    # 50 W more or less surplus isn't worth a write
+    assert controller.update(2050, 0, now=0.5) is None
+    assert controller.update(1950, 0, now=1.0) is None
+    assert controller.update(2500, 0, now=1.5) == 2450
+
+
+def test_follower_writes_0_within_the_deadband():
+    controller = follower(written=80)
+    controller.update(-1000, 0, now=0)
+
+    assert controller.update(-1000, 0, now=0.5) == 0
+
+
+def test_follower_is_capped_by_the_ceiling():
+    controller = follower(written=4800, ceiling=5000)
+    controller.update(9000, 0, now=0)
+
+    assert controller.update(9000, 0, now=0.5) == 5000
+
+
+def limiter(ceiling=0):
+    controller = fast_control.ExportLimiter(5000, boost=300, deadband=100, write_interval=5, gain=0.5)
+    controller.reset(ceiling, written=5000)
+    return controller
+
+
+def test_export_above_the_cap_lowers_the_limit_right_away():
+    controller = limiter()
+
+    assert controller.update(5600, 0, now=0) == 4400
+    controller.written_ok(4400, now=0)
+    assert controller.update(5050, 0, now=0.1) == 4350
+
+
+def test_undershoot_raises_the_limit_above_the_cap():
+    controller = limiter()
+
+    # The inverter holds the export 300 W below the limit and the battery is full
+    assert controller.update(4700, 0, now=0) == 5150
+    controller.written_ok(5150, now=0)
+    assert controller.update(4900, 0, now=1) is None
+    # Within the write interval
+    assert controller.update(4900, 0, now=2) is None
+    assert controller.update(4900, 0, now=5) == 5300
+    controller.written_ok(5300, now=5)
+    assert controller.update(5000, 0, now=20) is None
+
+
+def test_limit_stays_at_the_cap_while_the_battery_has_headroom():
+    controller = limiter(ceiling=3000)
+
+    assert controller.update(4700, 1000, now=0) is None
+    assert controller.command == 5000
+
+
+def test_limit_goes_back_to_the_cap_when_the_inverter_isnt_limiting():
+    controller = limiter()
+    controller.reset(0, written=5300)
+    controller.command = 5300
+
+    assert controller.update(3000, 0, now=0) == 5000
@@ -0,0 +1,48 @@
+import inverter_profile
+
+
+class StorageStub:
+    """
+    Register image of a storage whose registers take a new value only on the second write
+    """
+
+    def __init__(self, values):
+        self.values = dict(values)
+        self.attempts = {}
+
+    def write_registers(self, values):
+        for register, value in values.items():
+            self.attempts[register] = self.attempts.get(register, 0) + 1
+            if self.attempts[register] > 1:
+                self.values[register] = value
+
+        return dict.fromkeys(values, "ok")
+
+    def read_registers(self, registers):
+        return {register: self.values[register] for register in registers}
+
+
+def is_error(result):
+    return result != "ok"
+
+
+def test_write_is_retried_until_it_reads_back():
+    storage = StorageStub({"storage_control_mode": 1, "storage_default_mode": 0})
+    changes = {"storage": {"storage_control_mode": (1, 4), "storage_default_mode": (0, 7)}}
+
+    ok, errors = inverter_profile.apply(changes, {"storage": storage}, is_error, retry_delay=0)
+
+    assert ok and not errors
+    assert storage.values == {"storage_control_mode": 4, "storage_default_mode": 7}
+
+
+def test_rollback_after_the_last_attempt():
+    storage = StorageStub({"storage_control_mode": 1})
+    storage.write_registers = lambda values: dict.fromkeys(values, "failed")
+    changes = {"storage": {"storage_control_mode": (1, 4)}}
+
+    ok, errors = inverter_profile.apply(changes, {"storage": storage}, is_error, retries=2, retry_delay=0)
+
+    assert not ok
+    assert errors[0] == "Writing storage.storage_control_mode failed"
+    assert errors[-1].startswith("Rolling back")
@@ -0,0 +1,66 @@
+import json
+import time
+
+import journal
+
+
+def test_torn_record_is_cut_off(tmp_path):
+    file_name = str(tmp_path / "journal.jsonl")
+    log = journal.Journal(file_name)
+    log.observe({"rc_cmd_mode": 7, "rc_charge_limit": 5000})
+    log.override("storage_backup_reserved_setting", 30, until=time.time() + 3600)
+    log.close()
+
+    with open(file_name, "rb") as file:
+        good = file.read()
+    with open(file_name, "ab") as file:
+        file.write(b'{"type":"state","values":{"rc_cmd_mode":')
+
+    log = journal.Journal(file_name)
+
+    assert log.dropped == len(b'{"type":"state","values":{"rc_cmd_mode":')
+    assert log.state["rc_cmd_mode"]["value"] == 7
+    assert log.state["rc_charge_limit"]["value"] == 5000
+    assert log.overrides["storage_backup_reserved_setting"][0] == 30
+    log.close()
+
+    with open(file_name, "rb") as file:
+        assert file.read() == good
+
+
+def test_interrupted_write_is_replayed(tmp_path):
+    file_name = str(tmp_path / "journal.jsonl")
+    log = journal.Journal(file_name)
+    applied, lost = log.intend([("rc_cmd_timeout", 3600), ("rc_cmd_mode", 7)])
+    # Crash after the first write reached the inverter, before any outcome was journaled
+    log.file.close()
+
+    log = journal.Journal(file_name)
+    assert set(log.pending) == {applied, lost}
+
+    repairs, drift = log.verify({"rc_cmd_timeout": 3600, "rc_cmd_mode": 5}, max_age=120)
+
+    assert repairs == [("rc_cmd_mode", 7)]
+    assert not log.pending
+    assert log.state["rc_cmd_timeout"]["value"] == 3600
+    assert log.state["rc_cmd_timeout"]["written"]
+    log.close()
+
+
+def test_stale_intent_is_dropped(tmp_path):
+    file_name = str(tmp_path / "journal.jsonl")
+    hours_ago = time.time() - 3 * 3600
+
+    with open(file_name, "w") as file:
+        file.write(json.dumps({"type": "intent", "id": 1, "register": "rc_cmd_mode", "value": 5, "t": hours_ago}) + "\n")
+
+    log = journal.Journal(file_name)
+    repairs, drift = log.verify({"rc_cmd_mode": 7}, max_age=120)
+
+    assert repairs == []
+    assert not log.pending
+    assert log.state["rc_cmd_mode"]["value"] == 7
+    log.close()
+
+    # The failed outcome is durable: the intent isn't pending after a restart either
+    assert not journal.Journal(file_name).pending
@@ -0,0 +1,78 @@
+import math
+
+import planner
+
+
+SLOTS = 96
+CAPACITY = 10240
+START = 1767225600  # Midnight UTC
+
+
+def pv_day(peak=8000):
+    # Bell curve from 6:00 to 20:00 in 15 min. slots
+    return [max(0.0, peak * math.sin(math.pi * (idx / 4 - 6) / 14)) if 6 <= idx / 4 <= 20 else 0.0
+            for idx in range(SLOTS)]
+
+
+def test_charges_on_surplus():
+    pv = pv_day()
+    load = [400] * SLOTS
+    cost, path = planner.solve(pv, load, [0.30] * SLOTS, [0.08] * SLOTS, 50, CAPACITY, 5000, 10, wear_price=2)
+
+    assert max(step["soe"] for step in path) == 100
+    for idx, step in enumerate(path):
+        if step["battery"] > 0:
+            assert pv[idx] > load[idx]
+
+
+def test_respects_reserve():
+    # Far more load in the expensive half than the battery holds above the reserve
+    import_price = [0.50] * (SLOTS // 2) + [0.10] * (SLOTS // 2)
+    cost, path = planner.solve([0] * SLOTS, [2000] * SLOTS, import_price, [0.08] * SLOTS, 80, CAPACITY, 5000, 30)
+
+    assert min(step["soe"] for step in path) == 30
+
+
+def test_holds_for_tariff_peak():
+    # 2 cheap hours followed by 2 expensive ones, the battery can't cover both
+    slots = 16
+    import_price = [0.10] * 8 + [0.50] * 8
+    cost, path = planner.solve([0] * slots, [1500] * slots, import_price, [0.08] * slots, 40, CAPACITY, 5000, 10)
+
+    assert all(step["battery"] == 0 for step in path[:8])
+    assert all(step["battery"] < 0 for step in path[8:])
+    assert all(step["discharge_held"] for step in path[:8])
+
+
+def pv_forecast(tmp_path, pv):
+    forecast = tmp_path / "pv.csv"
+    forecast.write_text("timestamp,pv\n" + "".join(f"{START + idx * planner.SLOT},{value}\n" for idx, value in enumerate(pv)))
+    return str(forecast)
+
+
+def test_cheap_battery_cycles(tmp_path):
+    config = {"pv_forecast": pv_forecast(tmp_path, pv_day() + [0]), "horizon": 24, "battery_cost": 200}
+    slots = planner.plan(config, 50, CAPACITY, 5000, 10, now=START)["slots"]
+
+    assert len({slot["soe"] for slot in slots}) > 1
+    assert all(slot["charge_limit"] != 0 for slot in slots if slot["pv"] > slot["load"] + 1000)
+
+
+def test_default_battery_cost_leaves_the_battery_idle(tmp_path):
+    # Storing the surplus saves less than the wear of discharging it again at the default battery cost
+    config = {"pv_forecast": pv_forecast(tmp_path, pv_day() + [0]), "horizon": 24}
+    slots = planner.plan(config, 50, CAPACITY, 5000, 10, now=START)["slots"]
+
+    assert all(slot["battery_power"] == 0 for slot in slots)
+    assert all(slot["charge_limit"] is None and slot["backup_reserve"] is None
+               and slot["upper_charging_limit"] is None for slot in slots)
+
+
+def test_idle_plan_keeps_the_period_values(tmp_path):
+    # Nothing to charge from and discharging costs more wear than it saves
+    config = {"pv_forecast": pv_forecast(tmp_path, [0] * (SLOTS + 1)), "horizon": 24, "battery_cost": 100000}
+    values = planner.plan(config, 50, CAPACITY, 5000, 10, now=START)
+
+    assert all(slot["battery_power"] == 0 for slot in values["slots"])
+    assert all(slot["charge_limit"] is None and slot["backup_reserve"] is None
+               and slot["upper_charging_limit"] is None for slot in values["slots"])
@@ -0,0 +1,63 @@
+import solaredge_modbus
+
+
+def meter_reading(power):
+    """
+    A meter whose power register reads 'power' W and whose every other register reads 0, with a
+    _read_holding_registers_raw() which fails while 'fail' is set
+    """
+    meter = solaredge_modbus.Meter(0, host="127.0.0.1", port=1502)
+    meter.connection.ensure = lambda: True
+    address = meter.registers["power"].address
+    meter.fail = False
+
+    def read(start, length):
+        if meter.fail:
+            meter.fail = False
+            return None
+
+        return [power if start + i == address else 0 for i in range(length)]
+
+    meter._read_holding_registers_raw = read
+    return meter
+
+
+def test_failed_fast_read_is_no_current_value():
+    meter = meter_reading(1500)
+    scheduler = solaredge_modbus.PollScheduler({"meter": (meter, ["power", "frequency"])})
+
+    burst = scheduler.poll(now=0)
+    assert burst.values["meter"] == {"power": 1500, "frequency": 0}
+
+    meter.fail = True
+    burst = scheduler.poll(now=1)
+    assert burst.values["meter"]["power"] is None
+    assert burst.stamps["meter"] == {}
+
+    burst = scheduler.poll(now=2)
+    assert burst.values["meter"]["power"] == 1500
+
+
+def test_failed_medium_read_stays_due():
+    meter = meter_reading(1500)
+    scheduler = solaredge_modbus.PollScheduler({"meter": (meter, ["power", "frequency"])})
+    scheduler.poll(now=0)
+
+    meter.fail = True
+    burst = scheduler.poll(now=30)
+    assert burst.values["meter"]["frequency"] == 0
+    assert "frequency" in scheduler.due(now=31)["meter"][1]
+
+    scheduler.poll(now=31)
+    assert scheduler.due(now=32)["meter"][1] == ["power"]
+
+
+def test_interval_of_a_register_overrides_its_poll_class():
+    meter = meter_reading(1500)
+    scheduler = solaredge_modbus.PollScheduler({"meter": (meter, ["power", "frequency"])}, intervals={"frequency": 0})
+    scheduler.poll(now=0)
+
+    assert scheduler.due(now=1)["meter"][1] == ["power", "frequency"]
+
+    meter.fail = True
+    assert scheduler.poll(now=1).values["meter"] == {"power": None, "frequency": None}
@@ -0,0 +1,82 @@
+import math
+import os
+
+from multiprocessing import resource_tracker
+
+import pytest
+
+import shared_snapshot
+
+
+@pytest.fixture
+def name():
+    return f"se_test_{os.getpid()}"
+
+
+def attach(name):
+    reader = shared_snapshot.SnapshotReader(name)
+    # The reader drops the resource tracker registration of the segment, here it is the one of the writer
+    resource_tracker.register(reader.shm._name, "shared_memory")
+    return reader
+
+
+def test_round_trip(name):
+    writer = shared_snapshot.SnapshotWriter(["soe", "meter_power", "power_ac"], name)
+    reader = attach(name)
+
+    try:
+        assert reader.fields == ["soe", "meter_power", "power_ac"]
+        assert all(math.isnan(value) for value in reader.read().values())
+
+        writer.publish({"soe": 55.5, "meter_power": -1200, "unknown": 1})
+        assert reader.read(["meter_power", "soe"]) == {"meter_power": -1200, "soe": 55.5}
+        assert reader.get("soe") == 55.5
+
+        writer.publish({"power_ac": 3000, "soe": None})
+        assert reader.values_of(("power_ac",)) == (3000,)
+        assert math.isnan(reader.get("soe"))
+        assert reader.get("meter_power") == -1200
+
+        # Each publish moves the seqlock by two and leaves it even
+        assert writer.sequence[0] == 4
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_running_writer_is_not_replaced(name):
+    writer = shared_snapshot.SnapshotWriter(["soe"], name)
+
+    try:
+        with pytest.raises(FileExistsError):
+            shared_snapshot.SnapshotWriter(["soe"], name)
+        resource_tracker.register(writer.shm._name, "shared_memory")
+
+        writer.publish({"soe": 42})
+        reader = attach(name)
+        assert reader.get("soe") == 42
+        reader.close()
+    finally:
+        writer.close()
+
+
+def test_torn_publish_times_out(name, monkeypatch):
+    monkeypatch.setattr(shared_snapshot, "READ_TIMEOUT", 0.05)
+    writer = shared_snapshot.SnapshotWriter(["soe", "power_ac"], name)
+    reader = attach(name)
+
+    try:
+        # A writer which died mid-publish leaves the sequence odd
+        writer.sequence[0] += 1
+        with pytest.raises(TimeoutError):
+            reader.read()
+        # A single value is still readable
+        assert math.isnan(reader.get("soe"))
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_of_a_missing_segment(name):
+    with pytest.raises(FileNotFoundError):
+        shared_snapshot.SnapshotReader(name)
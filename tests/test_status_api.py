@@ -0,0 +1,41 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import status_api
+
+
+@pytest.fixture
+def api():
+    status = status_api.ControllerStatus()
+    server = status_api.start(status, port=0)
+    yield status, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    request = urllib.request.Request(url + "/override", data=body, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as err:
+        return err.code, json.load(err)
+
+
+def test_override_is_queued(api):
+    status, url = api
+
+    assert post(url, b'{"rc_charge_limit": 3000, "duration": 60}') == (202, {"queued": {"rc_charge_limit": 3000}, "duration": 60})
+    assert status.pending_overrides()[0][0] == {"rc_charge_limit": 3000}
+
+
+@pytest.mark.parametrize("body", [b"[1]", b'"rc_cmd_mode"', b"3", b'{"rc_cmd_mode": 9}', b'{"duration": "1h"}', b"{"])
+def test_invalid_override_is_rejected(api, body):
+    status, url = api
+
+    code, response = post(url, body)
+    assert code == 400 and "error" in response
+    assert status.pending_overrides() == []
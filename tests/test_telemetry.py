@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+import telemetry
+
+
+def recent_start(resolution):
+    # Start of a bucket 3 buckets ago
+    now = time.time()
+    return now - now % resolution - 3 * resolution
+
+
+def since(start):
+    return int(time.time() - start) + 1
+
+
+def test_ring_wraps_around():
+    ring = telemetry.Ring(3, ["a"])
+    for value in range(5):
+        ring.append([value])
+
+    assert ring.last("a", 10) == [2.0, 3.0, 4.0]
+    assert ring.last("a", 2) == [3.0, 4.0]
+
+
+def test_rollup_bucket_is_closed_by_the_next_one():
+    rollup = telemetry.Rollup(10, 4, ["soe", "power"])
+    for second in range(10):
+        rollup.add(1000 + second, [float(second), telemetry.NAN if second % 2 else 100.0])
+
+    assert rollup.ring.count == 0
+    rollup.add(1010, [50.0, 0.0])
+
+    row = {column: rollup.ring.last(column, 1)[0] for column in rollup.ring.columns}
+    assert row["timestamp"] == 1000
+    assert (row["soe_min"], row["soe_max"], row["soe_mean"], row["soe_last"], row["soe_count"]) == (0, 9, 4.5, 9, 10)
+    assert (row["power_mean"], row["power_count"]) == (100, 5)
+
+
+def test_query_of_raw_samples_and_rollups():
+    history = telemetry.Telemetry(["soe"])
+    start = recent_start(60)
+    for second in range(120):
+        history.add({"soe": second}, start + second)
+
+    assert history.query("soe", since(start))[0] == (start, 0)
+    assert history.last("soe") == 119
+
+    # The second minute is still open
+    minutes = history.query("soe", since(start), 60)
+    assert minutes == [(start, 0, 59, 29.5, 59)]
+
+
+def test_summary_mean_is_weighted_by_the_sample_counts():
+    history = telemetry.Telemetry(["soe"])
+    start = recent_start(10)
+
+    # One sample of 100 in the first 10 s bucket, nine of 0 in the second
+    history.add({"soe": 100}, start)
+    for second in range(10, 19):
+        history.add({"soe": 0}, start + second)
+    history.add({"soe": None}, start + 20)
+
+    summary = history.summary("soe", since(start))
+    assert summary == {"min": 0, "max": 100, "mean": pytest.approx(10), "last": 0}
+
+
+def test_missing_values_are_stored_as_nan():
+    history = telemetry.Telemetry(["soe", "power_ac"])
+    history.add({"soe": 50})
+
+    assert history.last("soe") == 50
+    assert history.last("power_ac") is None
+    assert history.summary("soe", 600) is None
+
+
+def test_memory_budget():
+    history = telemetry.Telemetry(memory=256 * 1024)
+
+    assert history.nbytes() <= 256 * 1024
+    assert all(rollup.ring.capacity >= 1 for rollup in history.rollups.values())
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+MAX_EVENTS = 100000   # Upper bound of the recorded trace events
+MAX_SAMPLES = 1024    # Latencies kept per span name for the percentiles
+PERCENTILES = [50, 90, 99]
+
+
+class Span:
+    """
+    Timed section of the code - a context manager recording a Chrome trace "complete" event
+    and/or the latency of its name
+    """
+
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._record(self.name, self.start, time.perf_counter_ns(), self.args, exc_type)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Span tracer: with 'events' the spans are recorded as Chrome trace events (chrome://tracing, Perfetto),
+    with 'stats' the latencies of the last MAX_SAMPLES spans per name are kept for the percentiles.
+    When both are off, span() returns a shared no-op context manager.
+    """
+
+    def __init__(self, events=False, stats=False):
+        self.events_enabled = events
+        self.stats_enabled = stats
+        self.events = []
+        self.latencies = {}
+        self.origin = time.perf_counter_ns()
+        self.lock = threading.Lock()
+
+    def span(self, name, **args):
+        if not (self.events_enabled or self.stats_enabled):
+            return NULL_SPAN
+
+        return Span(self, name, args)
+
+    def _record(self, name, start, end, args, exc_type):
+        with self.lock:
+            if self.events_enabled and len(self.events) < MAX_EVENTS:
+                if exc_type:
+                    args = {**args, "error": exc_type.__name__}
+                self.events.append({
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self.origin) / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": args
+                })
+
+            if self.stats_enabled:
+                samples = self.latencies.get(name)
+                if samples is None:
+                    samples = self.latencies[name] = deque(maxlen=MAX_SAMPLES)
+                samples.append((end - start) / 1e6)
+
+    def percentiles(self):
+        """
+        Latency percentiles per span name
+
+        :return: Dictionary name -> {"count", "p50", "p90", "p99", "max"} in ms
+        """
+        with self.lock:
+            latencies = {name: sorted(samples) for name, samples in self.latencies.items()}
+
+        stats = {}
+
+        for name, samples in latencies.items():
+            stats[name] = {"count": len(samples)}
+            for percentile in PERCENTILES:
+                stats[name][f"p{percentile}"] = round(samples[min(len(samples) - 1, len(samples) * percentile // 100)], 3)
+            stats[name]["max"] = round(samples[-1], 3)
+
+        return stats
+
+    def write(self, file_name):
+        """
+        Write the recorded events as Chrome trace-event JSON
+
+        :param file_name: Trace file
+
+        :return: None
+        """
+        with self.lock:
+            events = list(self.events)
+
+        with open(file_name, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def instrument(tracer, obj, method, name, arg_names=()):
+    """
+    Wrap a method of an object (e.g. a Modbus client) into a span
+
+    :param tracer: Tracer
+    :param obj: Object whose method is wrapped
+    :param method: Method name
+    :param name: Span name
+    :param arg_names: Names of the (leading positional or keyword) arguments recorded with the span
+
+    :return: None
+    """
+    original = getattr(obj, method)
+
+    def traced(*args, **kwargs):
+        span_args = dict(zip(arg_names, args))
+        span_args.update({k: v for k, v in kwargs.items() if k in arg_names})
+
+        with tracer.span(name, **span_args):
+            return original(*args, **kwargs)
+
+    setattr(obj, method, traced)